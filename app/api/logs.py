@@ -0,0 +1,264 @@
+"""
+Read API over proxy_logs.
+
+- GET /logs: filtered list, newest first, paged by a keyset cursor on
+  (created_at, id) instead of OFFSET; list items leave out headers and bodies.
+- GET /logs/stats: request counts, error rates and latency percentiles per
+  minute / hour / path, read from the per-minute rollups (never from raw rows).
+- GET /logs/{id}: one row with headers and decompressed body prefixes.
+
+Everything runs on the read pool (app/core/db.py: replica if DB_READ_HOST is
+set, with a statement timeout), so queries do not compete with the log writer
+for connections. On a replica the newest rows may lag behind.
+"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import and_, func, or_, select, text, tuple_
+
+from app.core import log_policy, log_rollup
+from app.core.config import settings
+from app.core.db import ReadSessionLocal
+from app.models.proxy_log import ProxyLog
+from app.models.proxy_log_rollup import ProxyLogRollup
+
+router = APIRouter(prefix="/logs", tags=["logs"])
+
+LIST_COLUMNS = (
+    ProxyLog.id,
+    ProxyLog.created_at,
+    ProxyLog.client_ip,
+    ProxyLog.method,
+    ProxyLog.path,
+    ProxyLog.upstream_url,
+    ProxyLog.response_status,
+    ProxyLog.duration_ms,
+    ProxyLog.error,
+    ProxyLog.cache_status,
+    ProxyLog.coalesced,
+    ProxyLog.hedge_won,
+    ProxyLog.request_body_size,
+    ProxyLog.response_body_size,
+)
+
+
+class LogItem(BaseModel):
+    id: int
+    created_at: datetime
+    client_ip: Optional[str] = None
+    method: str
+    path: str
+    upstream_url: str
+    response_status: Optional[int] = None
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    cache_status: Optional[str] = None
+    coalesced: bool
+    hedge_won: Optional[bool] = None
+    request_body_size: Optional[int] = None
+    response_body_size: Optional[int] = None
+
+
+class LogPage(BaseModel):
+    items: List[LogItem]
+    # pass as ?cursor= for the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class LogDetail(LogItem):
+    query_params: Optional[Dict[str, Any]] = None
+    request_headers: Optional[Dict[str, Any]] = None
+    response_headers: Optional[Dict[str, Any]] = None
+    request_body: Optional[str] = None
+    response_body: Optional[str] = None
+    attempt_timings: Optional[List[Dict[str, Any]]] = None
+
+
+class StatsRow(BaseModel):
+    key: str
+    requests: int
+    client_errors: int
+    server_errors: int
+    error_rate: float
+    avg_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+
+
+class StatsResponse(BaseModel):
+    since: datetime
+    until: datetime
+    group_by: str
+    rows: List[StatsRow]
+
+
+def _encode_cursor(created_at: datetime, log_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), log_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, log_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid cursor: {e}")
+
+
+def _text(data: Optional[bytes], codec: Optional[str]) -> Optional[str]:
+    body = log_policy.decompress_body(data, codec)
+    return body.decode("utf-8", errors="replace") if body is not None else None
+
+
+@router.get("", response_model=LogPage)
+async def list_logs(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    path_prefix: Optional[str] = None,
+    status: Optional[List[int]] = Query(None, description="repeatable: ?status=500&status=502"),
+    errors_only: bool = Query(False, description="status >= 500 or no response"),
+    method: Optional[str] = None,
+    client_ip: Optional[str] = None,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+):
+    limit = min(limit, settings.PROXY_LOG_QUERY_MAX_LIMIT)
+    conditions = []
+    if since is not None:
+        conditions.append(ProxyLog.created_at >= since)
+    if until is not None:
+        conditions.append(ProxyLog.created_at < until)
+    if path_prefix:
+        conditions.append(ProxyLog.path.startswith(path_prefix, autoescape=True))
+    if status:
+        conditions.append(ProxyLog.response_status.in_(status))
+    if errors_only:
+        conditions.append(or_(ProxyLog.response_status.is_(None), ProxyLog.response_status >= 500))
+    if method:
+        conditions.append(ProxyLog.method == method.upper())
+    if client_ip:
+        conditions.append(ProxyLog.client_ip == client_ip)
+    if cursor:
+        conditions.append(tuple_(ProxyLog.created_at, ProxyLog.id) < tuple_(*_decode_cursor(cursor)))
+
+    stmt = (
+        select(*LIST_COLUMNS)
+        .where(and_(*conditions))
+        .order_by(ProxyLog.created_at.desc(), ProxyLog.id.desc())
+        .limit(limit + 1)
+    )
+    async with ReadSessionLocal() as db:
+        rows = (await db.execute(stmt)).all()
+
+    items = [LogItem.model_validate(dict(row._mapping)) for row in rows[:limit]]
+    next_cursor = _encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+    return LogPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/stats", response_model=StatsResponse)
+async def log_stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    path_prefix: Optional[str] = None,
+    method: Optional[str] = None,
+    group_by: Literal["minute", "hour", "path"] = "minute",
+    limit: int = Query(100, ge=1, le=10000, description="with group_by=path: busiest paths first"),
+):
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(hours=1)
+    if until - since > timedelta(hours=settings.PROXY_LOG_STATS_MAX_HOURS):
+        raise HTTPException(status_code=400, detail=f"range is limited to {settings.PROXY_LOG_STATS_MAX_HOURS} hours")
+
+    r = ProxyLogRollup
+    conditions = [r.bucket >= since, r.bucket < until]
+    if path_prefix:
+        conditions.append(r.path.startswith(path_prefix, autoescape=True))
+    if method:
+        conditions.append(r.method == method.upper())
+    if group_by == "path":
+        key = r.path
+    else:
+        key = func.date_trunc(group_by, r.bucket)
+    key = key.label("key")
+
+    totals_stmt = (
+        select(
+            key,
+            func.sum(r.requests).label("requests"),
+            func.sum(r.client_errors).label("client_errors"),
+            func.sum(r.server_errors).label("server_errors"),
+            func.sum(r.duration_sum_ms).label("duration_sum_ms"),
+            func.max(r.duration_max_ms).label("duration_max_ms"),
+        )
+        .where(*conditions)
+        .group_by(key)
+    )
+    if group_by == "path":
+        totals_stmt = totals_stmt.order_by(text("requests DESC")).limit(limit)
+    else:
+        totals_stmt = totals_stmt.order_by(key)
+    # histogram buckets summed per group, element-wise
+    bucket = func.unnest(r.duration_buckets).table_valued("count", with_ordinality="n").render_derived()
+    buckets_stmt = (
+        select(key, bucket.c.n, func.sum(bucket.c.count).label("count"))
+        .select_from(r)
+        .join(bucket, text("true"))
+        .where(*conditions)
+        .group_by(key, bucket.c.n)
+    )
+
+    async with ReadSessionLocal() as db:
+        totals = (await db.execute(totals_stmt)).all()
+        histograms: Dict[Any, List[int]] = {}
+        for row in await db.execute(buckets_stmt):
+            counts = histograms.setdefault(row.key, [0] * (len(log_rollup.DURATION_BUCKETS_MS) + 1))
+            counts[row.n - 1] = int(row.count)
+
+    rows = []
+    for row in totals:
+        counts = histograms.get(row.key, [])
+        requests = int(row.requests)
+        max_ms = row.duration_max_ms
+        rows.append(
+            StatsRow(
+                key=row.key.isoformat() if isinstance(row.key, datetime) else row.key,
+                requests=requests,
+                client_errors=int(row.client_errors),
+                server_errors=int(row.server_errors),
+                error_rate=round(int(row.server_errors) / requests, 4) if requests else 0.0,
+                avg_ms=round(row.duration_sum_ms / requests, 2) if requests else None,
+                max_ms=round(max_ms, 2) if max_ms is not None else None,
+                p50_ms=log_rollup.histogram_percentile(counts, 50, max_ms),
+                p95_ms=log_rollup.histogram_percentile(counts, 95, max_ms),
+                p99_ms=log_rollup.histogram_percentile(counts, 99, max_ms),
+            )
+        )
+    return StatsResponse(since=since, until=until, group_by=group_by, rows=rows)
+
+
+@router.get("/{log_id}", response_model=LogDetail)
+async def get_log(log_id: int, created_at: Optional[datetime] = Query(None, description="narrows to one partition")):
+    stmt = select(ProxyLog).where(ProxyLog.id == log_id)
+    if created_at is not None:
+        stmt = stmt.where(ProxyLog.created_at == created_at)
+    async with ReadSessionLocal() as db:
+        log = (await db.execute(stmt.limit(1))).scalar_one_or_none()
+    if log is None:
+        raise HTTPException(status_code=404, detail="log not found")
+    return LogDetail(
+        **{c.key: getattr(log, c.key) for c in LIST_COLUMNS},
+        query_params=log.query_params,
+        request_headers=log.request_headers,
+        response_headers=log.response_headers,
+        # older rows keep plain-text bodies
+        request_body=_text(log.request_body_compressed, log.body_codec) or log.request_body,
+        response_body=_text(log.response_body_compressed, log.body_codec) or log.response_body,
+        attempt_timings=log.attempt_timings,
+    )
@@ -1,14 +1,24 @@
+import ipaddress
+import math
 import time
-import asyncio
-from typing import Any, Dict, Optional
+from dataclasses import asdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import httpx
-from fastapi import APIRouter, HTTPException, Request, Response, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 
 from app.core.config import settings
-from app.core.db import get_db
-from app.models.proxy_log import ProxyLog
+from app.core import log_policy, log_rollup, metrics
+from app.core.log_writer import proxy_log_writer
+from app.upstream.admission import Overloaded, admission
+from app.upstream.balancer import balancer
+from app.upstream.cache import CACHEABLE_STATUSES, CachedResponse, conditional_headers, response_cache
+from app.upstream.coalesce import SharedResponse, single_flight
+from app.upstream.ratelimit import rate_limiter
+from app.upstream.retry import send_with_retries
 
 router = APIRouter(prefix="/proxy", tags=["proxy"])
 
@@ -26,55 +36,138 @@ HOP_BY_HOP_HEADERS = {
 }
 
 
-def _safe_bytes_to_str(data: bytes | None, limit: int = 5000) -> str:
-    """Safe body to string conversion with length limit."""
-    if not data:
-        return ""
+def _strip_hop_by_hop(headers: Dict[str, str]) -> Dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+
+
+@lru_cache(maxsize=8)
+def _networks(cidrs: Tuple[str, ...]) -> List[Any]:
+    return [ipaddress.ip_network(c, strict=False) for c in cidrs]
+
+
+def _is_trusted_proxy(address: str) -> bool:
     try:
-        s = data.decode("utf-8")
-    except UnicodeDecodeError:
-        s = data.decode("utf-8", errors="ignore")
-    if len(s) > limit:
-        return s[:limit] + f"... (truncated, total {len(s)} chars)"
-    return s
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in net for net in _networks(tuple(settings.PROXY_TRUSTED_PROXIES)))
+
+
+def _client_ip(request: Request) -> Optional[str]:
+    """The peer address, or the right-most address in X-Forwarded-For that is
+    not one of our proxies (entries left of it are set by the client)."""
+    peer = request.client.host if request.client else None
+    forwarded = request.headers.get("x-forwarded-for")
+    if not peer or not forwarded or not _is_trusted_proxy(peer):
+        return peer
+    client = peer
+    for hop in reversed(forwarded.split(",")):
+        hop = hop.strip()
+        try:
+            ipaddress.ip_address(hop)
+        except ValueError:
+            break
+        client = hop
+        if not _is_trusted_proxy(hop):
+            break
+    return client
+
+
+class _BodyCapture:
+    """Keeps the first ``limit`` bytes of a streamed body for the log and counts the rest."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.prefix = bytearray()
+        self.total = 0
+
+    def feed(self, chunk: bytes) -> None:
+        if len(self.prefix) < self.limit:
+            self.prefix += chunk[: self.limit - len(self.prefix)]
+        self.total += len(chunk)
+
+
+class _UpstreamStreamingResponse(StreamingResponse):
+    """StreamingResponse that always runs ``on_close`` once the ASGI call is over,
+    even if the client went away before the body was read."""
+
+    def __init__(self, *args: Any, on_close: Callable[[], Awaitable[None]], **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._on_close()
 
 
 async def _save_proxy_log(
-    db: AsyncSession,
     *,
     client_ip: Optional[str],
     method: str,
     path: str,
+    upstream_path: str,
     upstream_url: str,
     query_params: Dict[str, Any],
     request_headers: Dict[str, Any],
-    request_body: str,
+    request_body: _BodyCapture,
     response_status: Optional[int],
     response_headers: Optional[Dict[str, Any]],
-    response_body: Optional[str],
+    response_body: Optional[_BodyCapture],
     duration_ms: Optional[float],
     error: Optional[str],
+    cache_status: Optional[str] = None,
+    coalesced: bool = False,
+    attempt_timings: Optional[List[Dict[str, Any]]] = None,
+    hedge_won: Optional[bool] = None,
 ) -> None:
-    log = ProxyLog(
-        client_ip=client_ip,
-        method=method,
-        path=path,
-        upstream_url=upstream_url,
-        query_params=query_params or None,
-        request_headers=request_headers or None,
-        request_body=request_body or None,
-        response_status=response_status,
-        response_headers=response_headers or None,
-        response_body=response_body or None,
-        duration_ms=duration_ms,
-        error=error,
+    created_at = datetime.now(timezone.utc)
+    proxy_log_writer.observe(created_at, log_rollup.path_key(upstream_path), method, response_status, duration_ms)
+
+    rule = log_policy.select_rule(upstream_path, method, response_status)
+    if not log_policy.should_log(rule, response_status):
+        return
+
+    # bodies stay raw here, the writer compresses them off the request path
+    await proxy_log_writer.put(
+        dict(
+            created_at=created_at,
+            client_ip=client_ip,
+            method=method,
+            path=path,
+            upstream_url=upstream_url,
+            query_params=query_params or None,
+            request_headers=log_policy.filter_headers(rule, request_headers),
+            request_body_compressed=log_policy.body_prefix(rule, request_body.prefix),
+            request_body_size=request_body.total,
+            response_status=response_status,
+            response_headers=log_policy.filter_headers(rule, response_headers),
+            response_body_compressed=log_policy.body_prefix(rule, response_body.prefix) if response_body else None,
+            response_body_size=response_body.total if response_body else None,
+            duration_ms=duration_ms,
+            error=error,
+            cache_status=cache_status,
+            coalesced=coalesced,
+            attempt_timings=attempt_timings,
+            hedge_won=hedge_won,
+        )
     )
 
-    try:
-        db.add(log)
-        await db.commit()
-    except Exception:
-        await db.rollback()
+
+async def _iter_request_body(request: Request, capture: _BodyCapture) -> AsyncIterator[bytes]:
+    async for chunk in request.stream():
+        if chunk:
+            capture.feed(chunk)
+            yield chunk
+
+
+def _cached_response(entry: CachedResponse, cache_status: str) -> Response:
+    headers = dict(entry.headers)
+    headers["age"] = str(max(0, int(time.time() - entry.stored_at)))
+    headers["x-cache"] = cache_status
+    response_cache.stats.bytes_served += len(entry.body)
+    return Response(content=entry.body, status_code=entry.status_code, headers=headers)
 
 
 @router.api_route(
@@ -84,107 +177,330 @@ async def _save_proxy_log(
 async def proxy_request(
     full_path: str,
     request: Request,
-    db: AsyncSession = Depends(get_db),
 ) -> Response:
-    base = settings.UPSTREAM_BASE_URL.rstrip("/")
     full_path_clean = full_path.lstrip("/")
-    target_url = f"{base}/{full_path_clean}" if full_path_clean else base
+    upstream_path = f"/{full_path_clean}"
+    upstream_pool = balancer.pool_for(upstream_path)
+    # logged when no instance was called (cache, coalesced); otherwise the one that answered is
+    target_url = upstream_pool.instances[0].url_for(full_path_clean)
 
     query_params = dict(request.query_params)
-    body_bytes = await request.body()
+    incoming_headers = _strip_hop_by_hop(dict(request.headers))
 
-    incoming_headers = dict(request.headers)
-    for h in list(incoming_headers.keys()):
-        if h.lower() in HOP_BY_HOP_HEADERS:
-            incoming_headers.pop(h, None)
+    # route label for /metrics: the proxied path, normalized
+    request.state.metrics_route = metrics.path_label(settings.API_V1_STR + router.prefix, upstream_path)
 
-    client_ip = request.client.host if request.client else None
+    client_ip = _client_ip(request)
     method = request.method
     path = request.url.path
-
-    max_retries = settings.PROXY_MAX_RETRIES
-    delay = settings.PROXY_RETRY_DELAY_SECONDS
-
     start_ts = time.monotonic()
-    attempts = 0
-    upstream_response: Optional[httpx.Response] = None
-    last_exc: Optional[Exception] = None
 
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        for attempt in range(1, max_retries + 1):
-            attempts = attempt
-            try:
-                upstream_response = await client.request(
-                    method=method,
-                    url=target_url,
-                    params=query_params,
-                    content=body_bytes,
-                    headers=incoming_headers,
-                )
-                # any HTTP response counts as successful attempt
-                break
-            except httpx.RequestError as exc:
-                last_exc = exc
-                if attempt < max_retries:
-                    await asyncio.sleep(delay)
-                else:
-                    pass
-
-    duration_ms = (time.monotonic() - start_ts) * 1000.0
-
-    if upstream_response is None:
-        error_msg = (
-            f"{type(last_exc).__name__ if last_exc else 'UnknownError'}: "
-            f"{str(last_exc) if last_exc else 'No response from upstream'}; "
-            f"attempts={attempts}, delay={delay}s"
+    # per-client / per-route token buckets, before any work on the request
+    limit = await rate_limiter.check(upstream_path, client_ip)
+    if not limit.allowed:
+        metrics.ADMISSION_REJECTED.labels(f"rate_limit_{limit.rule.per}").inc()
+        # only counted in the rollups, a flood of 429s should not flood proxy_logs too
+        proxy_log_writer.observe(
+            datetime.now(timezone.utc),
+            log_rollup.path_key(upstream_path),
+            method,
+            429,
+            (time.monotonic() - start_ts) * 1000.0,
         )
-
-        await _save_proxy_log(
-            db,
-            client_ip=client_ip,
-            method=method,
-            path=path,
-            upstream_url=target_url,
-            query_params=query_params,
-            request_headers=incoming_headers,
-            request_body=_safe_bytes_to_str(body_bytes),
-            response_status=None,
-            response_headers=None,
-            response_body=None,
-            duration_ms=duration_ms,
-            error=error_msg,
-        )
-
         raise HTTPException(
-            status_code=502,
-            detail=f"Upstream unreachable after {attempts} attempts",
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"retry-after": str(max(1, math.ceil(limit.retry_after)))},
         )
 
-    response_headers = dict(upstream_response.headers)
-    for h in list(response_headers.keys()):
-        if h.lower() in HOP_BY_HOP_HEADERS:
-            response_headers.pop(h, None)
-
-    response_body_str = _safe_bytes_to_str(upstream_response.content)
+    # Small bodies are read up front so a failed attempt can be retried with
+    # the same payload; large (or chunked) ones are streamed straight through.
+    capture_limit = log_policy.max_body_bytes()
+    request_capture = _BodyCapture(capture_limit)
+    content_length = request.headers.get("content-length")
+    if content_length is not None and not (content_length.isascii() and content_length.isdigit()):
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    has_body = bool(content_length and int(content_length) != 0) or "transfer-encoding" in request.headers
+    body_replayable = True
+    body: Any = None
+    if has_body:
+        if content_length and int(content_length) <= settings.PROXY_STREAM_REQUEST_BUFFER_BYTES:
+            body = await request.body()
+            request_capture.feed(body)
+        else:
+            body = _iter_request_body(request, request_capture)
+            body_replayable = False
+            if content_length:
+                # keep the length, otherwise httpx falls back to chunked encoding
+                incoming_headers["content-length"] = content_length
 
-    await _save_proxy_log(
-        db,
+    log_fields = dict(
         client_ip=client_ip,
         method=method,
         path=path,
+        upstream_path=upstream_path,
         upstream_url=target_url,
         query_params=query_params,
         request_headers=incoming_headers,
-        request_body=_safe_bytes_to_str(body_bytes),
-        response_status=upstream_response.status_code,
-        response_headers=response_headers,
-        response_body=response_body_str,
-        duration_ms=duration_ms,
-        error=f"attempts={attempts}, delay={delay}s",
+        request_body=request_capture,
     )
 
-    return Response(
-        content=upstream_response.content,
-        status_code=upstream_response.status_code,
-        headers=response_headers,
-    )
+    async def log_cached(entry: CachedResponse, cache_status: str) -> None:
+        cached_body = _BodyCapture(capture_limit)
+        cached_body.feed(entry.body)
+        await _save_proxy_log(
+            **log_fields,
+            response_status=entry.status_code,
+            response_headers=entry.headers,
+            response_body=cached_body,
+            duration_ms=(time.monotonic() - start_ts) * 1000.0,
+            error=None,
+            cache_status=cache_status,
+        )
+
+    # response cache (GET only, per route prefix)
+    cache_route = response_cache.route_for(method, upstream_path)
+    cache_key: Optional[str] = None
+    cache_status: Optional[str] = None
+    cached: Optional[CachedResponse] = None
+    # expired copy, served if the circuit breaker is open
+    stale: Optional[CachedResponse] = None
+    upstream_headers = dict(incoming_headers)
+    if cache_route is not None:
+        client_conditional = "if-none-match" in request.headers or "if-modified-since" in request.headers
+        cache_key = response_cache.key(
+            method, upstream_path, request.query_params.multi_items(), incoming_headers, cache_route
+        )
+        if client_conditional:
+            # the client revalidates its own copy, let upstream answer that
+            cache_key = None
+            cache_status = "BYPASS"
+        elif not response_cache.request_allows_cache(incoming_headers):
+            cache_status = "BYPASS"
+        else:
+            cached = await response_cache.get(cache_key)
+            stale = cached
+            if cached is not None and cached.is_fresh():
+                response_cache.stats.hits += 1
+                await log_cached(cached, "HIT")
+                return _cached_response(cached, "HIT")
+            response_cache.stats.misses += 1
+            cache_status = "MISS"
+            if cached is not None and cached.has_validators():
+                response_cache.stats.revalidations += 1
+                upstream_headers.update(conditional_headers(cached))
+            else:
+                cached = None
+
+    # single-flight: identical GET/HEADs in flight share one upstream call
+    flight_key: Optional[str] = None
+    flight_call = None
+    if single_flight.applies(method, has_body):
+        flight_key = single_flight.key(method, target_url, request.query_params.multi_items(), incoming_headers)
+        is_leader, flight_call = single_flight.join(flight_key)
+        if not is_leader:
+            shared = await single_flight.wait(flight_call)
+            if shared is not None:
+                shared_body = _BodyCapture(capture_limit)
+                shared_body.feed(shared.body)
+                await _save_proxy_log(
+                    **log_fields,
+                    response_status=shared.status_code,
+                    response_headers=shared.headers,
+                    response_body=shared_body,
+                    duration_ms=(time.monotonic() - start_ts) * 1000.0,
+                    error=None,
+                    cache_status=cache_status,
+                    coalesced=True,
+                )
+                return Response(
+                    content=shared.body,
+                    status_code=shared.status_code,
+                    headers={**shared.headers, "x-coalesced": "1"},
+                )
+            # leader's response cannot be shared, go upstream ourselves
+            flight_key = flight_call = None
+
+    # admission slot, held until the response body is relayed
+    slot = None
+    slot_handed_off = False
+    try:
+        try:
+            slot = await admission.acquire()
+        except Overloaded as e:
+            await _save_proxy_log(
+                **log_fields,
+                response_status=None,
+                response_headers=None,
+                response_body=None,
+                duration_ms=(time.monotonic() - start_ts) * 1000.0,
+                error=f"Overloaded: {e.reason}, {settings.PROXY_MAX_IN_FLIGHT} upstream requests in flight",
+                cache_status=cache_status,
+            )
+            raise HTTPException(
+                status_code=503,
+                detail="Too many requests in flight",
+                headers={"retry-after": str(settings.PROXY_ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+        result = await send_with_retries(
+            method=method,
+            pool=upstream_pool,
+            path=full_path_clean,
+            params=query_params,
+            headers=upstream_headers,
+            body=body,
+            body_replayable=body_replayable,
+            body_started=lambda: request_capture.total > 0,
+            start_ts=start_ts,
+        )
+        metrics.UPSTREAM_ATTEMPTS.observe(len(result.attempts))
+        if result.gave_up:
+            metrics.UPSTREAM_GAVE_UP.labels(result.gave_up).inc()
+        attempt_timings = [asdict(a) for a in result.attempts]
+        if result.attempts:
+            log_fields["upstream_url"] = result.upstream_url or result.attempts[-1].upstream_url or target_url
+        upstream_response = result.response
+        exit_stack = result.exit_stack
+
+        if upstream_response is None and result.circuit_open and stale is not None:
+            response_cache.stats.stale_hits += 1
+            if flight_call is not None:
+                single_flight.publish(flight_key, flight_call, SharedResponse(stale.status_code, stale.headers, stale.body))
+            await log_cached(stale, "STALE")
+            return _cached_response(stale, "STALE")
+
+        if upstream_response is None:
+            duration_ms = (time.monotonic() - start_ts) * 1000.0
+            last_exc = result.last_error
+            if last_exc is None and result.circuit_open:
+                error_msg = "CircuitOpen: upstream circuit breaker is open"
+            else:
+                error_msg = (
+                    f"{type(last_exc).__name__ if last_exc else 'UnknownError'}: "
+                    f"{str(last_exc) if last_exc else 'No response from upstream'}"
+                )
+            if result.gave_up and result.attempts:
+                error_msg = f"{error_msg}; gave up: {result.gave_up}"
+
+            await _save_proxy_log(
+                **log_fields,
+                response_status=None,
+                response_headers=None,
+                response_body=None,
+                duration_ms=duration_ms,
+                error=error_msg,
+                cache_status=cache_status,
+                attempt_timings=attempt_timings,
+            )
+
+            if result.circuit_open and not result.attempts:
+                unreachable = HTTPException(
+                    status_code=503,
+                    detail="Upstream circuit breaker is open",
+                    headers={"retry-after": str(max(1, math.ceil(upstream_pool.breaker.retry_after())))},
+                )
+            else:
+                unreachable = HTTPException(
+                    status_code=502,
+                    detail=f"Upstream unreachable after {len(result.attempts)} attempts",
+                )
+            if flight_call is not None:
+                single_flight.publish(flight_key, flight_call, unreachable)
+            raise unreachable
+
+        if cached is not None and upstream_response.status_code == 304:
+            # our revalidation: upstream copy unchanged, serve the cached body
+            await exit_stack.aclose()
+            response_cache.stats.revalidated += 1
+            refreshed = await response_cache.refresh(cache_key, cached, dict(upstream_response.headers), cache_route)
+            if flight_call is not None:
+                shared = SharedResponse(refreshed.status_code, refreshed.headers, refreshed.body)
+                single_flight.publish(flight_key, flight_call, shared)
+            await log_cached(refreshed, "REVALIDATED")
+            return _cached_response(refreshed, "REVALIDATED")
+
+        response_headers = _strip_hop_by_hop(dict(upstream_response.headers))
+        # the body is relayed raw (still encoded), so the upstream length stays valid
+        upstream_length = upstream_response.headers.get("content-length")
+        if upstream_length is not None:
+            response_headers["content-length"] = upstream_length
+        client_headers = dict(response_headers)
+        if cache_status is not None:
+            client_headers["x-cache"] = cache_status
+
+        response_capture = _BodyCapture(capture_limit)
+        stream_error: Optional[str] = None
+        body_complete = False
+        # full copy of the body for the cache and single-flight followers,
+        # dropped once it grows past what either of them can take
+        cacheable = cache_key is not None and upstream_response.status_code in CACHEABLE_STATUSES
+        buffer_limit = settings.PROXY_CACHE_MAX_ENTRY_BYTES if cacheable else 0
+        if flight_call is not None:
+            buffer_limit = max(buffer_limit, settings.PROXY_COALESCE_MAX_BODY_BYTES)
+        body_buffer: Optional[bytearray] = None
+        if buffer_limit and (upstream_length is None or int(upstream_length) <= buffer_limit):
+            body_buffer = bytearray()
+
+        async def relay_body() -> AsyncIterator[bytes]:
+            nonlocal stream_error, body_buffer, body_complete
+            try:
+                async for chunk in upstream_response.aiter_raw():
+                    response_capture.feed(chunk)
+                    if body_buffer is not None:
+                        if len(body_buffer) + len(chunk) > buffer_limit:
+                            body_buffer = None
+                        else:
+                            body_buffer += chunk
+                    yield chunk
+                body_complete = True
+            except httpx.HTTPError as exc:
+                stream_error = f"{type(exc).__name__} while streaming body: {exc}"
+                raise
+
+        async def finish() -> None:
+            await exit_stack.aclose()
+            await slot.release()
+            duration_ms = (time.monotonic() - start_ts) * 1000.0
+            full_body = bytes(body_buffer) if body_buffer is not None and body_complete else None
+            if flight_call is not None:
+                shared = None
+                if full_body is not None and len(full_body) <= settings.PROXY_COALESCE_MAX_BODY_BYTES:
+                    shared_headers = {k: v for k, v in response_headers.items() if k != "content-length"}
+                    shared = SharedResponse(upstream_response.status_code, shared_headers, full_body)
+                single_flight.publish(flight_key, flight_call, shared)
+            if cacheable and full_body is not None and len(full_body) <= settings.PROXY_CACHE_MAX_ENTRY_BYTES:
+                entry = response_cache.build_entry(
+                    upstream_response.status_code, incoming_headers, response_headers, full_body, cache_route
+                )
+                if entry is not None:
+                    await response_cache.store(cache_key, entry)
+                else:
+                    response_cache.stats.not_cacheable += 1
+            await _save_proxy_log(
+                **log_fields,
+                response_status=upstream_response.status_code,
+                response_headers=response_headers,
+                response_body=response_capture,
+                duration_ms=duration_ms,
+                error=stream_error,
+                cache_status=cache_status,
+                attempt_timings=attempt_timings,
+                hedge_won=result.hedge_won,
+            )
+
+        response = _UpstreamStreamingResponse(
+            relay_body(),
+            status_code=upstream_response.status_code,
+            headers=client_headers,
+            on_close=finish,
+        )
+        # finish() releases it from here on
+        slot_handed_off = True
+        return response
+    except BaseException as exc:
+        if flight_call is not None:
+            single_flight.publish(flight_key, flight_call, exc if isinstance(exc, HTTPException) else None)
+        raise
+    finally:
+        if slot is not None and not slot_handed_off:
+            await slot.release()
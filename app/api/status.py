@@ -0,0 +1,76 @@
+from fastapi import APIRouter
+
+from app.core.db import pool_stats
+from app.core.log_writer import proxy_log_writer
+from app.odoo_async_client import odoo1, odoo2
+from app.odoo_changes import change_stats
+from app.upstream.admission import admission
+from app.upstream.balancer import balancer
+from app.upstream.cache import response_cache
+from app.upstream.client import upstream_client
+from app.upstream.coalesce import single_flight
+from app.upstream.hedging import hedger
+from app.upstream.ratelimit import rate_limiter
+from app.upstream.retry import retry_budget
+
+router = APIRouter(prefix="/status", tags=["status"])
+
+
+@router.get("/upstream-client")
+async def upstream_client_status():
+    return upstream_client.stats()
+
+
+@router.get("/db")
+async def db_status():
+    return pool_stats()
+
+
+@router.get("/upstreams")
+async def upstreams_status():
+    return balancer.stats()
+
+
+@router.get("/log-writer")
+async def log_writer_status():
+    return proxy_log_writer.stats()
+
+
+@router.get("/cache")
+async def cache_status():
+    return response_cache.stats_dict()
+
+
+@router.get("/coalescing")
+async def coalescing_status():
+    return single_flight.stats()
+
+
+@router.get("/retries")
+async def retries_status():
+    return retry_budget.stats()
+
+
+@router.get("/circuit-breaker")
+async def circuit_breaker_status():
+    return balancer.breaker_stats()
+
+
+@router.get("/hedging")
+async def hedging_status():
+    return hedger.stats()
+
+
+@router.get("/admission")
+async def admission_status():
+    return {"rate_limit": rate_limiter.stats(), "in_flight": admission.stats()}
+
+
+@router.get("/odoo-sync")
+async def odoo_sync_status():
+    return change_stats.stats()
+
+
+@router.get("/odoo")
+async def odoo_clients_status():
+    return {"odoo1": odoo1.stats(), "odoo2": odoo2.stats()}
@@ -1,6 +1,69 @@
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
 
+class LogRule(BaseModel):
+    """
+    What to store in proxy_logs for matching requests (see app/core/log_policy.py).
+
+    Empty ``methods`` / ``statuses`` match anything; statuses are exact codes
+    ("404") or classes ("5xx"). ``path_prefix`` is matched against the
+    upstream path, e.g. "/get" for /api/v1/proxy/get.
+    """
+
+    path_prefix: str = ""
+    methods: List[str] = []
+    statuses: List[str] = []
+    # share of successful (< 400) responses that get logged
+    sample_rate: float = 1.0
+    # failed requests and >= 400 responses are logged regardless of sample_rate
+    always_log_errors: bool = True
+    # if set, only these headers are stored; drop_headers always applies
+    keep_headers: List[str] = []
+    drop_headers: List[str] = ["authorization", "proxy-authorization", "cookie", "set-cookie"]
+    capture_body: bool = True
+    body_max_bytes: int = 5000
+
+
+class CacheRoute(BaseModel):
+    """Response cache settings for upstream paths starting with ``path_prefix``."""
+
+    path_prefix: str = ""
+    enabled: bool = True
+    # used when upstream sends neither Cache-Control max-age nor Expires
+    default_ttl_seconds: float = 0.0
+    max_ttl_seconds: Optional[float] = None
+    # request headers that are part of the cache key; responses varying on
+    # anything else are not cached
+    vary_headers: List[str] = ["accept", "accept-encoding"]
+
+
+class UpstreamPool(BaseModel):
+    """Upstream instances for paths starting with ``path_prefix`` (see app/upstream/balancer.py)."""
+
+    path_prefix: str = ""
+    urls: List[str]
+    # round_robin, fewest requests in flight, or lowest latency EWMA weighted by requests in flight
+    strategy: Literal["round_robin", "least_outstanding", "ewma"] = "round_robin"
+
+
+class RateLimitRule(BaseModel):
+    """
+    Token bucket for upstream paths starting with ``path_prefix`` (see
+    app/upstream/ratelimit.py). Every matching rule applies.
+
+    ``per="client"`` gives each client IP its own bucket, ``per="route"`` one
+    bucket shared by all clients of the prefix.
+    """
+
+    path_prefix: str = ""
+    per: Literal["client", "route"] = "client"
+    rate_per_second: float
+    burst: int
+
+
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Single Proxy API"
     API_V1_STR: str = "/api/v1"
@@ -8,16 +71,219 @@ class Settings(BaseSettings):
     # single upstream service
     UPSTREAM_BASE_URL: str
 
+    # more upstream instances, optionally per path prefix (app/upstream/balancer.py): first matching
+    # pool wins, requests matching none go to UPSTREAM_BASE_URL
+    # (JSON in env, e.g. UPSTREAM_POOLS='[{"urls": ["http://a:8000", "http://b:8000"], "strategy": "ewma"}]')
+    UPSTREAM_POOLS: List[UpstreamPool] = []
+    # passive checks: an instance failing this many calls in a row is ejected for a while; 0 = never
+    UPSTREAM_EJECT_CONSECUTIVE_FAILURES: int = 5
+    UPSTREAM_EJECT_SECONDS: float = 30.0
+    # responses counted as failures (connection errors always are)
+    UPSTREAM_EJECT_ON_STATUSES: List[int] = [502, 503, 504]
+    # active checks: GET this path on every instance, e.g. "/health"; None = off
+    UPSTREAM_HEALTH_CHECK_PATH: Optional[str] = None
+    UPSTREAM_HEALTH_CHECK_INTERVAL_SECONDS: float = 5.0
+    UPSTREAM_HEALTH_CHECK_TIMEOUT_SECONDS: float = 2.0
+    UPSTREAM_HEALTHY_THRESHOLD: int = 2  # passed checks in a row to take an instance back
+    UPSTREAM_UNHEALTHY_THRESHOLD: int = 3  # failed checks in a row to take it out
+    # how fast the latency EWMA of the "ewma" strategy forgets old samples
+    UPSTREAM_EWMA_DECAY_SECONDS: float = 10.0
+
     # DB config
     DB_USER: str = "proxy"
     DB_PASSWORD: str = "proxy"
     DB_HOST: str = "db"
     DB_PORT: int = 5432
     DB_NAME: str = "proxy_db"
+    # connection pool per worker (app/core/db.py): with N workers Postgres sees up to
+    # N * (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_READ_POOL_SIZE) connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0  # wait for a free connection before failing
+    DB_POOL_PRE_PING: bool = True  # check connections on checkout (survives Postgres restarts)
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 = never; keep below server / pgbouncer idle timeouts
+    # prepared statements cached per connection; 0 behind pgbouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # read-only queries (log query API) use their own pool, on a replica if DB_READ_HOST is set
+    DB_READ_HOST: Optional[str] = None
+    DB_READ_PORT: Optional[int] = None
+    DB_READ_POOL_SIZE: int = 5
+    DB_READ_STATEMENT_TIMEOUT_MS: int = 15000
+
+    # retry config (app/upstream/retry.py)
+    PROXY_MAX_RETRIES: int = 5  # attempts in total, including the first one
+    PROXY_RETRY_DELAY_SECONDS: float = 0.2  # backoff base, doubled per attempt, full jitter
+    PROXY_RETRY_MAX_DELAY_SECONDS: float = 2.0
+    PROXY_REQUEST_DEADLINE_SECONDS: float = 10.0  # for all attempts together
+    PROXY_RETRY_ON_STATUSES: List[int] = []  # e.g. [502, 503, 504]
+    # non-idempotent requests are retried only if they carry this header
+    PROXY_IDEMPOTENCY_HEADER: str = "idempotency-key"
+    # retry budget: each request adds RATIO tokens, each retry takes one
+    PROXY_RETRY_BUDGET_RATIO: float = 0.2
+    PROXY_RETRY_BUDGET_MAX_TOKENS: int = 100
+    PROXY_RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+
+    # upstream HTTP client (one pooled client per worker)
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    UPSTREAM_HTTP2: bool = False
+    UPSTREAM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    UPSTREAM_READ_TIMEOUT_SECONDS: float = 30.0
+    UPSTREAM_WRITE_TIMEOUT_SECONDS: float = 30.0
+    UPSTREAM_POOL_TIMEOUT_SECONDS: float = 5.0
+
+    # streaming: request bodies up to this size are buffered (so retries can
+    # replay them), bigger ones are streamed to upstream without buffering
+    PROXY_STREAM_REQUEST_BUFFER_BYTES: int = 64 * 1024
+
+    # proxy_logs background writer
+    PROXY_LOG_QUEUE_SIZE: int = 10000
+    PROXY_LOG_BATCH_SIZE: int = 500
+    PROXY_LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+    PROXY_LOG_OVERFLOW_POLICY: Literal["drop", "sample", "block"] = "drop"
+    PROXY_LOG_SAMPLE_THRESHOLD: float = 0.5  # queue fill ratio where sampling starts
+    PROXY_LOG_SAMPLE_RATE: float = 0.1
+    PROXY_LOG_BLOCK_TIMEOUT_SECONDS: float = 0.5
 
-    # retry config
-    PROXY_MAX_RETRIES: int = 5
-    PROXY_RETRY_DELAY_SECONDS: float = 3.0
+    # proxy_logs partitioning / retention
+    PROXY_LOG_PARTITION_INTERVAL: Literal["day", "week"] = "day"
+    PROXY_LOG_PARTITIONS_AHEAD: int = 3
+    PROXY_LOG_RETENTION_DAYS: int = 30  # 0 = keep everything
+    PROXY_LOG_MAINTENANCE_INTERVAL_SECONDS: float = 3600.0
+
+    # proxy_logs query API (app/api/logs.py) and per-minute rollups (app/core/log_rollup.py)
+    PROXY_LOG_QUERY_MAX_LIMIT: int = 500
+    # rollups key on the proxied path cut to this many segments, ids replaced by {id}
+    PROXY_LOG_ROLLUP_PATH_SEGMENTS: int = 3
+    # the writer upserts rollups with every batch, or after this long when idle
+    PROXY_LOG_ROLLUP_FLUSH_SECONDS: float = 10.0
+    PROXY_LOG_ROLLUP_RETENTION_DAYS: int = 90  # 0 = keep everything
+    # max time range of one stats query
+    PROXY_LOG_STATS_MAX_HOURS: float = 24.0 * 7
+
+    # proxy_logs capture policy: first matching rule wins, else the default one
+    # (JSON in env, e.g. PROXY_LOG_RULES='[{"path_prefix": "/health", "sample_rate": 0.01}]')
+    PROXY_LOG_RULES: List[LogRule] = []
+    PROXY_LOG_DEFAULT_RULE: LogRule = LogRule()
+    # stored bodies are compressed; falls back to gzip if zstandard is missing
+    PROXY_LOG_BODY_CODEC: Literal["zstd", "gzip"] = "zstd"
+
+    # response cache for GETs (first matching route wins)
+    PROXY_CACHE_ENABLED: bool = False
+    PROXY_CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    PROXY_CACHE_REDIS_URL: str = "redis://redis:6379/0"
+    PROXY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PROXY_CACHE_MAX_ENTRY_BYTES: int = 1024 * 1024
+    # how long expired entries are kept for revalidation
+    PROXY_CACHE_STALE_TTL_SECONDS: float = 300.0
+    PROXY_CACHE_ROUTES: List[CacheRoute] = [CacheRoute()]
+
+    # single-flight: concurrent identical GET/HEADs share one upstream call
+    PROXY_COALESCE_ENABLED: bool = True
+    # request headers that must match too (besides method, URL, query and conditional/range headers)
+    PROXY_COALESCE_HEADERS: List[str] = ["accept", "accept-encoding", "authorization", "cookie"]
+    PROXY_COALESCE_MAX_BODY_BYTES: int = 1024 * 1024
+    PROXY_COALESCE_WAIT_TIMEOUT_SECONDS: float = 30.0
+
+    # circuit breaker around upstream calls (per worker)
+    PROXY_BREAKER_ENABLED: bool = True
+    PROXY_BREAKER_WINDOW_SECONDS: float = 30.0
+    PROXY_BREAKER_MIN_CALLS: int = 20  # in the window, before the rates are trusted
+    PROXY_BREAKER_ERROR_RATE: float = 0.5
+    PROXY_BREAKER_SLOW_CALL_SECONDS: float = 5.0
+    PROXY_BREAKER_SLOW_RATE: float = 0.8
+    # upstream statuses counted as failures (connection errors always are)
+    PROXY_BREAKER_FAILURE_STATUSES: List[int] = [502, 503, 504]
+    PROXY_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    PROXY_BREAKER_HALF_OPEN_CALLS: int = 3  # successful probes needed to close again
+
+    # hedged requests for idempotent calls (opt-in)
+    PROXY_HEDGE_ENABLED: bool = False
+    PROXY_HEDGE_DELAY_SECONDS: float = 0.5
+    # e.g. 95: hedge after the live p95 of upstream latency instead of the fixed delay
+    PROXY_HEDGE_DELAY_PERCENTILE: Optional[float] = None
+    PROXY_HEDGE_MIN_SAMPLES: int = 100
+    PROXY_HEDGE_MIN_DELAY_SECONDS: float = 0.05
+    # extra upstream load cap: hedges are at most this share of requests
+    PROXY_HEDGE_MAX_EXTRA_RATIO: float = 0.05
+    PROXY_HEDGE_BUDGET_MAX_TOKENS: int = 10
+
+    # client address: X-Forwarded-For is only trusted when the peer is one of these
+    # networks (nginx); the client is the right-most untrusted address in it
+    PROXY_TRUSTED_PROXIES: List[str] = ["127.0.0.1/32", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"]
+
+    # rate limits for proxied requests (app/upstream/ratelimit.py), 429 + Retry-After when hit
+    # (JSON in env, e.g. PROXY_RATE_LIMIT_RULES='[{"per": "client", "rate_per_second": 20, "burst": 40}]')
+    PROXY_RATE_LIMIT_ENABLED: bool = False
+    # "memory" limits each worker on its own, "redis" holds the limits across all workers
+    PROXY_RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    PROXY_RATE_LIMIT_REDIS_URL: str = "redis://redis:6379/0"
+    PROXY_RATE_LIMIT_RULES: List[RateLimitRule] = []
+    # memory backend: buckets kept per worker, least recently used ones are dropped
+    PROXY_RATE_LIMIT_MAX_BUCKETS: int = 100000
+
+    # cap on in-flight upstream requests (app/upstream/admission.py), 0 = no cap;
+    # over it requests wait in a short queue, then get 503 + Retry-After
+    PROXY_MAX_IN_FLIGHT: int = 0
+    PROXY_ADMISSION_BACKEND: Literal["memory", "redis"] = "memory"
+    PROXY_ADMISSION_REDIS_URL: str = "redis://redis:6379/0"
+    PROXY_ADMISSION_QUEUE_SIZE: int = 100  # waiting requests per worker
+    PROXY_ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 1.0
+    PROXY_ADMISSION_RETRY_AFTER_SECONDS: int = 1
+    # redis backend: a slot of a worker that died is freed after this long
+    PROXY_ADMISSION_SLOT_LEASE_SECONDS: float = 120.0
+
+    # async Odoo JSON-RPC clients (connection params stay in ODOO_1_* / ODOO_2_*)
+    ODOO_HTTP_MAX_CONNECTIONS: int = 20
+    ODOO_RPC_TIMEOUT_SECONDS: float = 30.0
+    # authenticated sessions per Odoo instance == concurrent RPCs
+    ODOO_RPC_CONCURRENCY: int = 8
+    # max wait for a free session before the call fails
+    ODOO_POOL_TIMEOUT_SECONDS: float = 30.0
+    # a session idle longer than this is checked (get_session_info) before reuse
+    ODOO_SESSION_CHECK_SECONDS: float = 300.0
+    # batch sync endpoints: max ids per request, records per bulk read/create
+    ODOO_BATCH_MAX_IDS: int = 5000
+    ODOO_BATCH_CHUNK_SIZE: int = 200
+
+    # user/stage mapping between the two Odoo (app/odoo_mappings.py)
+    ODOO_MAPPING_TTL_SECONDS: float = 300.0
+    # explicit user id maps and fallbacks, JSON in env, e.g. ODOO_USER_MAP_1_TO_2='{"2": 5}'
+    ODOO_USER_MAP_1_TO_2: Dict[int, int] = {}
+    ODOO_USER_MAP_2_TO_1: Dict[int, int] = {}
+    ODOO_USER_FALLBACK_1_TO_2: Optional[int] = None
+    ODOO_USER_FALLBACK_2_TO_1: Optional[int] = None
+
+    # write_date delta sync (app/odoo_delta_sync.py); 0 disables the background run
+    ODOO_DELTA_SYNC_INTERVAL_SECONDS: float = 300.0
+    ODOO_DELTA_PAGE_SIZE: int = 500
+    # each run re-reads this much before the watermark (late commits of long transactions)
+    ODOO_DELTA_OVERLAP_SECONDS: float = 60.0
+    # failed source ids kept for retry per stream
+    ODOO_DELTA_MAX_PENDING: int = 1000
+
+    # queue of webhook-triggered syncs (app/odoo_jobs.py); workers per process, 0 = enqueue only
+    ODOO_JOB_WORKERS: int = 4
+    ODOO_JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    ODOO_JOB_MAX_ATTEMPTS: int = 5
+    ODOO_JOB_RETRY_DELAY_SECONDS: float = 2.0
+    ODOO_JOB_RETRY_MAX_DELAY_SECONDS: float = 300.0
+    # a job running longer than this is cancelled and retried (and reclaimable if its worker died)
+    ODOO_JOB_LEASE_SECONDS: float = 120.0
+    ODOO_JOB_RETENTION_HOURS: float = 24.0
+
+    # reconciliation of Odoo 1 vs Odoo 2 (app/odoo_reconcile.py)
+    ODOO_RECONCILE_PAGE_SIZE: int = 1000
+    # sample ids kept per category (missing/orphaned/duplicate/divergent) in the report
+    ODOO_RECONCILE_REPORT_LIMIT: int = 200
+
+    # Prometheus /metrics (app/core/metrics.py); multiprocess mode via PROMETHEUS_MULTIPROC_DIR env
+    METRICS_ENABLED: bool = True
+    # proxied paths are labelled by this many leading segments (ids replaced by {id})
+    METRICS_PATH_SEGMENTS: int = 2
+    # distinct route labels per worker, the rest is "other"
+    METRICS_MAX_ROUTES: int = 200
 
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
@@ -26,6 +292,13 @@ class Settings(BaseSettings):
             f"@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
 
+    @property
+    def SQLALCHEMY_READ_DATABASE_URI(self) -> str:
+        return (
+            f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}"
+            f"@{self.DB_READ_HOST or self.DB_HOST}:{self.DB_READ_PORT or self.DB_PORT}/{self.DB_NAME}"
+        )
+
     class Config:
         env_file = ".env"
 
@@ -1,22 +1,107 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import time
+from typing import Any, Dict, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from app.core import metrics
 from app.core.config import settings
 
-engine = create_async_engine(
+
+def _pool_class(label: str) -> Type[AsyncAdaptedQueuePool]:
+    class InstrumentedPool(AsyncAdaptedQueuePool):
+        """Reports how long checkouts wait: _do_get blocks while the pool is exhausted."""
+
+        def _do_get(self):
+            started = time.monotonic()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                metrics.DB_POOL_TIMEOUTS.labels(label).inc()
+                raise
+            finally:
+                metrics.DB_POOL_CHECKOUT_WAIT.labels(label).observe(time.monotonic() - started)
+
+    return InstrumentedPool
+
+
+def _create_engine(url: str, label: str, pool_size: int, max_overflow: int, **connect_args: Any) -> AsyncEngine:
+    # asyncpg caches prepared statements per connection, SQLAlchemy keeps its own
+    # cache of them on top; both have to be off behind pgbouncer in transaction mode
+    url = make_url(url).update_query_dict({"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)})
+    new_engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=_pool_class(label),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        connect_args={"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE, **connect_args},
+    )
+    in_use = metrics.DB_POOL_IN_USE.labels(label)
+    event.listen(new_engine.sync_engine, "checkout", lambda *args: in_use.inc())
+    event.listen(new_engine.sync_engine, "checkin", lambda *args: in_use.dec())
+    return new_engine
+
+
+engine = _create_engine(
     settings.SQLALCHEMY_DATABASE_URI,
-    echo=False,
+    "primary",
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
 )
 
+# sessions take a connection on their first statement, not when they are opened
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     expire_on_commit=False,
     class_=AsyncSession,
 )
 
+# log queries and other heavy reads: separate pool (replica if DB_READ_HOST is set),
+# so they never take connections from the request path, and a statement timeout
+read_engine = _create_engine(
+    settings.SQLALCHEMY_READ_DATABASE_URI,
+    "read",
+    pool_size=settings.DB_READ_POOL_SIZE,
+    max_overflow=0,
+    server_settings={"statement_timeout": str(settings.DB_READ_STATEMENT_TIMEOUT_MS)},
+)
+
+ReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+)
+
 Base = declarative_base()
 
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Pool usage of this worker."""
+    stats = {}
+    for label, pool_engine in (("primary", engine), ("read", read_engine)):
+        pool = pool_engine.pool
+        stats[label] = {
+            "size": pool.size(),
+            "timeout_seconds": pool.timeout(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+        }
+    return stats
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    await read_engine.dispose()
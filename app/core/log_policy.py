@@ -0,0 +1,115 @@
+"""
+Capture policy for proxy_logs.
+
+The hot path only keeps a bounded prefix of raw body bytes; which rule
+applies, whether the request is sampled in, which headers survive and how
+much body is kept is decided here once the response status is known.
+Bodies are compressed later, in the background writer.
+"""
+import gzip
+import random
+from typing import Any, Dict, Iterable, Optional
+
+from app.core.config import LogRule, settings
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is used instead
+    zstandard = None
+
+
+def max_body_bytes() -> int:
+    """Largest body prefix any rule may want, i.e. what the hot path has to keep."""
+    rules = [*settings.PROXY_LOG_RULES, settings.PROXY_LOG_DEFAULT_RULE]
+    return max((rule.body_max_bytes for rule in rules if rule.capture_body), default=0)
+
+
+def _status_matches(patterns: Iterable[str], status: Optional[int]) -> bool:
+    if status is None:
+        return False
+    code = str(status)
+    for pattern in patterns:
+        pattern = pattern.lower()
+        if pattern == code or (pattern.endswith("xx") and code.startswith(pattern[0])):
+            return True
+    return False
+
+
+def select_rule(path: str, method: str, status: Optional[int]) -> LogRule:
+    for rule in settings.PROXY_LOG_RULES:
+        if not path.startswith(rule.path_prefix):
+            continue
+        if rule.methods and method.upper() not in (m.upper() for m in rule.methods):
+            continue
+        if rule.statuses and not _status_matches(rule.statuses, status):
+            continue
+        return rule
+    return settings.PROXY_LOG_DEFAULT_RULE
+
+
+def is_error(status: Optional[int]) -> bool:
+    """Rows worth keeping over successes: no upstream answer (None) or >= 400."""
+    return status is None or status >= 400
+
+
+def should_log(rule: LogRule, status: Optional[int]) -> bool:
+    """``status`` is None when upstream never answered."""
+    if is_error(status) and rule.always_log_errors:
+        return True
+    return rule.sample_rate >= 1.0 or random.random() < rule.sample_rate
+
+
+def filter_headers(rule: LogRule, headers: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not headers:
+        return None
+    keep = {h.lower() for h in rule.keep_headers}
+    drop = {h.lower() for h in rule.drop_headers}
+    return {
+        name: value
+        for name, value in headers.items()
+        if name.lower() not in drop and (not keep or name.lower() in keep)
+    } or None
+
+
+def body_prefix(rule: LogRule, data: bytes) -> Optional[bytes]:
+    if not rule.capture_body or not data:
+        return None
+    return bytes(data[: rule.body_max_bytes])
+
+
+def body_codec() -> str:
+    if settings.PROXY_LOG_BODY_CODEC == "zstd" and zstandard is not None:
+        return "zstd"
+    return "gzip"
+
+
+def compress_body(data: Optional[bytes], codec: str) -> Optional[bytes]:
+    if not data:
+        return None
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=5)
+
+
+def decompress_body(data: Optional[bytes], codec: Optional[str]) -> Optional[bytes]:
+    if not data:
+        return None
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed bodies")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def compress_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Compress the raw body prefixes of one queued row (runs in the writer)."""
+    codec = body_codec()
+    request_body = compress_body(row.get("request_body_compressed"), codec)
+    response_body = compress_body(row.get("response_body_compressed"), codec)
+    return {
+        **row,
+        "request_body_compressed": request_body,
+        "response_body_compressed": response_body,
+        "body_codec": codec if (request_body or response_body) else None,
+    }
+
@@ -0,0 +1,135 @@
+"""
+Per-minute rollups of proxied requests (table proxy_log_rollups_minute).
+
+Every proxied request is added to an in-memory buffer of the worker, keyed by
+(minute, normalized path, method) — also the ones the log policy samples out
+or a full writer queue drops, so the aggregates are complete. The proxy_logs
+writer upserts the buffer with every batch it flushes (or every
+PROXY_LOG_ROLLUP_FLUSH_SECONDS when idle); counters are added to what other
+workers already wrote, latency goes into fixed histogram buckets, so
+percentiles can be estimated for any group of rows without touching
+proxy_logs.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import metrics
+from app.core.config import settings
+
+# upper bounds of the latency buckets; one more bucket counts everything above
+DURATION_BUCKETS_MS: Tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+Key = Tuple[datetime, str, str]
+
+_UPSERT_SQL = text(
+    """
+    INSERT INTO proxy_log_rollups_minute AS r
+        (bucket, path, method, requests, client_errors, server_errors,
+         duration_sum_ms, duration_max_ms, duration_buckets)
+    VALUES (:bucket, :path, :method, :requests, :client_errors, :server_errors,
+            :duration_sum_ms, :duration_max_ms, :duration_buckets)
+    ON CONFLICT (bucket, path, method) DO UPDATE SET
+        requests = r.requests + excluded.requests,
+        client_errors = r.client_errors + excluded.client_errors,
+        server_errors = r.server_errors + excluded.server_errors,
+        duration_sum_ms = r.duration_sum_ms + excluded.duration_sum_ms,
+        duration_max_ms = GREATEST(r.duration_max_ms, excluded.duration_max_ms),
+        duration_buckets = ARRAY(
+            SELECT a + b
+            FROM unnest(r.duration_buckets, excluded.duration_buckets) WITH ORDINALITY AS t(a, b, n)
+            ORDER BY n
+        )
+    """
+)
+
+
+def path_key(upstream_path: str) -> str:
+    return metrics.normalize_path(
+        f"{settings.API_V1_STR}/proxy", upstream_path, settings.PROXY_LOG_ROLLUP_PATH_SEGMENTS
+    )
+
+
+def _bucket_index(duration_ms: float) -> int:
+    for i, bound in enumerate(DURATION_BUCKETS_MS):
+        if duration_ms <= bound:
+            return i
+    return len(DURATION_BUCKETS_MS)
+
+
+class RollupBuffer:
+    def __init__(self) -> None:
+        self._entries: Dict[Key, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, created_at: datetime, path: str, method: str, status: Optional[int], duration_ms: float) -> None:
+        key = (created_at.replace(second=0, microsecond=0), path, method)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {
+                "requests": 0,
+                "client_errors": 0,
+                "server_errors": 0,
+                "duration_sum_ms": 0.0,
+                "duration_max_ms": 0.0,
+                "duration_buckets": [0] * (len(DURATION_BUCKETS_MS) + 1),
+            }
+        entry["requests"] += 1
+        if status is None or status >= 500:
+            entry["server_errors"] += 1
+        elif status >= 400:
+            entry["client_errors"] += 1
+        entry["duration_sum_ms"] += duration_ms
+        entry["duration_max_ms"] = max(entry["duration_max_ms"], duration_ms)
+        entry["duration_buckets"][_bucket_index(duration_ms)] += 1
+
+    def take(self) -> Dict[Key, Dict[str, Any]]:
+        entries, self._entries = self._entries, {}
+        return entries
+
+    def restore(self, entries: Dict[Key, Dict[str, Any]]) -> None:
+        """Put back entries whose upsert failed, merged with what came in meanwhile."""
+        for key, old in entries.items():
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = old
+                continue
+            for field in ("requests", "client_errors", "server_errors", "duration_sum_ms"):
+                entry[field] += old[field]
+            entry["duration_max_ms"] = max(entry["duration_max_ms"], old["duration_max_ms"])
+            entry["duration_buckets"] = [a + b for a, b in zip(entry["duration_buckets"], old["duration_buckets"])]
+
+
+async def upsert(db: AsyncSession, entries: Dict[Key, Dict[str, Any]]) -> None:
+    # same key order in every worker, so concurrent upserts cannot deadlock
+    rows = [
+        {"bucket": bucket, "path": path, "method": method, **values}
+        for (bucket, path, method), values in sorted(entries.items())
+    ]
+    if rows:
+        await db.execute(_UPSERT_SQL, rows)
+
+
+def histogram_percentile(counts: Sequence[int], p: float, max_ms: Optional[float] = None) -> Optional[float]:
+    """Estimate of the p-th percentile, linear inside the bucket it falls into."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = p / 100.0 * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = DURATION_BUCKETS_MS[i - 1] if i > 0 else 0.0
+            if i >= len(DURATION_BUCKETS_MS):
+                return max_ms if max_ms is not None else lower
+            upper = DURATION_BUCKETS_MS[i]
+            if max_ms is not None:
+                upper = min(upper, max_ms)
+            return round(lower + (upper - lower) * (rank - seen) / count, 2)
+        seen += count
+    return max_ms
+
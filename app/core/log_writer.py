@@ -0,0 +1,213 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core import log_rollup, metrics
+from app.core.config import settings
+from app.core.log_policy import compress_row, is_error
+from app.core.db import AsyncSessionLocal
+from app.models.proxy_log import ProxyLog
+
+_STOP = object()
+
+
+class ProxyLogWriter:
+    """
+    Background writer for proxy_logs.
+
+    The request path only puts a row on a bounded in-memory queue; one task
+    per worker drains it and bulk-inserts the rows in batches, flushing when
+    a batch is full or PROXY_LOG_FLUSH_INTERVAL_SECONDS has passed.
+
+    What happens when the queue is full is set by PROXY_LOG_OVERFLOW_POLICY:
+      - "drop":   the new row is dropped;
+      - "sample": once the queue is PROXY_LOG_SAMPLE_THRESHOLD full only
+                  PROXY_LOG_SAMPLE_RATE of successful rows are kept
+                  (errors are always kept while there is room);
+      - "block":  the request waits up to PROXY_LOG_BLOCK_TIMEOUT_SECONDS
+                  for room, then the row is dropped.
+
+    Every request is also counted in per-minute rollups (app/core/log_rollup.py),
+    upserted after each batch.
+    """
+
+    def __init__(self) -> None:
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.queued_total = 0
+        self.written_total = 0
+        self.dropped_total = 0
+        self.failed_total = 0
+        self.batches_total = 0
+        self.last_flush_ms: Optional[float] = None
+        self._rollup = log_rollup.RollupBuffer()
+        self._rollup_flushed_at = time.monotonic()
+        self.rollup_failures_total = 0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.PROXY_LOG_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run(), name="proxy-log-writer")
+
+    async def stop(self) -> None:
+        """Flush everything still queued and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    def observe(
+        self, created_at: datetime, path: str, method: str, status: Optional[int], duration_ms: Optional[float]
+    ) -> None:
+        """Count one proxied request in the rollups, whether or not its row is logged."""
+        self._rollup.add(created_at, path, method, status, duration_ms or 0.0)
+
+    async def put(self, row: Dict[str, Any]) -> bool:
+        """Queue one proxy_logs row. Returns False if the row was dropped."""
+        queue = self._queue
+        if queue is None:
+            self._dropped()
+            return False
+
+        policy = settings.PROXY_LOG_OVERFLOW_POLICY
+        if policy == "block":
+            try:
+                await asyncio.wait_for(queue.put(row), timeout=settings.PROXY_LOG_BLOCK_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                self._dropped()
+                return False
+            self._queued()
+            return True
+
+        if policy == "sample" and not is_error(row.get("response_status")):
+            fill = queue.qsize() / queue.maxsize if queue.maxsize else 0.0
+            if fill >= settings.PROXY_LOG_SAMPLE_THRESHOLD and random.random() >= settings.PROXY_LOG_SAMPLE_RATE:
+                self._dropped()
+                return False
+
+        try:
+            queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self._dropped()
+            return False
+        self._queued()
+        return True
+
+    def _queued(self) -> None:
+        self.queued_total += 1
+        metrics.LOG_ROWS.labels("queued").inc()
+        metrics.LOG_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def _dropped(self) -> None:
+        self.dropped_total += 1
+        metrics.LOG_ROWS.labels("dropped").inc()
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if self._queue is not None:
+                metrics.LOG_QUEUE_DEPTH.set(self._queue.qsize())
+            if batch:
+                await self._write(batch)
+            if batch or stopping or time.monotonic() - self._rollup_flushed_at >= settings.PROXY_LOG_ROLLUP_FLUSH_SECONDS:
+                await self._flush_rollup()
+
+    async def _next_batch(self) -> tuple[List[Dict[str, Any]], bool]:
+        queue = self._queue
+        batch: List[Dict[str, Any]] = []
+
+        try:
+            # wake up now and then to flush rollups of requests that were not logged
+            item = await asyncio.wait_for(queue.get(), timeout=settings.PROXY_LOG_ROLLUP_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            return batch, False
+        if item is _STOP:
+            return self._drain(batch), True
+        batch.append(item)
+
+        deadline = time.monotonic() + settings.PROXY_LOG_FLUSH_INTERVAL_SECONDS
+        while len(batch) < settings.PROXY_LOG_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                return self._drain(batch), True
+            batch.append(item)
+        return batch, False
+
+    def _drain(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """On shutdown: take whatever is left in the queue without waiting."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return batch
+            if item is not _STOP:
+                batch.append(item)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        start_ts = time.monotonic()
+        # shutdown drain can be bigger than one batch
+        for i in range(0, len(batch), settings.PROXY_LOG_BATCH_SIZE):
+            chunk = batch[i : i + settings.PROXY_LOG_BATCH_SIZE]
+            chunk_ts = time.monotonic()
+            try:
+                chunk = await asyncio.to_thread(lambda rows=chunk: [compress_row(row) for row in rows])
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(ProxyLog), chunk)
+                    await db.commit()
+            except Exception as e:
+                self.failed_total += len(chunk)
+                metrics.LOG_ROWS.labels("failed").inc(len(chunk))
+                print(f"[proxy-log-writer] failed to write {len(chunk)} rows: {e}")
+                continue
+            metrics.LOG_FLUSH_DURATION.observe(time.monotonic() - chunk_ts)
+            metrics.LOG_ROWS.labels("written").inc(len(chunk))
+            self.written_total += len(chunk)
+            self.batches_total += 1
+        self.last_flush_ms = (time.monotonic() - start_ts) * 1000.0
+
+    async def _flush_rollup(self) -> None:
+        self._rollup_flushed_at = time.monotonic()
+        entries = self._rollup.take()
+        if not entries:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await log_rollup.upsert(db, entries)
+                await db.commit()
+        except Exception as e:
+            self.rollup_failures_total += 1
+            self._rollup.restore(entries)
+            print(f"[proxy-log-writer] failed to write {len(entries)} rollups: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "overflow_policy": settings.PROXY_LOG_OVERFLOW_POLICY,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "queue_maxsize": settings.PROXY_LOG_QUEUE_SIZE,
+            "queued_total": self.queued_total,
+            "written_total": self.written_total,
+            "dropped_total": self.dropped_total,
+            "failed_total": self.failed_total,
+            "batches_total": self.batches_total,
+            "last_flush_ms": self.last_flush_ms,
+            "rollup_pending": len(self._rollup),
+            "rollup_failures_total": self.rollup_failures_total,
+        }
+
+
+proxy_log_writer = ProxyLogWriter()
@@ -0,0 +1,236 @@
+"""
+Prometheus metrics, exposed at /metrics.
+
+With several uvicorn workers every process keeps its own counters, so the
+service runs prometheus_client in multiprocess mode whenever
+PROMETHEUS_MULTIPROC_DIR is set (see docker-compose.prod.yml): each worker
+writes its samples to files in that directory and /metrics, whichever worker
+answers it, sums them up. The directory must be emptied before the workers
+start. Without the variable (dev, a single worker) the default registry is used.
+
+Label values are kept bounded: routes are route templates, proxied paths are
+cut to METRICS_PATH_SEGMENTS segments with id-like segments replaced by
+"{id}", and at most METRICS_MAX_ROUTES distinct routes are tracked per worker
+(the rest is reported as "other").
+"""
+import os
+import re
+import time
+from typing import Any, Dict, Optional, Set
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from app.core.config import settings
+
+KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+    r"|[0-9a-fA-F]{16,}|[A-Za-z0-9_\-=.]{32,})$"
+)
+
+# --- HTTP (every request, proxied or not) ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "End-to-end request time, until the last body byte is sent",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+# --- upstream calls of the proxy ---
+
+UPSTREAM_ATTEMPT_DURATION = Histogram(
+    "proxy_upstream_attempt_duration_seconds",
+    "Time to response headers of one upstream attempt",
+    ["outcome"],
+)
+UPSTREAM_ATTEMPTS = Histogram(
+    "proxy_upstream_attempts",
+    "Upstream attempts per proxied request (1 = no retry)",
+    buckets=(0, 1, 2, 3, 4, 5, 8),
+)
+UPSTREAM_GAVE_UP = Counter(
+    "proxy_upstream_gave_up_total",
+    "Proxied requests that stopped retrying without a usable response",
+    ["reason"],
+)
+
+UPSTREAM_EJECTIONS = Counter(
+    "proxy_upstream_ejections_total",
+    "Upstream instances taken out of rotation (passive: failed calls, active: failed health checks)",
+    ["upstream", "check"],
+)
+UPSTREAM_INSTANCE_REQUESTS = Counter(
+    "proxy_upstream_instance_requests_total", "Calls sent to each upstream instance", ["upstream", "outcome"]
+)
+
+# --- admission control of the proxy ---
+
+ADMISSION_REJECTED = Counter(
+    "proxy_admission_rejected_total",
+    "Proxied requests turned away (rate_limit_client, rate_limit_route, queue_full, queue_timeout)",
+    ["reason"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "proxy_admission_in_flight", "Upstream requests holding an admission slot", multiprocess_mode="livesum"
+)
+ADMISSION_WAIT = Histogram(
+    "proxy_admission_wait_seconds",
+    "Queue wait for an admission slot",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+# --- SQLAlchemy connection pools (app/core/db.py) ---
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, including opening a new one",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0),
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Checked-out pool connections", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that gave up waiting for a connection", ["pool"])
+
+# --- proxy_logs writer ---
+
+LOG_QUEUE_DEPTH = Gauge(
+    "proxy_log_queue_depth",
+    "Rows waiting in the proxy_logs writer queue",
+    multiprocess_mode="livesum",
+)
+LOG_ROWS = Counter("proxy_log_rows_total", "proxy_logs rows by outcome", ["outcome"])
+LOG_FLUSH_DURATION = Histogram(
+    "proxy_log_flush_duration_seconds",
+    "Compress + bulk insert time of one proxy_logs batch",
+)
+
+# --- Odoo JSON-RPC ---
+
+ODOO_RPC_DURATION = Histogram(
+    "odoo_rpc_duration_seconds",
+    "Odoo call_kw time, including a re-login retry",
+    ["instance", "model", "method"],
+)
+ODOO_RPC_ERRORS = Counter("odoo_rpc_errors_total", "Failed Odoo calls", ["instance", "model", "method"])
+ODOO_POOL_WAIT = Histogram(
+    "odoo_pool_wait_seconds",
+    "Wait for a free Odoo session",
+    ["instance"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+ODOO_SESSIONS_IN_USE = Gauge(
+    "odoo_sessions_in_use", "Borrowed Odoo sessions", ["instance"], multiprocess_mode="livesum"
+)
+ODOO_SESSION_EVENTS = Counter(
+    "odoo_session_events_total",
+    "Odoo session pool events (login, relogin, health_failure, pool_timeout)",
+    ["instance", "event"],
+)
+
+# --- Odoo sync ---
+
+SYNC_RECORDS = Counter("odoo_sync_records_total", "Records through the batch sync", ["model", "status"])
+SYNC_JOBS = Counter("odoo_sync_jobs_total", "Finished sync job attempts", ["kind", "outcome"])
+SYNC_JOB_DURATION = Histogram(
+    "odoo_sync_job_duration_seconds",
+    "Run time of one sync job attempt",
+    ["kind"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+_routes: Set[str] = set()
+
+
+def _bounded_route(route: str) -> str:
+    if route in _routes:
+        return route
+    if len(_routes) >= settings.METRICS_MAX_ROUTES:
+        return "other"
+    _routes.add(route)
+    return route
+
+
+def normalize_path(prefix: str, path: str, segments: int) -> str:
+    """("/proxy", "/orders/123/items", 2) -> "/proxy/orders/{id}"."""
+    kept = [s for s in path.split("/") if s][:segments]
+    normalized = ["{id}" if _ID_SEGMENT.match(s) else s for s in kept]
+    return "/".join([prefix.rstrip("/"), *normalized]) or "/"
+
+
+def path_label(prefix: str, path: str) -> str:
+    """Route label for a free-form path, see normalize_path."""
+    return _bounded_route(normalize_path(prefix, path, settings.METRICS_PATH_SEGMENTS))
+
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    explicit = (scope.get("state") or {}).get("metrics_route")
+    if explicit:
+        return explicit
+    if scope.get("endpoint") is None:
+        return "unmatched"
+    # template from the matched path, e.g. /api/v1/odoo/projects/jobs/17 -> .../jobs/{job_id}
+    # (route.path lacks the include_router prefix)
+    params = {str(v): k for k, v in (scope.get("path_params") or {}).items()}
+    segments = ["{%s}" % params[s] if s in params else s for s in scope["path"].split("/")]
+    return _bounded_route("/".join(segments))
+
+
+class MetricsMiddleware:
+    """Times every HTTP request until its response is fully sent."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not settings.METRICS_ENABLED or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status: Optional[int] = None
+        start_ts = time.monotonic()
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            method = scope["method"] if scope["method"] in KNOWN_METHODS else "other"
+            HTTP_REQUEST_DURATION.labels(method, _route_label(scope), str(status or 500)).observe(
+                time.monotonic() - start_ts
+            )
+
+
+def status_outcome(status: Optional[int]) -> str:
+    return f"{status // 100}xx" if status else "error"
+
+
+def render() -> tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead() -> None:
+    """On worker shutdown: drop its live gauges from the shared directory."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+from app.core.db import engine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+
+def _alembic_config(connection=None) -> Config:
+    cfg = Config()
+    cfg.set_main_option("script_location", str(MIGRATIONS_DIR))
+    cfg.attributes["connection"] = connection
+    return cfg
+
+
+async def upgrade_head() -> None:
+    """`alembic upgrade head` on the app's own engine (used on startup)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: command.upgrade(_alembic_config(sync_conn), "head"))
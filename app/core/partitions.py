@@ -0,0 +1,150 @@
+"""
+Range partitions of proxy_logs by created_at.
+
+Partitions are created PROXY_LOG_PARTITIONS_AHEAD periods ahead of time and
+whole partitions older than PROXY_LOG_RETENTION_DAYS are dropped, so
+retention never runs a DELETE over the big table. Maintenance runs on
+startup and then every PROXY_LOG_MAINTENANCE_INTERVAL_SECONDS; only one
+worker does the job at a time (advisory lock).
+
+By hand:  python -m app.core.partitions
+"""
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.db import engine
+
+PARENT_TABLE = "proxy_logs"
+MAINTENANCE_LOCK_KEY = 7_210_002
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def _period_start(ts: datetime) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    start = datetime(ts.year, ts.month, ts.day, tzinfo=timezone.utc)
+    if settings.PROXY_LOG_PARTITION_INTERVAL == "week":
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def _period_end(start: datetime) -> datetime:
+    days = 7 if settings.PROXY_LOG_PARTITION_INTERVAL == "week" else 1
+    return start + timedelta(days=days)
+
+
+def existing_partitions(conn: Connection) -> List[Tuple[str, datetime, datetime]]:
+    """(name, from, to) of every attached partition of proxy_logs."""
+    rows = conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": PARENT_TABLE},
+    ).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or "")
+        if not match:
+            continue
+        lower, upper = (datetime.fromisoformat(v) for v in match.groups())
+        partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(
+    conn: Connection,
+    now: Optional[datetime] = None,
+    since: Optional[datetime] = None,
+) -> List[str]:
+    """Create missing partitions from ``since`` (default: now) up to the ahead window."""
+    now = now or datetime.now(timezone.utc)
+    existing = existing_partitions(conn)
+    until = _period_start(now)
+    for _ in range(settings.PROXY_LOG_PARTITIONS_AHEAD):
+        until = _period_end(until)
+
+    created = []
+    start = _period_start(since or now)
+    while start <= until:
+        end = _period_end(start)
+        overlaps = any(lower < end and start < upper for _, lower, upper in existing)
+        if not overlaps:
+            name = f"{PARENT_TABLE}_p{start:%Y%m%d}"
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+            )
+            created.append(name)
+        start = end
+    return created
+
+
+def drop_expired_partitions(conn: Connection, now: Optional[datetime] = None) -> List[str]:
+    """Drop partitions whose whole range is older than the retention window."""
+    if settings.PROXY_LOG_RETENTION_DAYS <= 0:
+        return []
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=settings.PROXY_LOG_RETENTION_DAYS)
+
+    dropped = []
+    for name, _, upper in existing_partitions(conn):
+        if upper <= cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def delete_expired_rollups(conn: Connection) -> int:
+    """proxy_log_rollups_minute rows older than PROXY_LOG_ROLLUP_RETENTION_DAYS."""
+    if settings.PROXY_LOG_ROLLUP_RETENTION_DAYS <= 0:
+        return 0
+    return conn.execute(
+        text("DELETE FROM proxy_log_rollups_minute WHERE bucket < now() - make_interval(days => :days)"),
+        {"days": settings.PROXY_LOG_ROLLUP_RETENTION_DAYS},
+    ).rowcount
+
+
+def maintain_partitions(conn: Connection) -> Dict[str, Any]:
+    locked = conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}).scalar()
+    if not locked:
+        return {"skipped": True, "created": [], "dropped": [], "rollups_deleted": 0}
+    return {
+        "skipped": False,
+        "created": ensure_partitions(conn),
+        "dropped": drop_expired_partitions(conn),
+        "rollups_deleted": delete_expired_rollups(conn),
+    }
+
+
+async def run_partition_maintenance() -> Dict[str, Any]:
+    async with engine.begin() as conn:
+        return await conn.run_sync(maintain_partitions)
+
+
+async def partition_maintenance_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.PROXY_LOG_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            result = await run_partition_maintenance()
+            if result["created"] or result["dropped"] or result["rollups_deleted"]:
+                print(
+                    f"[partitions] created={result['created']} dropped={result['dropped']} "
+                    f"rollups_deleted={result['rollups_deleted']}"
+                )
+        except Exception as e:
+            print(f"[partitions] maintenance failed: {e}")
+
+
+if __name__ == "__main__":
+    print(asyncio.run(run_partition_maintenance()))
@@ -1,27 +1,41 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 import asyncio
 from sqlalchemy.exc import OperationalError
 
+from app.core import metrics
 from app.core.config import settings
-from app.core.db import Base, engine
+from app.core.db import dispose_engines
+from app.core.migrations import upgrade_head
+from app.core.partitions import partition_maintenance_loop, run_partition_maintenance
 from app.api import proxy  # noqa: F401
+from app.api import logs, status
+from app.core.log_writer import proxy_log_writer
+from app.upstream.admission import admission
+from app.upstream.balancer import balancer
+from app.upstream.cache import response_cache
+from app.upstream.client import upstream_client
+from app.upstream.ratelimit import rate_limiter
 import app.models  # noqa: F401
+from .odoo_async_client import odoo1, odoo2
+from .odoo_batch_sync import router as odoo_batch_router
+from .odoo_delta_sync import delta_sync_loop, router as odoo_delta_router
+from .odoo_jobs import job_workers, router as odoo_jobs_router
+from .odoo_mappings import odoo_mappings, router as odoo_mappings_router
 from .odoo_projects_gateway import router as odoo_projects_router
-
-app = FastAPI(title=settings.PROJECT_NAME)
+from .odoo_reconcile import router as odoo_reconcile_router, stop_runs as stop_reconcile_runs
 
 
-@app.on_event("startup")
 async def on_startup() -> None:
-    """Старт апки: чекаємо, поки буде доступна БД, і тоді створюємо таблиці."""
+    """Старт апки: чекаємо, поки буде доступна БД, і тоді накатуємо міграції."""
     max_attempts = 10
     delay_seconds = 2
 
     for attempt in range(1, max_attempts + 1):
         try:
-            async with engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-            print(f"[startup] DB connected, metadata created (attempt {attempt})")
+            await upgrade_head()
+            print(f"[startup] DB connected, migrations applied (attempt {attempt})")
             break
         except Exception as e:
             # можна звузити до OperationalError, але хай ловить усе
@@ -31,11 +45,87 @@ async def on_startup() -> None:
             print(f"[startup] DB not ready (attempt {attempt}), retrying in {delay_seconds}s...")
             await asyncio.sleep(delay_seconds)
 
+    # партиції proxy_logs мають існувати до першого запису в лог
+    result = await run_partition_maintenance()
+    print(f"[startup] proxy_logs partitions: {result}")
+
+
+async def warm_odoo_mappings() -> None:
+    """Мапінг користувачів/стадій вантажимо у фоні, щоб недоступна Odoo не блокувала старт."""
+    try:
+        await odoo_mappings.refresh()
+        print(f"[startup] Odoo mappings loaded: {odoo_mappings.stats()}")
+    except Exception as e:
+        print(f"[startup] Odoo mappings not loaded, will retry on first sync: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await on_startup()
+    # один пул з'єднань до upstream на воркер, живе весь час роботи апки
+    await upstream_client.start()
+    # пули інстансів upstream по префіксах шляху, активні health-check'и у фоні
+    await balancer.start()
+    await response_cache.start()
+    # ліміти запитів і кап на одночасні запити в upstream (in-process або спільні через Redis)
+    await rate_limiter.start()
+    await admission.start()
+    # логи пишуться пачками у фоні, на shutdown дописуємо чергу
+    await proxy_log_writer.start()
+    # пули з'єднань до обох Odoo; логін лінивий, на першому виклику
+    await odoo1.start()
+    await odoo2.start()
+    # вебхуки лише ставлять синк у чергу, виконують його ці воркери
+    await job_workers.start()
+    maintenance_task = asyncio.create_task(partition_maintenance_loop())
+    mappings_task = asyncio.create_task(warm_odoo_mappings())
+    # пропущені вебхуки добирає delta-синк за write_date
+    delta_task = asyncio.create_task(delta_sync_loop()) if settings.ODOO_DELTA_SYNC_INTERVAL_SECONDS > 0 else None
+    try:
+        yield
+    finally:
+        maintenance_task.cancel()
+        mappings_task.cancel()
+        if delta_task is not None:
+            delta_task.cancel()
+        await job_workers.stop()
+        await stop_reconcile_runs()
+        await balancer.close()
+        await upstream_client.close()
+        await response_cache.close()
+        await rate_limiter.close()
+        await admission.close()
+        await proxy_log_writer.stop()
+        await odoo1.close()
+        await odoo2.close()
+        # після дописаних логів і зупинених воркерів з'єднання більше не потрібні
+        await dispose_engines()
+        # live-gauge воркера більше не враховуються в /metrics
+        metrics.mark_worker_dead()
+
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
 
 @app.get("/health", tags=["health"])
 async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    # з PROMETHEUS_MULTIPROC_DIR — сума по всіх воркерах, хоч який відповів
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 app.include_router(proxy.router, prefix=settings.API_V1_STR)
+app.include_router(status.router, prefix=settings.API_V1_STR)
+app.include_router(logs.router, prefix=settings.API_V1_STR)
 app.include_router(odoo_projects_router)
+app.include_router(odoo_batch_router)
+app.include_router(odoo_mappings_router)
+app.include_router(odoo_delta_router)
+app.include_router(odoo_jobs_router)
+app.include_router(odoo_reconcile_router)
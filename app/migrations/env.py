@@ -0,0 +1,78 @@
+import asyncio
+import re
+from logging.config import fileConfig
+
+from sqlalchemy import pool, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from alembic import context
+
+from app.core.config import settings
+from app.core.db import Base
+import app.models  # noqa: F401
+
+config = context.config
+
+# when the app runs migrations itself it passes its own connection and
+# we must not touch its logging setup
+if config.config_file_name is not None and config.attributes.get("connection") is None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# all uvicorn workers run `upgrade head` on startup -> only one at a time
+MIGRATIONS_LOCK_KEY = 7_210_001
+
+# partitions of partitioned tables are created/dropped at runtime
+# (app/core/partitions.py), autogenerate must not try to drop them
+_PARTITION_RE = re.compile(r"^proxy_logs_p\d{8}$")
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    table_name = name if type_ == "table" else getattr(getattr(obj, "table", None), "name", None)
+    return not (reflected and table_name and _PARTITION_RE.match(table_name))
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=settings.SQLALCHEMY_DATABASE_URI,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
+
+    with context.begin_transaction():
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    connectable = create_async_engine(settings.SQLALCHEMY_DATABASE_URI, poolclass=pool.NullPool)
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
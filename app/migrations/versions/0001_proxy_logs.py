@@ -0,0 +1,47 @@
+"""proxy_logs as created by Base.metadata.create_all before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing deployments already have the table from create_all
+    if sa.inspect(op.get_bind()).has_table("proxy_logs"):
+        return
+
+    op.create_table(
+        "proxy_logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("client_ip", sa.String(45), nullable=True),
+        sa.Column("method", sa.String(10), nullable=False),
+        sa.Column("path", sa.Text(), nullable=False),
+        sa.Column("upstream_url", sa.Text(), nullable=False),
+        sa.Column("query_params", postgresql.JSONB(), nullable=True),
+        sa.Column("request_headers", postgresql.JSONB(), nullable=True),
+        sa.Column("request_body", sa.Text(), nullable=True),
+        sa.Column("response_status", sa.Integer(), nullable=True),
+        sa.Column("response_headers", postgresql.JSONB(), nullable=True),
+        sa.Column("response_body", sa.Text(), nullable=True),
+        sa.Column("duration_ms", sa.Float(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_proxy_logs_id", "proxy_logs", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("proxy_logs")
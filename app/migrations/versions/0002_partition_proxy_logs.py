@@ -0,0 +1,120 @@
+"""range-partition proxy_logs by created_at, add BRIN/btree indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 12:30:00
+
+The old table is renamed to proxy_logs_legacy, rows inside the retention
+window are copied into the new partitioned table and the legacy table is
+dropped. The id sequence is kept, so ids keep growing from where they were.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.core.partitions import ensure_partitions
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    "id, created_at, client_ip, method, path, upstream_url, query_params, request_headers, "
+    "request_body, response_status, response_headers, response_body, duration_ms, error"
+)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    op.execute("ALTER TABLE proxy_logs RENAME TO proxy_logs_legacy")
+    op.execute("ALTER INDEX IF EXISTS proxy_logs_pkey RENAME TO proxy_logs_legacy_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_proxy_logs_id")
+    op.execute("ALTER SEQUENCE proxy_logs_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE proxy_logs_id_seq AS bigint")
+
+    op.execute(
+        """
+        CREATE TABLE proxy_logs (
+            id BIGINT NOT NULL DEFAULT nextval('proxy_logs_id_seq'),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            client_ip VARCHAR(45),
+            method VARCHAR(10) NOT NULL,
+            path TEXT NOT NULL,
+            upstream_url TEXT NOT NULL,
+            query_params JSONB,
+            request_headers JSONB,
+            request_body TEXT,
+            response_status INTEGER,
+            response_headers JSONB,
+            response_body TEXT,
+            duration_ms FLOAT,
+            error TEXT,
+            CONSTRAINT proxy_logs_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE proxy_logs_id_seq OWNED BY proxy_logs.id")
+
+    op.create_index("ix_proxy_logs_created_at_brin", "proxy_logs", ["created_at"], postgresql_using="brin")
+    op.create_index("ix_proxy_logs_path", "proxy_logs", ["path"], postgresql_ops={"path": "text_pattern_ops"})
+    op.create_index("ix_proxy_logs_response_status", "proxy_logs", ["response_status"])
+
+    # rows older than the retention window would be dropped right away anyway
+    cutoff = None
+    if settings.PROXY_LOG_RETENTION_DAYS > 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.PROXY_LOG_RETENTION_DAYS)
+    oldest = conn.execute(
+        sa.text(
+            "SELECT min(created_at) FROM proxy_logs_legacy "
+            "WHERE CAST(:cutoff AS timestamptz) IS NULL OR created_at >= :cutoff"
+        ),
+        {"cutoff": cutoff},
+    ).scalar()
+    ensure_partitions(conn, since=oldest)
+
+    conn.execute(
+        sa.text(
+            f"INSERT INTO proxy_logs ({COLUMNS}) SELECT {COLUMNS} FROM proxy_logs_legacy "
+            "WHERE CAST(:cutoff AS timestamptz) IS NULL OR created_at >= :cutoff"
+        ),
+        {"cutoff": cutoff},
+    )
+    op.execute("DROP TABLE proxy_logs_legacy")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE proxy_logs RENAME TO proxy_logs_partitioned")
+    op.execute("ALTER SEQUENCE proxy_logs_id_seq OWNED BY NONE")
+    op.execute(
+        """
+        CREATE TABLE proxy_logs (
+            id INTEGER NOT NULL DEFAULT nextval('proxy_logs_id_seq'),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            client_ip VARCHAR(45),
+            method VARCHAR(10) NOT NULL,
+            path TEXT NOT NULL,
+            upstream_url TEXT NOT NULL,
+            query_params JSONB,
+            request_headers JSONB,
+            request_body TEXT,
+            response_status INTEGER,
+            response_headers JSONB,
+            response_body TEXT,
+            duration_ms FLOAT,
+            error TEXT,
+            CONSTRAINT proxy_logs_flat_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute(f"INSERT INTO proxy_logs ({COLUMNS}) SELECT {COLUMNS} FROM proxy_logs_partitioned")
+    op.execute("DROP TABLE proxy_logs_partitioned")
+    op.execute("ALTER INDEX proxy_logs_flat_pkey RENAME TO proxy_logs_pkey")
+    op.execute("ALTER SEQUENCE proxy_logs_id_seq AS integer")
+    op.execute("ALTER SEQUENCE proxy_logs_id_seq OWNED BY proxy_logs.id")
+    op.create_index("ix_proxy_logs_id", "proxy_logs", ["id"])
@@ -0,0 +1,33 @@
+"""compressed body columns on proxy_logs
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("proxy_logs", sa.Column("request_body_compressed", sa.LargeBinary(), nullable=True))
+    op.add_column("proxy_logs", sa.Column("response_body_compressed", sa.LargeBinary(), nullable=True))
+    op.add_column("proxy_logs", sa.Column("body_codec", sa.String(8), nullable=True))
+    op.add_column("proxy_logs", sa.Column("request_body_size", sa.BigInteger(), nullable=True))
+    op.add_column("proxy_logs", sa.Column("response_body_size", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("proxy_logs", "response_body_size")
+    op.drop_column("proxy_logs", "request_body_size")
+    op.drop_column("proxy_logs", "body_codec")
+    op.drop_column("proxy_logs", "response_body_compressed")
+    op.drop_column("proxy_logs", "request_body_compressed")
@@ -0,0 +1,25 @@
+"""cache_status on proxy_logs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 15:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("proxy_logs", sa.Column("cache_status", sa.String(16), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("proxy_logs", "cache_status")
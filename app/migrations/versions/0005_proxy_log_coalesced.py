@@ -0,0 +1,28 @@
+"""coalesced flag on proxy_logs
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 16:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "proxy_logs",
+        sa.Column("coalesced", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("proxy_logs", "coalesced")
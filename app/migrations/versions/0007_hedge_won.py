@@ -0,0 +1,28 @@
+"""hedge outcome on proxy_logs
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16 18:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "proxy_logs",
+        sa.Column("hedge_won", sa.Boolean(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("proxy_logs", "hedge_won")
@@ -0,0 +1,35 @@
+"""odoo_id_map: Odoo 1 <-> Odoo 2 record ids
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16 19:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "odoo_id_map",
+        sa.Column("model", sa.String(64), primary_key=True),
+        sa.Column("odoo1_id", sa.Integer(), primary_key=True),
+        sa.Column("odoo2_id", sa.Integer(), nullable=False),
+        sa.Column("synced_hash", sa.String(64), nullable=True),
+        sa.Column("odoo1_write_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("odoo2_write_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("synced_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.UniqueConstraint("model", "odoo2_id", name="uq_odoo_id_map_model_odoo2_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("odoo_id_map")
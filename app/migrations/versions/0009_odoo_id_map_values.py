@@ -0,0 +1,28 @@
+"""odoo_id_map: last synced field values on both sides
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16 20:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("odoo_id_map", sa.Column("odoo1_vals", postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column("odoo_id_map", sa.Column("odoo2_vals", postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("odoo_id_map", "odoo2_vals")
+    op.drop_column("odoo_id_map", "odoo1_vals")
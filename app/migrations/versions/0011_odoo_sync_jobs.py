@@ -0,0 +1,85 @@
+"""odoo_sync_jobs / odoo_sync_dead_jobs: queue for webhook-triggered syncs
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-16 22:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, Sequence[str], None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "odoo_sync_jobs",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("kind", sa.String(32), nullable=False),
+        sa.Column("record_id", sa.Integer(), nullable=True),
+        sa.Column("dedup_key", sa.String(64), nullable=True),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("status", sa.String(16), nullable=False, server_default="queued"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("events", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("run_after", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("result", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    # one queued job per record: repeated events collapse into it
+    op.create_index(
+        "uq_odoo_sync_jobs_queued_dedup_key",
+        "odoo_sync_jobs",
+        ["dedup_key"],
+        unique=True,
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    # one running job per record (dedup_key) or, for batches, per kind
+    op.create_index(
+        "uq_odoo_sync_jobs_running_key",
+        "odoo_sync_jobs",
+        [sa.text("coalesce(dedup_key, kind)")],
+        unique=True,
+        postgresql_where=sa.text("status = 'running'"),
+    )
+    op.create_index(
+        "ix_odoo_sync_jobs_pending",
+        "odoo_sync_jobs",
+        ["id"],
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+    op.create_index("ix_odoo_sync_jobs_dedup_key", "odoo_sync_jobs", ["dedup_key"])
+    op.create_index("ix_odoo_sync_jobs_finished_at", "odoo_sync_jobs", ["finished_at"])
+
+    op.create_table(
+        "odoo_sync_dead_jobs",
+        sa.Column("job_id", sa.BigInteger(), primary_key=True),
+        sa.Column("kind", sa.String(32), nullable=False),
+        sa.Column("record_id", sa.Integer(), nullable=True),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("failed_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("odoo_sync_dead_jobs")
+    op.drop_index("ix_odoo_sync_jobs_finished_at", table_name="odoo_sync_jobs")
+    op.drop_index("ix_odoo_sync_jobs_dedup_key", table_name="odoo_sync_jobs")
+    op.drop_index("ix_odoo_sync_jobs_pending", table_name="odoo_sync_jobs")
+    op.drop_index("uq_odoo_sync_jobs_running_key", table_name="odoo_sync_jobs")
+    op.drop_index("uq_odoo_sync_jobs_queued_dedup_key", table_name="odoo_sync_jobs")
+    op.drop_table("odoo_sync_jobs")
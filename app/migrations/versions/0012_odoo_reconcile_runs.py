@@ -0,0 +1,37 @@
+"""odoo_reconcile_runs: progress and reports of Odoo 1 <-> Odoo 2 reconciliation
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-16 23:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, Sequence[str], None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "odoo_reconcile_runs",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("models", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("repair", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("status", sa.String(16), nullable=False, server_default="running"),
+        sa.Column("report", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("odoo_reconcile_runs")
@@ -0,0 +1,41 @@
+"""per-minute proxy_logs rollups, (created_at, id) index for keyset pagination
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, Sequence[str], None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # created on the partitioned parent -> cascades to every partition
+    op.create_index("ix_proxy_logs_created_at_id", "proxy_logs", ["created_at", "id"])
+    op.create_table(
+        "proxy_log_rollups_minute",
+        sa.Column("bucket", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("path", sa.Text(), nullable=False),
+        sa.Column("method", sa.String(10), nullable=False),
+        sa.Column("requests", sa.BigInteger(), nullable=False),
+        sa.Column("client_errors", sa.BigInteger(), nullable=False),
+        sa.Column("server_errors", sa.BigInteger(), nullable=False),
+        sa.Column("duration_sum_ms", sa.Float(), nullable=False),
+        sa.Column("duration_max_ms", sa.Float(), nullable=False),
+        sa.Column("duration_buckets", postgresql.ARRAY(sa.BigInteger()), nullable=False),
+        sa.PrimaryKeyConstraint("bucket", "path", "method"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("proxy_log_rollups_minute")
+    op.drop_index("ix_proxy_logs_created_at_id", table_name="proxy_logs")
@@ -1 +1,6 @@
 from app.models.proxy_log import ProxyLog  # noqa: F401
+from app.models.odoo_id_map import OdooIdMap  # noqa: F401
+from app.models.odoo_sync_watermark import OdooSyncWatermark  # noqa: F401
+from app.models.odoo_sync_job import OdooSyncDeadJob, OdooSyncJob  # noqa: F401
+from app.models.odoo_reconcile_run import OdooReconcileRun  # noqa: F401
+from app.models.proxy_log_rollup import ProxyLogRollup  # noqa: F401
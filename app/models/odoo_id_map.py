@@ -0,0 +1,29 @@
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class OdooIdMap(Base):
+    """
+    Which Odoo 2 record mirrors which Odoo 1 record (see app/odoo_id_map.py).
+
+    ``synced_hash`` fingerprints the values last written to the target; the
+    ``*_write_date`` columns hold each side's write_date as of the last sync and
+    ``odoo1_vals`` / ``odoo2_vals`` the synced fields as last seen or written on
+    each side (many2one as plain ids), used to skip no-op writes and echoes.
+    """
+
+    __tablename__ = "odoo_id_map"
+    __table_args__ = (UniqueConstraint("model", "odoo2_id", name="uq_odoo_id_map_model_odoo2_id"),)
+
+    model = Column(String(64), primary_key=True)
+    odoo1_id = Column(Integer, primary_key=True)
+    odoo2_id = Column(Integer, nullable=False)
+    synced_hash = Column(String(64), nullable=True)
+    odoo1_write_date = Column(DateTime(timezone=True), nullable=True)
+    odoo2_write_date = Column(DateTime(timezone=True), nullable=True)
+    odoo1_vals = Column(JSONB, nullable=True)
+    odoo2_vals = Column(JSONB, nullable=True)
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,27 @@
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, String, Text, false
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class OdooReconcileRun(Base):
+    """
+    One reconciliation of Odoo 1 against its mirror in Odoo 2
+    (see app/odoo_reconcile.py).
+
+    ``report`` is rewritten after every page while the run is ``running``
+    (progress), and holds the final counts and sample ids once it is ``done``.
+    """
+
+    __tablename__ = "odoo_reconcile_runs"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    models = Column(JSONB, nullable=False)
+    repair = Column(Boolean, nullable=False, server_default=false())
+    status = Column(String(16), nullable=False, server_default="running")
+    report = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
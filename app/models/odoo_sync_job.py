@@ -0,0 +1,67 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class OdooSyncJob(Base):
+    """
+    Queued webhook-triggered sync (see app/odoo_jobs.py).
+
+    ``status``: queued / running / done / dead / superseded. Per-record jobs
+    carry ``dedup_key`` ("<kind>:<record_id>"): while a job is queued, repeated
+    events for the same record only bump ``events``, and jobs of one key (of
+    one kind for batches) never run concurrently, enforced by a unique index
+    on running jobs. ``locked_until`` is the lease of the worker running it.
+    """
+
+    __tablename__ = "odoo_sync_jobs"
+    __table_args__ = (
+        Index(
+            "uq_odoo_sync_jobs_queued_dedup_key",
+            "dedup_key",
+            unique=True,
+            postgresql_where=text("status = 'queued'"),
+        ),
+        Index(
+            "uq_odoo_sync_jobs_running_key",
+            func.coalesce(text("dedup_key"), text("kind")),
+            unique=True,
+            postgresql_where=text("status = 'running'"),
+        ),
+        Index("ix_odoo_sync_jobs_pending", "id", postgresql_where=text("status IN ('queued', 'running')")),
+        Index("ix_odoo_sync_jobs_dedup_key", "dedup_key"),
+        Index("ix_odoo_sync_jobs_finished_at", "finished_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False)
+    record_id = Column(Integer, nullable=True)
+    dedup_key = Column(String(64), nullable=True)
+    payload = Column(JSONB, nullable=True)
+    status = Column(String(16), nullable=False, server_default="queued")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    events = Column(Integer, nullable=False, server_default="1")
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(JSONB, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class OdooSyncDeadJob(Base):
+    """Jobs that ran out of attempts or failed permanently (dead-letter)."""
+
+    __tablename__ = "odoo_sync_dead_jobs"
+
+    job_id = Column(BigInteger, primary_key=True)
+    kind = Column(String(32), nullable=False)
+    record_id = Column(Integer, nullable=True)
+    payload = Column(JSONB, nullable=True)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    failed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
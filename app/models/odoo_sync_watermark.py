@@ -0,0 +1,25 @@
+from sqlalchemy import BigInteger, Column, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class OdooSyncWatermark(Base):
+    """
+    Progress of the write_date delta sync (see app/odoo_delta_sync.py), one row
+    per model and direction ("1to2" / "2to1").
+
+    Every record of ``model`` on the source side with write_date before
+    ``watermark`` has been applied; ``pending_ids`` are source ids whose sync
+    failed and are retried on the next run.
+    """
+
+    __tablename__ = "odoo_sync_watermarks"
+
+    model = Column(String(64), primary_key=True)
+    direction = Column(String(8), primary_key=True)
+    watermark = Column(DateTime(timezone=True), nullable=True)
+    pending_ids = Column(JSONB, nullable=False, server_default="[]")
+    records_synced = Column(BigInteger, nullable=False, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
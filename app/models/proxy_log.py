@@ -1,18 +1,36 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float
+from sqlalchemy import BigInteger, Boolean, Column, Index, Integer, LargeBinary, String, Text, DateTime, Float
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
 
 from app.core.db import Base
 
 
 class ProxyLog(Base):
+    """
+    Partitioned by range of created_at (see app/core/partitions.py), so the
+    partition key is part of the primary key.
+
+    Bodies are stored as a compressed prefix (``*_body_compressed``, codec in
+    ``body_codec``) with the full size next to it; the plain-text
+    ``request_body`` / ``response_body`` columns only hold older rows.
+    """
+
     __tablename__ = "proxy_logs"
+    __table_args__ = (
+        Index("ix_proxy_logs_created_at_brin", "created_at", postgresql_using="brin"),
+        Index("ix_proxy_logs_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+        Index("ix_proxy_logs_response_status", "response_status"),
+        # keyset pagination of the log query API
+        Index("ix_proxy_logs_created_at_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     created_at = Column(
         DateTime(timezone=True),
         server_default=func.now(),
         nullable=False,
+        primary_key=True,
     )
     client_ip = Column(String(45), nullable=True)
     method = Column(String(10), nullable=False)
@@ -24,5 +42,18 @@ class ProxyLog(Base):
     response_status = Column(Integer, nullable=True)
     response_headers = Column(JSONB, nullable=True)
     response_body = Column(Text, nullable=True)
+    request_body_compressed = Column(LargeBinary, nullable=True)
+    response_body_compressed = Column(LargeBinary, nullable=True)
+    body_codec = Column(String(8), nullable=True)
+    request_body_size = Column(BigInteger, nullable=True)
+    response_body_size = Column(BigInteger, nullable=True)
     duration_ms = Column(Float, nullable=True)
     error = Column(Text, nullable=True)
+    # HIT / MISS / REVALIDATED / STALE / BYPASS, NULL when the route is not cached
+    cache_status = Column(String(16), nullable=True)
+    # answered with the response of an identical in-flight request
+    coalesced = Column(Boolean, nullable=False, server_default=false())
+    # [{number, started_ms, duration_ms, status, error, backoff_ms}, ...]
+    attempt_timings = Column(JSONB, nullable=True)
+    # NULL: not hedged, true: the hedge answered first, false: the first call did
+    hedge_won = Column(Boolean, nullable=True)
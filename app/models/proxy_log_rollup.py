@@ -0,0 +1,26 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, String, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.core.db import Base
+
+
+class ProxyLogRollup(Base):
+    """
+    Per-minute aggregates of proxied requests, upserted by the proxy_logs
+    writer (app/core/log_rollup.py). Counts every request, including rows the
+    log policy or a full queue kept out of proxy_logs.
+    """
+
+    __tablename__ = "proxy_log_rollups_minute"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    # request path, normalized: /api/v1/proxy/orders/{id}
+    path = Column(Text, primary_key=True)
+    method = Column(String(10), primary_key=True)
+    requests = Column(BigInteger, nullable=False)
+    client_errors = Column(BigInteger, nullable=False)  # 4xx
+    server_errors = Column(BigInteger, nullable=False)  # 5xx or no response
+    duration_sum_ms = Column(Float, nullable=False)
+    duration_max_ms = Column(Float, nullable=False)
+    # counts per latency bucket, bounds in log_rollup.DURATION_BUCKETS_MS (+ overflow)
+    duration_buckets = Column(ARRAY(BigInteger), nullable=False)
@@ -0,0 +1,356 @@
+# app/odoo_async_client.py
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+
+from app.core import metrics
+from app.core.config import settings
+from app.upstream.hedging import LatencyTracker
+
+# код помилки Odoo "Odoo Session Expired"
+SESSION_EXPIRED_CODE = 100
+
+# (model, method, args, kwargs)
+OdooCall = Tuple[str, str, Sequence[Any], Optional[Dict[str, Any]]]
+
+
+@dataclass
+class OdooConfig:
+    host: str
+    port: int
+    db: str
+    user: str
+    password: str
+    protocol: str = "jsonrpc"
+
+
+def load_odoo_config(prefix: str) -> OdooConfig:
+    return OdooConfig(
+        host=os.getenv(f"{prefix}_HOST", "localhost"),
+        port=int(os.getenv(f"{prefix}_PORT", "8069")),
+        db=os.getenv(f"{prefix}_DB", "odoo"),
+        user=os.getenv(f"{prefix}_USER", "admin"),
+        password=os.getenv(f"{prefix}_PASSWORD", "admin"),
+        protocol=os.getenv(f"{prefix}_PROTOCOL", "jsonrpc"),
+    )
+
+
+class OdooRPCError(Exception):
+    def __init__(self, message: str, code: Optional[int] = None, data: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__(message)
+        self.code = code
+        self.data = data or {}
+
+
+class OdooPoolTimeout(OdooRPCError):
+    """Усі сесії зайняті довше за ODOO_POOL_TIMEOUT_SECONDS."""
+
+
+@dataclass
+class OdooSession:
+    sid: str
+    uid: int
+    last_used: float
+
+
+class RPCStats:
+    """Лічильники і латентність одного model.method."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.latency = LatencyTracker(size=200)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_seconds": self.latency.percentile(50),
+            "p95_seconds": self.latency.percentile(95),
+            "p99_seconds": self.latency.percentile(99),
+        }
+
+
+class AsyncOdooClient:
+    """
+    Асинхронний JSON-RPC клієнт Odoo з пулом авторизованих сесій.
+
+    Один httpx-клієнт (пул TCP-з'єднань) і до ODOO_RPC_CONCURRENCY сесій Odoo на інстанс:
+    кожен виклик позичає сесію, шле її session_id явним Cookie і повертає назад.
+    Сесії логіняться ліниво і живуть між викликами; сесію, що простояла довше за
+    ODOO_SESSION_CHECK_SECONDS, перевіряємо перед видачею. Якщо Odoo відповів
+    "Session Expired" (рестарт, чистка сесій) — перелогінюємо саме цю сесію і
+    повторюємо виклик один раз.
+    """
+
+    def __init__(self, cfg: OdooConfig, name: str) -> None:
+        self.cfg = cfg
+        self.name = name
+        self._client: Optional[httpx.AsyncClient] = None
+        self._ids = itertools.count(1)
+        self._size = settings.ODOO_RPC_CONCURRENCY
+        self._slots = asyncio.Semaphore(self._size)
+        # вільні сесії, остання повернена — перша видана (вона найсвіжіша)
+        self._idle: List[OdooSession] = []
+        self._fields: Dict[str, Set[str]] = {}
+        self.in_use = 0
+        self.waiting = 0
+        self.pool_wait = LatencyTracker()
+        self.pool_timeouts = 0
+        self.sessions_created = 0
+        self.relogins = 0
+        self.health_checks = 0
+        self.health_failures = 0
+        self.rpc: Dict[Tuple[str, str], RPCStats] = {}
+
+    @property
+    def base_url(self) -> str:
+        scheme = "https" if self.cfg.protocol == "jsonrpc+ssl" else "http"
+        return f"{scheme}://{self.cfg.host}:{self.cfg.port}"
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(
+                max_connections=settings.ODOO_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ODOO_HTTP_MAX_CONNECTIONS,
+            ),
+            timeout=settings.ODOO_RPC_TIMEOUT_SECONDS,
+            # cookie сесії тримаємо в OdooSession, а не в спільному jar клієнта
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._idle.clear()
+
+    async def _post(
+        self,
+        path: str,
+        params: Dict[str, Any],
+        session: Optional[OdooSession] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        if self._client is None:
+            # напр. скрипт без lifespan
+            await self.start()
+        payload = {"jsonrpc": "2.0", "method": "call", "params": params, "id": next(self._ids)}
+        headers = {"Cookie": f"session_id={session.sid}"} if session is not None else None
+        response = await self._client.post(
+            path,
+            json=payload,
+            headers=headers,
+            timeout=timeout if timeout is not None else settings.ODOO_RPC_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _result(response: httpx.Response) -> Any:
+        body = response.json()
+        error = body.get("error")
+        if error:
+            data = error.get("data") or {}
+            raise OdooRPCError(data.get("message") or error.get("message", "Odoo error"), error.get("code"), data)
+        return body.get("result")
+
+    async def _login(self) -> OdooSession:
+        response = await self._post(
+            "/web/session/authenticate",
+            {"db": self.cfg.db, "login": self.cfg.user, "password": self.cfg.password},
+        )
+        uid = (self._result(response) or {}).get("uid")
+        sid = response.cookies.get("session_id")
+        if not uid or not sid:
+            raise OdooRPCError(f"{self.name}: login failed for {self.cfg.user}@{self.cfg.db}")
+        self.sessions_created += 1
+        metrics.ODOO_SESSION_EVENTS.labels(self.name, "login").inc()
+        return OdooSession(sid=sid, uid=uid, last_used=time.monotonic())
+
+    async def _healthy(self, session: OdooSession) -> bool:
+        self.health_checks += 1
+        try:
+            info = self._result(await self._post("/web/session/get_session_info", {}, session))
+        except OdooRPCError:
+            info = None
+        if (info or {}).get("uid") == session.uid:
+            return True
+        self.health_failures += 1
+        metrics.ODOO_SESSION_EVENTS.labels(self.name, "health_failure").inc()
+        return False
+
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[OdooSession]:
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), settings.ODOO_POOL_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.pool_timeouts += 1
+            metrics.ODOO_SESSION_EVENTS.labels(self.name, "pool_timeout").inc()
+            raise OdooPoolTimeout(f"{self.name}: no free Odoo session in {settings.ODOO_POOL_TIMEOUT_SECONDS}s")
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.pool_wait.observe(waited)
+        metrics.ODOO_POOL_WAIT.labels(self.name).observe(waited)
+        self.in_use += 1
+        metrics.ODOO_SESSIONS_IN_USE.labels(self.name).inc()
+        session: Optional[OdooSession] = None
+        try:
+            if self._idle:
+                session = self._idle.pop()
+                idle_for = time.monotonic() - session.last_used
+                if idle_for > settings.ODOO_SESSION_CHECK_SECONDS and not await self._healthy(session):
+                    session = None
+            if session is None:
+                session = await self._login()
+            yield session
+        finally:
+            # сесію, на якій впав логін чи перевірка, просто не повертаємо
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._idle.append(session)
+            self.in_use -= 1
+            metrics.ODOO_SESSIONS_IN_USE.labels(self.name).dec()
+            self._slots.release()
+
+    async def execute_kw(
+        self,
+        model: str,
+        method: str,
+        args: Optional[Sequence[Any]] = None,
+        kwargs: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Виклик методу моделі. timeout — на один HTTP-запит (за замовчуванням
+        ODOO_RPC_TIMEOUT_SECONDS); очікування вільної сесії обмежене окремо.
+        """
+        params = {"model": model, "method": method, "args": list(args or []), "kwargs": kwargs or {}}
+        path = f"/web/dataset/call_kw/{model}/{method}"
+        stats = self.rpc.get((model, method))
+        if stats is None:
+            stats = self.rpc[(model, method)] = RPCStats()
+        async with self._session() as session:
+            started = time.monotonic()
+            stats.calls += 1
+            try:
+                try:
+                    return self._result(await self._post(path, params, session, timeout))
+                except OdooRPCError as e:
+                    if e.code != SESSION_EXPIRED_CODE:
+                        raise
+                self.relogins += 1
+                metrics.ODOO_SESSION_EVENTS.labels(self.name, "relogin").inc()
+                fresh = await self._login()
+                session.sid, session.uid = fresh.sid, fresh.uid
+                return self._result(await self._post(path, params, session, timeout))
+            except Exception:
+                stats.errors += 1
+                metrics.ODOO_RPC_ERRORS.labels(self.name, model, method).inc()
+                raise
+            finally:
+                elapsed = time.monotonic() - started
+                stats.latency.observe(elapsed)
+                metrics.ODOO_RPC_DURATION.labels(self.name, model, method).observe(elapsed)
+
+    async def execute_batch(self, calls: Sequence[OdooCall]) -> List[Any]:
+        """
+        Кілька execute_kw одночасно (Odoo не вміє batch у JSON-RPC, тож це
+        паралельні запити в межах пулу сесій). Результати — в порядку calls.
+        """
+        return list(
+            await asyncio.gather(*(self.execute_kw(model, method, args, kwargs) for model, method, args, kwargs in calls))
+        )
+
+    async def search(
+        self,
+        model: str,
+        domain: List[Any],
+        limit: Optional[int] = None,
+        order: Optional[str] = None,
+    ) -> List[int]:
+        kwargs: Dict[str, Any] = {}
+        if limit is not None:
+            kwargs["limit"] = limit
+        if order:
+            kwargs["order"] = order
+        return await self.execute_kw(model, "search", [domain], kwargs)
+
+    async def read(self, model: str, ids: Sequence[int], fields: Sequence[str]) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        return await self.execute_kw(model, "read", [list(ids)], {"fields": list(fields)})
+
+    async def search_read(
+        self,
+        model: str,
+        domain: List[Any],
+        fields: Sequence[str],
+        limit: Optional[int] = None,
+        order: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        kwargs: Dict[str, Any] = {"domain": domain, "fields": list(fields)}
+        if limit is not None:
+            kwargs["limit"] = limit
+        if order:
+            kwargs["order"] = order
+        return await self.execute_kw(model, "search_read", [], kwargs)
+
+    async def create(self, model: str, vals: Dict[str, Any]) -> int:
+        return await self.execute_kw(model, "create", [vals])
+
+    async def write(self, model: str, ids: Sequence[int], vals: Dict[str, Any]) -> bool:
+        return await self.execute_kw(model, "write", [list(ids), vals])
+
+    async def has_field(self, model: str, field: str) -> bool:
+        """Чи є поле в моделі (fields_get кешується на час життя процесу)."""
+        if model not in self._fields:
+            self._fields[model] = set(await self.execute_kw(model, "fields_get", [], {"attributes": ["type"]}))
+        return field in self._fields[model]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self._client is not None,
+            "pool_size": self._size,
+            "idle_sessions": len(self._idle),
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "pool_wait_p50_seconds": self.pool_wait.percentile(50),
+            "pool_wait_p99_seconds": self.pool_wait.percentile(99),
+            "pool_timeouts": self.pool_timeouts,
+            "sessions_created": self.sessions_created,
+            "relogins": self.relogins,
+            "health_checks": self.health_checks,
+            "health_failures": self.health_failures,
+            "rpc": {f"{model}.{method}": s.as_dict() for (model, method), s in sorted(self.rpc.items())},
+        }
+
+
+def m2o_id(value: Any) -> Any:
+    """many2one з read/search_read: [id, "name"] або False -> id або False."""
+    return value[0] if value else False
+
+
+def m2o_name(value: Any) -> Optional[str]:
+    return value[1] if value else None
+
+
+# Odoo 1 == "джерело"
+odoo1 = AsyncOdooClient(load_odoo_config("ODOO_1"), "odoo1")
+# Odoo 2 == "ціль / дзеркало"
+odoo2 = AsyncOdooClient(load_odoo_config("ODOO_2"), "odoo2")
@@ -0,0 +1,456 @@
+# app/odoo_batch_sync.py
+"""
+Пакетний синк Odoo 1 → 2: списки ID замість одного запиту на запис.
+
+На кожен шматок (ODOO_BATCH_CHUNK_SIZE) записів:
+  - один search_read по моделі в Odoo 1; відповідники — з odoo_id_map, і лише для
+    відсутніх там — один search_read по x_odoo1_*_id in [...] в Odoo 2;
+  - записи, що не змінились в Odoo 1 з останнього синку, пропускаємо; решті пишемо
+    лише поля, що відрізняються від знімка в odoo_id_map (app/odoo_changes.py);
+  - користувачі та стадії мапляться з кешу (app/odoo_mappings.py);
+  - батьківські проєкти синкаються один раз на пакет;
+  - create одним викликом зі списком vals, write згруповані за однаковими vals;
+  - якщо груповий виклик падає — повторюємо по одному, щоб знайти зламані записи;
+  - зворотні x_odoo2_*_id пишемо лише для нових пар.
+Результат — по кожному запису окремо (created / updated / unchanged / failed), у
+result job-а: ендпоінти лише ставлять пакет у чергу (app/odoo_jobs.py).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from app.core import metrics
+from app.core.config import settings
+
+from . import odoo_changes as changes
+from . import odoo_id_map as id_map
+from . import odoo_jobs as jobs
+from .odoo_async_client import AsyncOdooClient, m2o_id, m2o_name, odoo1, odoo2
+from .odoo_changes import change_stats
+from .odoo_jobs import JobAccepted
+from .odoo_mappings import odoo_mappings
+from .odoo_projects_gateway import (
+    PROJECT_FIELDS,
+    PROJECT_SYNC_FIELDS,
+    TASK_FIELDS_1,
+    TASK_SYNC_FIELDS_1,
+    _source_fields,
+    project_vals_in_2,
+    task_vals_in_2,
+)
+
+router = APIRouter(
+    prefix="/api/v1/odoo/projects",
+    tags=["odoo-projects"],
+)
+
+# ==========
+# Pydantic схеми
+# ==========
+
+
+class SyncProjectsFrom1To2Request(BaseModel):
+    project_ids_in_1: List[int]
+
+
+class SyncTasksFrom1To2Request(BaseModel):
+    task_ids_in_1: List[int]
+
+
+class BatchItemResult(BaseModel):
+    id_in_1: int
+    id_in_2: Optional[int] = None
+    status: Literal["created", "updated", "unchanged", "failed"]
+    error: Optional[str] = None
+    # запис синкнуто, але зворотній x_odoo2_*_id в Odoo 1 не записався
+    warning: Optional[str] = None
+
+
+class BatchSyncResponse(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    results: List[BatchItemResult]
+
+
+# ==========
+# Допоміжні функції
+# ==========
+
+
+def _chunks(ids: Sequence[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(ids), size):
+        yield list(ids[i : i + size])
+
+
+def _unique(ids: Iterable[Any]) -> List[Any]:
+    return list(dict.fromkeys(i for i in ids if i))
+
+
+def _error(e: BaseException) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    return f"{type(e).__name__}: {e}"
+
+
+async def _map_users_1_to_2(user_ids_in_1: Sequence[int]) -> Dict[int, Any]:
+    """{user_id в Odoo1: user_id в Odoo2 або False}, з кешу мапінгу."""
+    mapped = await asyncio.gather(*(odoo_mappings.map_user_1_to_2(uid) for uid in user_ids_in_1))
+    return dict(zip(user_ids_in_1, mapped))
+
+
+def _skip_unchanged(
+    records: Dict[int, Dict[str, Any]],
+    sync_fields: List[str],
+    mapped: Dict[int, id_map.IdMapEntry],
+    results: Dict[int, BatchItemResult],
+) -> None:
+    """Записи, синкнуті поля яких в Odoo 1 не змінились з останнього синку, -> unchanged."""
+    for id_in_1, record in records.items():
+        entry = mapped.get(id_in_1)
+        if entry is None or entry.odoo2_vals is None:
+            continue
+        if changes.unchanged(changes.snapshot(record, sync_fields), entry.odoo1_vals):
+            change_stats.records_unchanged += 1
+            results[id_in_1] = BatchItemResult(id_in_1=id_in_1, id_in_2=entry.odoo2_id, status="unchanged")
+
+
+async def _find_existing(
+    model: str, ids_in_1: Sequence[int], fields: List[str]
+) -> Tuple[Dict[int, int], Dict[int, id_map.IdMapEntry], Dict[int, Dict[str, Any]]]:
+    """
+    ({id в Odoo1: id в Odoo2}, пари з odoo_id_map, {id в Odoo1: знімок fields в Odoo 2}).
+
+    Пари беремо з odoo_id_map; для пар без знімка значень — один search_read по id
+    в Odoo 2 (кого там вже немає, шукаємо заново); решту — одним search_read
+    по x_odoo1_*_id.
+    """
+    mapped = await id_map.get_by_odoo1(model, ids_in_1)
+    existing = {i: entry.odoo2_id for i, entry in mapped.items()}
+    known = {i: entry.odoo2_vals for i, entry in mapped.items() if entry.odoo2_vals is not None}
+
+    unknown = {entry.odoo2_id: i for i, entry in mapped.items() if entry.odoo2_vals is None}
+    if unknown:
+        records = await odoo2.search_read(model, [["id", "in", list(unknown)]], fields, order="id")
+        for rec in records:
+            known[unknown[rec["id"]]] = changes.snapshot(rec, fields)
+        for id_in_1 in set(unknown.values()) - set(known):
+            del existing[id_in_1]
+
+    missing = [i for i in ids_in_1 if i not in existing]
+    if missing:
+        link_field = id_map.LINK_FIELDS[model]
+        records = await odoo2.search_read(model, [[link_field, "in", missing]], fields, order="id")
+        for rec in records:
+            if rec[link_field] not in existing:
+                existing[rec[link_field]] = rec["id"]
+                known[rec[link_field]] = changes.snapshot(rec, fields)
+    return existing, mapped, known
+
+
+async def _create_many(
+    client: AsyncOdooClient, model: str, vals_list: List[Dict[str, Any]]
+) -> List[Any]:
+    """Один create зі списком vals; при помилці — по одному. Повертає id або Exception на кожен vals."""
+    if not vals_list:
+        return []
+    try:
+        ids = await client.create(model, vals_list)  # type: ignore[arg-type]
+        return list(ids)
+    except Exception:
+        if len(vals_list) == 1:
+            raise
+    return list(
+        await asyncio.gather(*(client.create(model, vals) for vals in vals_list), return_exceptions=True)
+    )
+
+
+async def _write_many(
+    client: AsyncOdooClient, model: str, updates: List[Tuple[int, Dict[str, Any]]]
+) -> Dict[int, Optional[BaseException]]:
+    """write згрупований за однаковими vals; при помилці групи — по одному. {id: None або Exception}."""
+    groups: Dict[str, Tuple[Dict[str, Any], List[int]]] = {}
+    for record_id, vals in updates:
+        key = json.dumps(vals, sort_keys=True, default=str)
+        groups.setdefault(key, (vals, []))[1].append(record_id)
+
+    outcome: Dict[int, Optional[BaseException]] = {}
+
+    async def write_group(vals: Dict[str, Any], ids: List[int]) -> None:
+        try:
+            await client.write(model, ids, vals)
+            outcome.update((i, None) for i in ids)
+        except Exception as e:
+            if len(ids) == 1:
+                outcome[ids[0]] = e
+                return
+            for i in ids:
+                try:
+                    await client.write(model, [i], vals)
+                    outcome[i] = None
+                except Exception as single_error:
+                    outcome[i] = single_error
+
+    await asyncio.gather(*(write_group(vals, ids) for vals, ids in groups.values()))
+    return outcome
+
+
+async def _upsert(
+    model: str,
+    vals_by_id_in_1: Dict[int, Dict[str, Any]],
+    existing: Dict[int, int],
+    known: Dict[int, Dict[str, Any]],
+    results: Dict[int, BatchItemResult],
+) -> None:
+    """Створює записи в Odoo 2 / пише в наявні лише змінені поля і заповнює results."""
+    to_create = [i for i in vals_by_id_in_1 if i not in existing]
+    to_write: List[Tuple[int, Dict[str, Any]]] = []
+    for id_in_1, vals in vals_by_id_in_1.items():
+        if id_in_1 not in existing:
+            continue
+        changed = changes.diff(vals, known.get(id_in_1))
+        change_stats.wrote(vals, changed)
+        if changed:
+            to_write.append((existing[id_in_1], changed))
+        else:
+            results[id_in_1] = BatchItemResult(id_in_1=id_in_1, id_in_2=existing[id_in_1], status="unchanged")
+
+    created, written = await asyncio.gather(
+        _create_many(odoo2, model, [vals_by_id_in_1[i] for i in to_create]),
+        _write_many(odoo2, model, to_write),
+    )
+    for id_in_1, new_id in zip(to_create, created):
+        if isinstance(new_id, BaseException):
+            results[id_in_1] = BatchItemResult(id_in_1=id_in_1, status="failed", error=_error(new_id))
+        else:
+            results[id_in_1] = BatchItemResult(id_in_1=id_in_1, id_in_2=new_id, status="created")
+    by_id_in_2 = {existing[i]: i for i in vals_by_id_in_1 if i in existing}
+    for id_in_2, err in written.items():
+        id_in_1 = by_id_in_2[id_in_2]
+        if err is not None:
+            results[id_in_1] = BatchItemResult(id_in_1=id_in_1, id_in_2=id_in_2, status="failed", error=_error(err))
+        else:
+            results[id_in_1] = BatchItemResult(id_in_1=id_in_1, id_in_2=id_in_2, status="updated")
+
+
+async def _finish(
+    model: str,
+    vals_by_id_in_1: Dict[int, Dict[str, Any]],
+    sources: Dict[int, Dict[str, Any]],
+    sync_fields: List[str],
+    mapped: Dict[int, id_map.IdMapEntry],
+    known: Dict[int, Dict[str, Any]],
+    results: Dict[int, BatchItemResult],
+) -> None:
+    """Зворотні ID для нових пар і оновлення odoo_id_map (зі знімками значень) після _upsert."""
+    # пари з індексу, запис за якими не вдався (напр. видалений в Odoo 2), — забуваємо
+    try:
+        await id_map.forget(model, [i for i in mapped if i in results and results[i].status == "failed"])
+    except Exception as e:
+        print(f"[odoo-batch] odoo_id_map not cleaned for {model}: {e}")
+
+    synced = [r for r in results.values() if r.status != "failed" and r.id_in_1 in vals_by_id_in_1]
+    backlink_field = id_map.BACKLINK_FIELDS[model]
+    # поле читали з Odoo 1 лише якщо воно там є; вже правильне значення не переписуємо
+    new_links = [
+        r
+        for r in synced
+        if r.id_in_1 not in mapped
+        and backlink_field in sources[r.id_in_1]
+        and changes.normalize(sources[r.id_in_1][backlink_field]) != r.id_in_2
+    ]
+    try:
+        outcome = await _write_many(odoo1, model, [(r.id_in_1, {backlink_field: r.id_in_2}) for r in new_links])
+        for r in new_links:
+            if outcome.get(r.id_in_1) is not None:
+                r.warning = f"backlink {backlink_field} not written: {_error(outcome[r.id_in_1])}"
+    except Exception as e:
+        for r in new_links:
+            r.warning = f"backlink {backlink_field} not written: {_error(e)}"
+
+    try:
+        await id_map.save(
+            model,
+            [
+                {
+                    "odoo1_id": r.id_in_1,
+                    "odoo2_id": r.id_in_2,
+                    "synced_hash": id_map.vals_hash(vals_by_id_in_1[r.id_in_1]),
+                    "odoo1_write_date": id_map.parse_write_date(sources[r.id_in_1].get("write_date")),
+                    "odoo1_vals": changes.snapshot(sources[r.id_in_1], sync_fields),
+                    "odoo2_vals": {**(known.get(r.id_in_1) or {}), **vals_by_id_in_1[r.id_in_1]},
+                }
+                for r in synced
+            ],
+        )
+    except Exception as e:
+        # записи вже в Odoo 2; без пари в індексі наступний синк знайде їх пошуком
+        print(f"[odoo-batch] odoo_id_map not updated for {model}: {e}")
+
+
+def _response(ids: Sequence[int], results: Dict[int, BatchItemResult]) -> BatchSyncResponse:
+    ordered = [results[i] for i in ids]
+    return BatchSyncResponse(
+        created=sum(1 for r in ordered if r.status == "created"),
+        updated=sum(1 for r in ordered if r.status == "updated"),
+        unchanged=sum(1 for r in ordered if r.status == "unchanged"),
+        failed=sum(1 for r in ordered if r.status == "failed"),
+        results=ordered,
+    )
+
+
+def _count(model: str, results: Dict[int, BatchItemResult]) -> Dict[int, BatchItemResult]:
+    """Пропускна здатність синку для /metrics: записи по статусах."""
+    for r in results.values():
+        metrics.SYNC_RECORDS.labels(model, r.status).inc()
+    return results
+
+
+def _check_size(ids: Sequence[int]) -> List[int]:
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > settings.ODOO_BATCH_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"at most {settings.ODOO_BATCH_MAX_IDS} ids per batch")
+    return ids
+
+
+# ==========
+# Пакетний синк проєктів 1 → 2
+# ==========
+
+
+async def sync_projects_from_1_to_2(project_ids_in_1: Sequence[int]) -> Dict[int, BatchItemResult]:
+    results: Dict[int, BatchItemResult] = {}
+    for chunk in _chunks(list(project_ids_in_1), settings.ODOO_BATCH_CHUNK_SIZE):
+        try:
+            fields = await _source_fields("project.project", PROJECT_FIELDS)
+            projects, (existing, mapped, known) = await asyncio.gather(
+                odoo1.search_read("project.project", [["id", "in", chunk]], fields),
+                _find_existing("project.project", chunk, PROJECT_SYNC_FIELDS + ["x_odoo1_project_id"]),
+            )
+            users = await _map_users_1_to_2(_unique(m2o_id(p["user_id"]) for p in projects))
+        except Exception as e:
+            for i in chunk:
+                results[i] = BatchItemResult(id_in_1=i, status="failed", error=_error(e))
+            continue
+
+        found = {p["id"]: p for p in projects}
+        vals_by_id: Dict[int, Dict[str, Any]] = {}
+        chunk_results: Dict[int, BatchItemResult] = {}
+        _skip_unchanged(found, PROJECT_SYNC_FIELDS, mapped, chunk_results)
+        for i in chunk:
+            if i in chunk_results:
+                continue
+            proj1 = found.get(i)
+            if proj1 is None:
+                chunk_results[i] = BatchItemResult(id_in_1=i, status="failed", error="project not found in Odoo 1")
+                continue
+            vals_by_id[i] = project_vals_in_2(proj1, users.get(m2o_id(proj1["user_id"]), False))
+
+        await _upsert("project.project", vals_by_id, existing, known, chunk_results)
+        await _finish("project.project", vals_by_id, found, PROJECT_SYNC_FIELDS, mapped, known, chunk_results)
+        results.update(chunk_results)
+    return _count("project.project", results)
+
+
+# ==========
+# Пакетний синк тасків 1 → 2
+# ==========
+
+
+async def sync_tasks_from_1_to_2(task_ids_in_1: Sequence[int]) -> Dict[int, BatchItemResult]:
+    results: Dict[int, BatchItemResult] = {}
+    # проєкт синкаємо один раз на весь пакет
+    synced_projects: Dict[int, BatchItemResult] = {}
+
+    for chunk in _chunks(list(task_ids_in_1), settings.ODOO_BATCH_CHUNK_SIZE):
+        chunk_results: Dict[int, BatchItemResult] = {}
+        try:
+            fields = await _source_fields("project.task", TASK_FIELDS_1)
+            tasks, (existing, mapped, known) = await asyncio.gather(
+                odoo1.search_read("project.task", [["id", "in", chunk]], fields),
+                _find_existing("project.task", chunk, TASK_SYNC_FIELDS_1 + ["x_odoo1_task_id"]),
+            )
+            found = {t["id"]: t for t in tasks}
+            # незмінені таски далі не йдуть — і їхні проєкти теж не синкаємо
+            _skip_unchanged(found, TASK_SYNC_FIELDS_1, mapped, chunk_results)
+            changed = [t for t in tasks if t["id"] not in chunk_results]
+            new_projects = [p for p in _unique(m2o_id(t["project_id"]) for t in changed) if p not in synced_projects]
+            project_results, users = await asyncio.gather(
+                sync_projects_from_1_to_2(new_projects),
+                _map_users_1_to_2(_unique(m2o_id(t["user_id"]) for t in changed)),
+            )
+        except Exception as e:
+            for i in chunk:
+                results[i] = BatchItemResult(id_in_1=i, status="failed", error=_error(e))
+            continue
+        synced_projects.update(project_results)
+
+        vals_by_id: Dict[int, Dict[str, Any]] = {}
+        for i in chunk:
+            if i in chunk_results:
+                continue
+            task1 = found.get(i)
+            if task1 is None:
+                chunk_results[i] = BatchItemResult(id_in_1=i, status="failed", error="task not found in Odoo 1")
+                continue
+
+            project_id_in_1 = m2o_id(task1["project_id"])
+            project_id_in_2 = False
+            if project_id_in_1:
+                project = synced_projects[project_id_in_1]
+                if project.status == "failed":
+                    chunk_results[i] = BatchItemResult(
+                        id_in_1=i, status="failed", error=f"project {project_id_in_1}: {project.error}"
+                    )
+                    continue
+                project_id_in_2 = project.id_in_2
+
+            stage_id_in_2 = await odoo_mappings.map_stage(m2o_name(task1["stage_id"]), "2")
+            vals_by_id[i] = task_vals_in_2(
+                task1, users.get(m2o_id(task1["user_id"]), False), project_id_in_2, stage_id_in_2
+            )
+
+        await _upsert("project.task", vals_by_id, existing, known, chunk_results)
+        await _finish("project.task", vals_by_id, found, TASK_SYNC_FIELDS_1, mapped, known, chunk_results)
+        results.update(chunk_results)
+    return _count("project.task", results)
+
+
+# ==========
+# FastAPI endpoints
+# ==========
+
+
+async def _job_sync_projects(record_id: Optional[int], payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    ids = payload["ids"]
+    return _response(ids, await sync_projects_from_1_to_2(ids)).model_dump()
+
+
+async def _job_sync_tasks(record_id: Optional[int], payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    ids = payload["ids"]
+    return _response(ids, await sync_tasks_from_1_to_2(ids)).model_dump()
+
+
+jobs.register("projects_1_to_2", _job_sync_projects)
+jobs.register("tasks_1_to_2", _job_sync_tasks)
+
+
+# Пакет — один job у черзі (app/odoo_jobs.py); BatchSyncResponse — в його result
+
+
+@router.post("/sync-projects-from-1-to-2", response_model=JobAccepted, status_code=202)
+async def api_sync_projects_from_1_to_2(payload: SyncProjectsFrom1To2Request):
+    ids = _check_size(payload.project_ids_in_1)
+    return await jobs.enqueue("projects_1_to_2", payload={"ids": ids})
+
+
+@router.post("/sync-tasks-from-1-to-2", response_model=JobAccepted, status_code=202)
+async def api_sync_tasks_from_1_to_2(payload: SyncTasksFrom1To2Request):
+    ids = _check_size(payload.task_ids_in_1)
+    return await jobs.enqueue("tasks_1_to_2", payload={"ids": ids})
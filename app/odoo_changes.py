@@ -0,0 +1,61 @@
+# app/odoo_changes.py
+"""
+Виявлення змін для синку Odoo: пишемо лише поля, що справді змінились.
+
+Для кожної пари в odoo_id_map зберігаються знімки синкнутих полів з обох боків
+(odoo1_vals / odoo2_vals, many2one як id). Звідси:
+  - джерело не змінилось з останнього синку -> запис пропускаємо повністю;
+  - vals порівнюються зі знімком цілі (або з поточними значеннями в цілі, якщо
+    знімка ще немає) -> write лише змінених полів, порожній diff -> без write;
+  - вебхук "таск змінився" на запис, який ми самі щойно записали (знімок
+    збігається з поточними значеннями) -> це ехо, далі не синкаємо.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+
+
+def normalize(value: Any) -> Any:
+    """many2one з read ([id, "name"]) -> id; решта як є."""
+    if isinstance(value, list) and len(value) == 2 and isinstance(value[1], str):
+        return value[0]
+    return value
+
+
+def snapshot(record: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    return {f: normalize(record.get(f, False)) for f in fields}
+
+
+def unchanged(current: Dict[str, Any], known: Optional[Dict[str, Any]]) -> bool:
+    """Усі поля current збігаються зі знімком known."""
+    if not known:
+        return False
+    return all(f in known and known[f] == v for f, v in current.items())
+
+
+def diff(vals: Dict[str, Any], known: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Поля vals, що відрізняються від known (без знімка — всі)."""
+    if known is None:
+        return dict(vals)
+    return {f: v for f, v in vals.items() if f not in known or known[f] != v}
+
+
+class ChangeStats:
+    def __init__(self) -> None:
+        self.records_unchanged = 0  # джерело не змінилось, нічого не робили
+        self.writes_skipped = 0  # diff порожній, write не було
+        self.fields_written = 0
+        self.fields_skipped = 0
+        self.echoes_suppressed = 0
+
+    def wrote(self, vals: Dict[str, Any], changed: Dict[str, Any]) -> None:
+        self.fields_written += len(changed)
+        self.fields_skipped += len(vals) - len(changed)
+        if not changed:
+            self.writes_skipped += 1
+
+    def stats(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+change_stats = ChangeStats()
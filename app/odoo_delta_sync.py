@@ -0,0 +1,357 @@
+# app/odoo_delta_sync.py
+"""
+Інкрементальний синк за write_date: підхоплює все, що змінилось, навіть якщо
+вебхук загубився.
+
+Потоки (модель, напрям): project.project 1→2, project.task 1→2, project.task 2→1.
+Для кожного в таблиці odoo_sync_watermarks зберігається watermark — усе, що в
+джерелі має write_date раніше нього, вже синкнуто. Запуск:
+  - спершу повторює pending_ids (записи, синк яких минулого разу впав);
+  - далі читає джерело сторінками по ODOO_DELTA_PAGE_SIZE (search_read по
+    write_date >= watermark - ODOO_DELTA_OVERLAP_SECONDS, order "write_date, id");
+  - кожну сторінку застосовує наявною логікою синку (пакетні функції
+    app/odoo_batch_sync.py для 1→2, sync_task_from_2_to_1 для 2→1);
+  - після сторінки одним upsert пересуває watermark і pending_ids.
+Пам'ять обмежена сторінкою, а перезапуск продовжує з останнього watermark:
+сторінка, яку не встигли закрити, синкнеться ще раз, і зміни для неї
+відсіє app/odoo_changes.py.
+
+write_date з Odoo приходить з точністю до секунди, тому watermark — межа секунди:
+сторінка закриває лише секунди, повністю прочитані з неї; секунду, в яку
+потрапило більше записів, ніж вміщує сторінка, дочитуємо окремо по id.
+
+Запускається фоном кожні ODOO_DELTA_SYNC_INTERVAL_SECONDS (один воркер за раз,
+advisory lock), через POST /api/v1/odoo/projects/delta-sync/run або вручну:
+    python -m app.odoo_delta_sync [--reset]
+"""
+from __future__ import annotations
+
+import asyncio
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, engine
+from app.models.odoo_sync_watermark import OdooSyncWatermark
+
+from . import odoo_changes as changes
+from . import odoo_id_map as id_map
+from .odoo_async_client import AsyncOdooClient, odoo1, odoo2
+from .odoo_batch_sync import sync_projects_from_1_to_2, sync_tasks_from_1_to_2
+from .odoo_changes import change_stats
+from .odoo_projects_gateway import TASK_FIELDS_2, TASK_SYNC_FIELDS_2, sync_task_from_2_to_1
+
+DELTA_SYNC_LOCK_KEY = 7_210_003
+ODOO_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@dataclass
+class Stream:
+    model: str
+    direction: str  # "1to2" / "2to1"
+    source: AsyncOdooClient
+    # застосовує сторінку записів джерела, повертає id, синк яких не вдався
+    apply: Callable[[List[Dict[str, Any]]], Awaitable[List[int]]]
+
+    @property
+    def name(self) -> str:
+        return f"{self.model} {self.direction}"
+
+    async def fields(self) -> List[str]:
+        if self.direction == "2to1":
+            link = id_map.LINK_FIELDS[self.model]
+            return TASK_FIELDS_2 + ([link] if await odoo2.has_field(self.model, link) else [])
+        return ["write_date"]
+
+
+# ==========
+# Застосування сторінки
+# ==========
+
+
+async def _apply_projects_1_to_2(records: List[Dict[str, Any]]) -> List[int]:
+    results = await sync_projects_from_1_to_2([r["id"] for r in records])
+    return [i for i, r in results.items() if r.status == "failed"]
+
+
+async def _apply_tasks_1_to_2(records: List[Dict[str, Any]]) -> List[int]:
+    results = await sync_tasks_from_1_to_2([r["id"] for r in records])
+    return [i for i, r in results.items() if r.status == "failed"]
+
+
+async def _apply_tasks_2_to_1(records: List[Dict[str, Any]]) -> List[int]:
+    """
+    Ехо наших же записів 1 → 2 відсіюємо одним запитом до odoo_id_map, решту
+    синкаємо по одному (паралельно, в межах ODOO_RPC_CONCURRENCY).
+    """
+    link = id_map.LINK_FIELDS["project.task"]
+    mapped = await id_map.get_by_odoo2("project.task", [r["id"] for r in records])
+    to_sync = []
+    for r in records:
+        entry = mapped.get(r["id"])
+        if entry is None and not r.get(link):
+            continue  # таск створено в Odoo 2, відповідника в Odoo 1 немає
+        if entry is not None and changes.unchanged(changes.snapshot(r, TASK_SYNC_FIELDS_2), entry.odoo2_vals):
+            change_stats.echoes_suppressed += 1
+            continue
+        to_sync.append(r["id"])
+
+    outcome = await asyncio.gather(*(sync_task_from_2_to_1(i) for i in to_sync), return_exceptions=True)
+    failed = []
+    for task_id, res in zip(to_sync, outcome):
+        if isinstance(res, HTTPException) and res.status_code == 400:
+            continue  # без x_odoo1_task_id назад синкати нікуди
+        if isinstance(res, BaseException):
+            print(f"[odoo-delta] project.task 2to1: task {task_id} failed: {res}")
+            failed.append(task_id)
+    return failed
+
+
+STREAMS = [
+    Stream("project.project", "1to2", odoo1, _apply_projects_1_to_2),
+    Stream("project.task", "1to2", odoo1, _apply_tasks_1_to_2),
+    Stream("project.task", "2to1", odoo2, _apply_tasks_2_to_1),
+]
+
+
+# ==========
+# Watermarks
+# ==========
+
+
+def _second(value: Any) -> datetime:
+    """write_date з Odoo -> aware datetime з точністю до секунди."""
+    return id_map.parse_write_date(value)  # type: ignore[return-value]
+
+
+def _odoo_datetime(ts: datetime) -> str:
+    return ts.strftime(ODOO_DATETIME_FORMAT)
+
+
+async def _load(stream: Stream) -> OdooSyncWatermark:
+    async with AsyncSessionLocal() as db:
+        row = await db.get(OdooSyncWatermark, (stream.model, stream.direction))
+        if row is None:
+            row = OdooSyncWatermark(model=stream.model, direction=stream.direction, pending_ids=[], records_synced=0)
+        return row
+
+
+async def _advance(
+    stream: Stream, watermark: Optional[datetime], pending_ids: List[int], synced: int
+) -> None:
+    """Одним upsert: watermark (лише вперед), pending_ids, лічильник."""
+    stmt = insert(OdooSyncWatermark).values(
+        model=stream.model,
+        direction=stream.direction,
+        watermark=watermark,
+        pending_ids=pending_ids,
+        records_synced=synced,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OdooSyncWatermark.model, OdooSyncWatermark.direction],
+        set_={
+            "watermark": func.greatest(OdooSyncWatermark.watermark, stmt.excluded.watermark),
+            "pending_ids": stmt.excluded.pending_ids,
+            "records_synced": OdooSyncWatermark.records_synced + stmt.excluded.records_synced,
+            "updated_at": func.now(),
+        },
+    )
+    async with AsyncSessionLocal() as db:
+        await db.execute(stmt)
+        await db.commit()
+
+
+def _merge_pending(stream: Stream, pending: List[int], done: Sequence[int], failed: Sequence[int]) -> List[int]:
+    done_set = set(done)
+    merged = [i for i in pending if i not in done_set]
+    seen = set(merged)
+    merged += [i for i in failed if i not in seen]
+    if len(merged) > settings.ODOO_DELTA_MAX_PENDING:
+        dropped = merged[: len(merged) - settings.ODOO_DELTA_MAX_PENDING]
+        print(f"[odoo-delta] {stream.name}: pending list full, giving up on {dropped}")
+        merged = merged[len(dropped) :]
+    return merged
+
+
+# ==========
+# Запуск потоку
+# ==========
+
+
+async def _read(stream: Stream, domain: List[Any], fields: List[str], order: str) -> List[Dict[str, Any]]:
+    return await stream.source.search_read(
+        stream.model, domain, fields, limit=settings.ODOO_DELTA_PAGE_SIZE, order=order
+    )
+
+
+async def _apply(stream: Stream, records: List[Dict[str, Any]], pending: List[int]) -> List[int]:
+    """Застосовує записи; повертає оновлений список pending_ids."""
+    try:
+        failed = await stream.apply(records)
+    except Exception as e:
+        print(f"[odoo-delta] {stream.name}: page of {len(records)} failed: {e}")
+        failed = [r["id"] for r in records]
+    return _merge_pending(stream, pending, [r["id"] for r in records], failed)
+
+
+async def run_stream(stream: Stream) -> Dict[str, Any]:
+    state = await _load(stream)
+    fields = await stream.fields()
+    pending: List[int] = list(state.pending_ids or [])
+    synced = 0
+
+    # 1. повтор тих, що впали минулого разу
+    if pending:
+        retry = set(pending[: settings.ODOO_DELTA_PAGE_SIZE])
+        records = await stream.source.search_read(stream.model, [["id", "in", list(retry)]], fields, order="id")
+        found = {r["id"] for r in records}
+        # видалених у джерелі більше не чекаємо
+        pending = [i for i in pending if i in found or i not in retry]
+        if records:
+            pending = await _apply(stream, records, pending)
+        await _advance(stream, state.watermark, pending, len(records))
+        synced += len(records)
+
+    # 2. сторінки за write_date
+    watermark = state.watermark
+    cursor = watermark - timedelta(seconds=settings.ODOO_DELTA_OVERLAP_SECONDS) if watermark else None
+    while True:
+        domain = [["write_date", ">=", _odoo_datetime(cursor)]] if cursor else []
+        page = await _read(stream, domain, fields, "write_date, id")
+        if not page:
+            break
+        full = len(page) == settings.ODOO_DELTA_PAGE_SIZE
+        last_second = _second(page[-1]["write_date"])
+        # в повній сторінці остання секунда могла не влізти цілком — її читаємо наступною сторінкою
+        done = [r for r in page if _second(r["write_date"]) < last_second] if full else page
+
+        if done:
+            pending = await _apply(stream, done, pending)
+            page_synced = len(done)
+            next_cursor = last_second
+        else:
+            # уся сторінка — одна секунда: дочитуємо її по id
+            next_second = last_second + timedelta(seconds=1)
+            last_id, page_synced = 0, 0
+            while True:
+                bucket = await _read(
+                    stream,
+                    [
+                        ["write_date", ">=", _odoo_datetime(last_second)],
+                        ["write_date", "<", _odoo_datetime(next_second)],
+                        ["id", ">", last_id],
+                    ],
+                    fields,
+                    "id",
+                )
+                if not bucket:
+                    break
+                pending = await _apply(stream, bucket, pending)
+                page_synced += len(bucket)
+                last_id = bucket[-1]["id"]
+            next_cursor = next_second
+
+        await _advance(stream, next_cursor, pending, page_synced)
+        synced += page_synced
+        watermark = max(watermark, next_cursor) if watermark else next_cursor
+        cursor = next_cursor
+        if not full:
+            break
+
+    if synced:
+        print(f"[odoo-delta] {stream.name}: {synced} records, watermark {watermark}, pending {len(pending)}")
+    return {"model": stream.model, "direction": stream.direction, "synced": synced, "pending": len(pending)}
+
+
+async def run_delta_sync() -> Dict[str, Any]:
+    """Усі потоки по черзі; один запуск на весь кластер (advisory lock)."""
+    async with engine.connect() as conn:
+        locked = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": DELTA_SYNC_LOCK_KEY})
+        await conn.commit()
+        if not locked:
+            return {"skipped": True, "streams": []}
+        try:
+            streams = []
+            for stream in STREAMS:
+                try:
+                    streams.append(await run_stream(stream))
+                except Exception as e:
+                    print(f"[odoo-delta] {stream.name} failed: {e}")
+                    streams.append({"model": stream.model, "direction": stream.direction, "error": str(e)})
+            return {"skipped": False, "streams": streams}
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": DELTA_SYNC_LOCK_KEY})
+            await conn.commit()
+
+
+async def delta_sync_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.ODOO_DELTA_SYNC_INTERVAL_SECONDS)
+        try:
+            await run_delta_sync()
+        except Exception as e:
+            print(f"[odoo-delta] run failed: {e}")
+
+
+async def reset(models: Optional[Sequence[str]] = None) -> None:
+    """Скинути watermarks: наступний запуск пройде всі записи."""
+    async with AsyncSessionLocal() as db:
+        stmt = delete(OdooSyncWatermark)
+        if models:
+            stmt = stmt.where(OdooSyncWatermark.model.in_(models))
+        await db.execute(stmt)
+        await db.commit()
+
+
+async def watermarks() -> List[Dict[str, Any]]:
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(OdooSyncWatermark).order_by(OdooSyncWatermark.model))).scalars().all()
+    return [
+        {
+            "model": r.model,
+            "direction": r.direction,
+            "watermark": r.watermark,
+            "pending_ids": r.pending_ids,
+            "records_synced": r.records_synced,
+            "updated_at": r.updated_at,
+        }
+        for r in rows
+    ]
+
+
+router = APIRouter(
+    prefix="/api/v1/odoo/projects/delta-sync",
+    tags=["odoo-projects"],
+)
+
+
+@router.get("")
+async def api_delta_sync_status():
+    return {"interval_seconds": settings.ODOO_DELTA_SYNC_INTERVAL_SECONDS, "watermarks": await watermarks()}
+
+
+@router.post("/run")
+async def api_delta_sync_run():
+    """Запустити delta-синк зараз (якщо інший воркер вже синкає — skipped)."""
+    return await run_delta_sync()
+
+
+async def _main(argv: List[str]) -> None:
+    try:
+        if argv and argv[0] == "--reset":
+            await reset(argv[1:] or None)
+        print(await run_delta_sync())
+    finally:
+        await odoo1.close()
+        await odoo2.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
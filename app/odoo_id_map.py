@@ -0,0 +1,230 @@
+# app/odoo_id_map.py
+"""
+Локальний індекс відповідності ID між Odoo 1 і Odoo 2 (таблиця odoo_id_map).
+
+Гейтвей спершу шукає пару тут, і лише для записів, яких тут немає, робить
+search по x_odoo1_*_id в Odoo 2. Після кожного синку пара, хеш записаних
+значень і write_date оновлюються.
+
+Перебудувати індекс з x_odoo1_*_id полів Odoo 2 (пачками, пам'ять обмежена;
+стара мапа моделі замінюється новою однією короткою транзакцією в кінці):
+    python -m app.odoo_id_map rebuild [project.project project.task]
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import delete, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.db import AsyncSessionLocal, engine
+from app.models.odoo_id_map import OdooIdMap
+
+from .odoo_async_client import odoo2
+
+# поле-посилання на Odoo 1 в записах Odoo 2
+LINK_FIELDS = {"project.project": "x_odoo1_project_id", "project.task": "x_odoo1_task_id"}
+# зворотнє посилання на Odoo 2 в записах Odoo 1 (опційне)
+BACKLINK_FIELDS = {"project.project": "x_odoo2_project_id", "project.task": "x_odoo2_task_id"}
+
+REBUILD_PAGE_SIZE = 1000
+
+
+@dataclass
+class IdMapEntry:
+    odoo1_id: int
+    odoo2_id: int
+    synced_hash: Optional[str]
+    odoo1_write_date: Optional[datetime]
+    odoo2_write_date: Optional[datetime]
+    odoo1_vals: Optional[Dict[str, Any]] = None
+    odoo2_vals: Optional[Dict[str, Any]] = None
+
+
+def vals_hash(vals: Dict[str, Any]) -> str:
+    """Відбиток значень, записаних у ціль."""
+    return hashlib.sha256(json.dumps(vals, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def parse_write_date(value: Any) -> Optional[datetime]:
+    """write_date з Odoo ("YYYY-MM-DD HH:MM:SS", UTC) -> aware datetime."""
+    if not value:
+        return None
+    return datetime.strptime(value[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+def _entry(row: OdooIdMap) -> IdMapEntry:
+    return IdMapEntry(
+        row.odoo1_id,
+        row.odoo2_id,
+        row.synced_hash,
+        row.odoo1_write_date,
+        row.odoo2_write_date,
+        row.odoo1_vals,
+        row.odoo2_vals,
+    )
+
+
+async def get_by_odoo1(model: str, odoo1_ids: Sequence[int]) -> Dict[int, IdMapEntry]:
+    if not odoo1_ids:
+        return {}
+    async with AsyncSessionLocal() as db:
+        rows = await db.scalars(
+            select(OdooIdMap).where(OdooIdMap.model == model, OdooIdMap.odoo1_id.in_(list(odoo1_ids)))
+        )
+        return {row.odoo1_id: _entry(row) for row in rows}
+
+
+async def get_by_odoo2(model: str, odoo2_ids: Sequence[int]) -> Dict[int, IdMapEntry]:
+    if not odoo2_ids:
+        return {}
+    async with AsyncSessionLocal() as db:
+        rows = await db.scalars(
+            select(OdooIdMap).where(OdooIdMap.model == model, OdooIdMap.odoo2_id.in_(list(odoo2_ids)))
+        )
+        return {row.odoo2_id: _entry(row) for row in rows}
+
+
+async def save(model: str, entries: Sequence[Dict[str, Any]]) -> None:
+    """
+    Upsert пар. Кожен entry — odoo1_id, odoo2_id і, за бажанням, synced_hash /
+    odoo1_write_date / odoo2_write_date / odoo1_vals / odoo2_vals
+    (оновлюються лише передані колонки).
+    """
+    if not entries:
+        return
+    async with AsyncSessionLocal() as db:
+        pairs = [(e["odoo1_id"], e["odoo2_id"]) for e in entries]
+        # запис Odoo 2 міг бути раніше прив'язаний до іншого запису Odoo 1
+        await db.execute(
+            delete(OdooIdMap).where(
+                OdooIdMap.model == model,
+                OdooIdMap.odoo2_id.in_([p[1] for p in pairs]),
+                tuple_(OdooIdMap.odoo1_id, OdooIdMap.odoo2_id).not_in(pairs),
+            )
+        )
+        by_columns: Dict[frozenset, List[Dict[str, Any]]] = {}
+        for e in entries:
+            by_columns.setdefault(frozenset(e), []).append({"model": model, **e})
+        for columns, rows in by_columns.items():
+            stmt = insert(OdooIdMap).values(rows)
+            set_ = {c: stmt.excluded[c] for c in columns if c != "odoo1_id"}
+            set_["synced_at"] = stmt.excluded.synced_at
+            await db.execute(stmt.on_conflict_do_update(index_elements=["model", "odoo1_id"], set_=set_))
+        await db.commit()
+
+
+async def forget(model: str, odoo1_ids: Iterable[int]) -> None:
+    ids = list(odoo1_ids)
+    if not ids:
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(OdooIdMap).where(OdooIdMap.model == model, OdooIdMap.odoo1_id.in_(ids)))
+        await db.commit()
+
+
+async def reset_snapshots(model: str, odoo1_ids: Iterable[int]) -> None:
+    """Скинути хеш і знімки значень: наступний синк порівняє з тим, що зараз в Odoo 2."""
+    ids = list(odoo1_ids)
+    if not ids:
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(OdooIdMap)
+            .where(OdooIdMap.model == model, OdooIdMap.odoo1_id.in_(ids))
+            .values(synced_hash=None, odoo1_vals=None, odoo2_vals=None)
+        )
+        await db.commit()
+
+
+async def rebuild(models: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    """
+    Заново заповнює odoo_id_map з x_odoo1_*_id полів Odoo 2, сторінками по id.
+    Кожна сторінка окремою короткою транзакцією складається в тимчасову
+    таблицю (живе, поки тримаємо з'єднання); стара мапа моделі замінюється
+    новою однією транзакцією в кінці: читачі весь час бачать повну мапу, а
+    збій посередині нічого не міняє.
+    Хеші й знімки значень скидаються, тож наступний синк кожного запису
+    порівнює значення з поточними в Odoo 2.
+    """
+    counts: Dict[str, int] = {}
+    for model in models or list(LINK_FIELDS):
+        link_field = LINK_FIELDS[model]
+        async with engine.connect() as conn:
+            await conn.execute(
+                text(
+                    "CREATE TEMP TABLE odoo_id_map_rebuild "
+                    "(odoo1_id integer NOT NULL, odoo2_id integer NOT NULL, odoo2_write_date timestamptz)"
+                )
+            )
+            await conn.commit()
+            try:
+                last_id = 0
+                while True:
+                    records = await odoo2.search_read(
+                        model,
+                        [[link_field, "!=", False], ["id", ">", last_id]],
+                        [link_field, "write_date"],
+                        limit=REBUILD_PAGE_SIZE,
+                        order="id",
+                    )
+                    if not records:
+                        break
+                    last_id = records[-1]["id"]
+                    await conn.execute(
+                        text(
+                            "INSERT INTO odoo_id_map_rebuild (odoo1_id, odoo2_id, odoo2_write_date) "
+                            "VALUES (:odoo1_id, :odoo2_id, :odoo2_write_date)"
+                        ),
+                        [
+                            {
+                                "odoo1_id": r[link_field],
+                                "odoo2_id": r["id"],
+                                "odoo2_write_date": parse_write_date(r.get("write_date")),
+                            }
+                            for r in records
+                        ],
+                    )
+                    await conn.commit()
+
+                await conn.execute(delete(OdooIdMap).where(OdooIdMap.model == model))
+                # дублікати x_odoo1_*_id: лишається запис Odoo 2 з меншим id
+                result = await conn.execute(
+                    text(
+                        "INSERT INTO odoo_id_map (model, odoo1_id, odoo2_id, odoo2_write_date) "
+                        "SELECT DISTINCT ON (odoo1_id) :model, odoo1_id, odoo2_id, odoo2_write_date "
+                        "FROM odoo_id_map_rebuild ORDER BY odoo1_id, odoo2_id "
+                        "ON CONFLICT DO NOTHING"
+                    ),
+                    {"model": model},
+                )
+                await conn.commit()
+            finally:
+                # з'єднання повертається в пул, тимчасова таблиця — ні
+                await conn.rollback()
+                await conn.execute(text("DROP TABLE IF EXISTS odoo_id_map_rebuild"))
+                await conn.commit()
+        count = result.rowcount or 0
+        counts[model] = count
+        print(f"[odoo-id-map] {model}: {count} pairs")
+    return counts
+
+
+async def _main(argv: List[str]) -> None:
+    if not argv or argv[0] != "rebuild":
+        print("usage: python -m app.odoo_id_map rebuild [model ...]")
+        sys.exit(2)
+    try:
+        await rebuild(argv[1:] or None)
+    finally:
+        await odoo2.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,405 @@
+# app/odoo_jobs.py
+"""
+Черга синків Odoo в Postgres (таблиця odoo_sync_jobs).
+
+Вебхуки (/sync-*, /task-changed-in-2) лише ставлять job і одразу віддають 202;
+синк робить пул воркерів (ODOO_JOB_WORKERS корутин у кожному процесі):
+  - job забирається через SELECT ... FOR UPDATE SKIP LOCKED, тож кілька
+    процесів не беруть один і той самий job;
+  - по одному запису в черзі максимум один queued job (dedup_key
+    "<kind>:<record_id>"): повторні події лише збільшують events;
+  - job-и одного запису не виконуються паралельно — наступний чекає, поки
+    завершиться той, що running (порядок по запису зберігається); пакети
+    одного типу теж ідуть по одному; гарантує це унікальний індекс по
+    running job-ах (uq_odoo_sync_jobs_running_key), не лише умова в claim;
+  - воркер тримає job під lease (locked_until); job впалого процесу після
+    lease забере інший воркер;
+  - помилка -> повтор з експоненційним backoff до ODOO_JOB_MAX_ATTEMPTS,
+    4xx від синку (немає запису, немає зв'язку) -> одразу dead;
+  - dead job-и копіюються в odoo_sync_dead_jobs, повторити — POST /jobs/{id}/retry.
+Статус job-а: GET /api/v1/odoo/projects/jobs/{id}.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.models.odoo_sync_job import OdooSyncJob
+
+# handler(record_id, payload) -> результат, що зберігається в job.result
+Handler = Callable[[Optional[int], Optional[Dict[str, Any]]], Awaitable[Dict[str, Any]]]
+
+PURGE_INTERVAL_SECONDS = 600.0
+
+_handlers: Dict[str, Handler] = {}
+
+
+def register(kind: str, handler: Handler) -> None:
+    _handlers[kind] = handler
+
+
+# ==========
+# Pydantic схеми
+# ==========
+
+
+class JobAccepted(BaseModel):
+    job_id: int
+    status: str
+    # подію злито з job-ом, що вже чекав у черзі на цей запис
+    deduplicated: bool
+
+
+class JobStatus(BaseModel):
+    id: int
+    kind: str
+    record_id: Optional[int] = None
+    status: str
+    attempts: int
+    events: int
+    run_after: datetime
+    last_error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+# ==========
+# Операції з чергою
+# ==========
+
+
+async def enqueue(kind: str, record_id: Optional[int] = None, payload: Optional[Dict[str, Any]] = None) -> JobAccepted:
+    dedup_key = f"{kind}:{record_id}" if record_id is not None else None
+    stmt = insert(OdooSyncJob).values(kind=kind, record_id=record_id, dedup_key=dedup_key, payload=payload)
+    if dedup_key is not None:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[OdooSyncJob.dedup_key],
+            index_where=OdooSyncJob.status == "queued",
+            # job, що чекає backoff, з новою подією запускаємо одразу
+            set_={"events": OdooSyncJob.events + 1, "run_after": func.now(), "updated_at": func.now()},
+        )
+    stmt = stmt.returning(OdooSyncJob.id, OdooSyncJob.events)
+    async with AsyncSessionLocal() as db:
+        job_id, events = (await db.execute(stmt)).one()
+        await db.commit()
+    job_workers.wake()
+    return JobAccepted(job_id=job_id, status="queued", deduplicated=events > 1)
+
+
+_CLAIM_SQL = text(
+    """
+    WITH next AS (
+        SELECT j.id FROM odoo_sync_jobs j
+        WHERE (
+            (j.status = 'queued' AND j.run_after <= now())
+            OR (j.status = 'running' AND j.locked_until < now())
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM odoo_sync_jobs r
+            WHERE r.id <> j.id AND r.status = 'running'
+              AND coalesce(r.dedup_key, r.kind) = coalesce(j.dedup_key, j.kind)
+        )
+        ORDER BY j.id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE odoo_sync_jobs j
+    SET status = 'running', attempts = j.attempts + 1,
+        locked_until = now() + make_interval(secs => :lease), updated_at = now()
+    FROM next WHERE j.id = next.id
+    RETURNING j.id, j.kind, j.record_id, j.payload, j.attempts
+    """
+)
+
+# повернути job в чергу; якщо на цей запис вже чекає новіший — цей зайвий
+_REQUEUE_SQL = text(
+    """
+    UPDATE odoo_sync_jobs j
+    SET status = CASE WHEN EXISTS (
+            SELECT 1 FROM odoo_sync_jobs q WHERE q.dedup_key = j.dedup_key AND q.status = 'queued'
+        ) THEN 'superseded' ELSE 'queued' END,
+        finished_at = CASE WHEN EXISTS (
+            SELECT 1 FROM odoo_sync_jobs q WHERE q.dedup_key = j.dedup_key AND q.status = 'queued'
+        ) THEN now() END,
+        attempts = j.attempts - :refund,
+        run_after = now() + make_interval(secs => :delay),
+        last_error = coalesce(:error, j.last_error),
+        locked_until = NULL, updated_at = now()
+    WHERE j.id = :id
+    RETURNING j.status
+    """
+)
+
+_DEAD_SQL = text(
+    """
+    WITH dead AS (
+        UPDATE odoo_sync_jobs
+        SET status = 'dead', last_error = :error, locked_until = NULL,
+            finished_at = now(), updated_at = now()
+        WHERE id = :id
+        RETURNING id, kind, record_id, payload, attempts, last_error, created_at
+    )
+    INSERT INTO odoo_sync_dead_jobs (job_id, kind, record_id, payload, attempts, last_error, created_at)
+    SELECT id, kind, record_id, payload, attempts, last_error, created_at FROM dead
+    ON CONFLICT (job_id) DO UPDATE
+    SET attempts = excluded.attempts, last_error = excluded.last_error, failed_at = now()
+    """
+)
+
+
+async def _execute(stmt: Any, params: Dict[str, Any]) -> Any:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(stmt, params)
+        row = result.first() if result.returns_rows else None
+        await db.commit()
+        return row
+
+
+async def _claim() -> Optional[Any]:
+    # NOT EXISTS читає знімок на початок запиту: два воркери одночасно можуть
+    # обрати різні job-и одного ключа; другий впирається в
+    # uq_odoo_sync_jobs_running_key і пробує ще раз зі свіжим знімком
+    for _ in range(3):
+        try:
+            return await _execute(_CLAIM_SQL, {"lease": settings.ODOO_JOB_LEASE_SECONDS})
+        except IntegrityError:
+            continue
+    return None
+
+
+async def _done(job_id: int, result: Dict[str, Any]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            OdooSyncJob.__table__.update()
+            .where(OdooSyncJob.id == job_id)
+            .values(
+                status="done",
+                result=result,
+                last_error=None,
+                locked_until=None,
+                finished_at=func.now(),
+                updated_at=func.now(),
+            )
+        )
+        await db.commit()
+
+
+def _retry_delay(attempt: int) -> float:
+    """Full jitter, як у ретраях проксі."""
+    ceiling = min(
+        settings.ODOO_JOB_RETRY_MAX_DELAY_SECONDS,
+        settings.ODOO_JOB_RETRY_DELAY_SECONDS * (2 ** (attempt - 1)),
+    )
+    return random.uniform(0, ceiling)
+
+
+def _permanent(e: BaseException) -> bool:
+    """4xx від синку (немає запису, немає зв'язку) повтором не виправити."""
+    return isinstance(e, HTTPException) and e.status_code < 500
+
+
+def _describe(e: BaseException) -> str:
+    if isinstance(e, HTTPException):
+        return f"{e.status_code}: {e.detail}"
+    if isinstance(e, asyncio.TimeoutError):
+        return f"timed out after {settings.ODOO_JOB_LEASE_SECONDS}s"
+    return f"{type(e).__name__}: {e}"
+
+
+async def purge_finished() -> int:
+    """Видаляє завершені job-и, старші за ODOO_JOB_RETENTION_HOURS (dead лишаються в odoo_sync_dead_jobs)."""
+    row = await _execute(
+        text(
+            "WITH gone AS (DELETE FROM odoo_sync_jobs WHERE status IN ('done', 'dead', 'superseded') "
+            "AND finished_at < now() - make_interval(secs => :age) RETURNING 1) SELECT count(*) FROM gone"
+        ),
+        {"age": settings.ODOO_JOB_RETENTION_HOURS * 3600},
+    )
+    return row[0] if row else 0
+
+
+# ==========
+# Пул воркерів
+# ==========
+
+
+class JobWorkerPool:
+    def __init__(self) -> None:
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self.in_flight = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.dead = 0
+        self.superseded = 0
+        self.claim_errors = 0
+
+    async def start(self) -> None:
+        if self._tasks or settings.ODOO_JOB_WORKERS <= 0:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._run(n), name=f"odoo-job-worker-{n}") for n in range(settings.ODOO_JOB_WORKERS)
+        ]
+
+    async def stop(self) -> None:
+        """Job-и в роботі повертаються в чергу, їх добере наступний воркер."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wake = None
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=settings.ODOO_JOB_POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _run(self, n: int) -> None:
+        loop = asyncio.get_running_loop()
+        next_purge = loop.time() + PURGE_INTERVAL_SECONDS
+        while True:
+            try:
+                job = await _claim()
+            except Exception as e:
+                self.claim_errors += 1
+                print(f"[odoo-jobs] worker {n}: claim failed: {e}")
+                await asyncio.sleep(settings.ODOO_JOB_POLL_INTERVAL_SECONDS)
+                continue
+            if job is None:
+                if n == 0 and loop.time() >= next_purge:
+                    next_purge = loop.time() + PURGE_INTERVAL_SECONDS
+                    try:
+                        await purge_finished()
+                    except Exception as e:
+                        print(f"[odoo-jobs] purge failed: {e}")
+                await self._idle()
+                continue
+            await self._process(job)
+
+    async def _process(self, job: Any) -> None:
+        handler = _handlers.get(job.kind)
+        # kind з БД у мітку метрики — лише зареєстровані
+        kind = job.kind if handler is not None else "unknown"
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            if handler is None:
+                raise HTTPException(status_code=400, detail=f"unknown job kind {job.kind}")
+            result = await asyncio.wait_for(handler(job.record_id, job.payload), settings.ODOO_JOB_LEASE_SECONDS)
+        except asyncio.CancelledError:
+            # shutdown: job не вважаємо спробою
+            await asyncio.shield(_execute(_REQUEUE_SQL, {"id": job.id, "refund": 1, "delay": 0, "error": None}))
+            raise
+        except Exception as e:
+            metrics.SYNC_JOB_DURATION.labels(kind).observe(time.monotonic() - started)
+            await self._failed(job, kind, e)
+        else:
+            metrics.SYNC_JOB_DURATION.labels(kind).observe(time.monotonic() - started)
+            await _done(job.id, result)
+            self.succeeded += 1
+            metrics.SYNC_JOBS.labels(kind, "done").inc()
+        finally:
+            self.in_flight -= 1
+
+    async def _failed(self, job: Any, kind: str, e: BaseException) -> None:
+        error = _describe(e)
+        try:
+            if _permanent(e) or job.attempts >= settings.ODOO_JOB_MAX_ATTEMPTS:
+                await _execute(_DEAD_SQL, {"id": job.id, "error": error})
+                self.dead += 1
+                metrics.SYNC_JOBS.labels(kind, "dead").inc()
+                print(f"[odoo-jobs] job {job.id} {job.kind} {job.record_id} dead after {job.attempts} attempts: {error}")
+                return
+            delay = _retry_delay(job.attempts)
+            row = await _execute(_REQUEUE_SQL, {"id": job.id, "refund": 0, "delay": delay, "error": error})
+            if row is not None and row.status == "superseded":
+                self.superseded += 1
+                metrics.SYNC_JOBS.labels(kind, "superseded").inc()
+            else:
+                self.retried += 1
+                metrics.SYNC_JOBS.labels(kind, "retried").inc()
+        except Exception as db_error:
+            # lease закінчиться, і job забере інший воркер
+            print(f"[odoo-jobs] job {job.id}: could not record failure: {db_error}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "in_flight": self.in_flight,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead": self.dead,
+            "superseded": self.superseded,
+            "claim_errors": self.claim_errors,
+        }
+
+
+job_workers = JobWorkerPool()
+
+
+# ==========
+# FastAPI endpoints
+# ==========
+
+router = APIRouter(
+    prefix="/api/v1/odoo/projects/jobs",
+    tags=["odoo-projects"],
+)
+
+
+@router.get("")
+async def api_jobs_status():
+    """Кількість job-ів за статусами (по всіх процесах) і лічильники воркерів цього процесу."""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(OdooSyncJob.status, func.count()).group_by(OdooSyncJob.status))).all()
+    return {"jobs": {status: count for status, count in rows}, "workers": job_workers.stats()}
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def api_job_status(job_id: int):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(OdooSyncJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return JobStatus.model_validate(job, from_attributes=True)
+
+
+@router.post("/{job_id}/retry", response_model=JobAccepted, status_code=202)
+async def api_job_retry(job_id: int):
+    """Повернути dead job в чергу з нуля спроб."""
+    try:
+        row = await _execute(
+            text(
+                "UPDATE odoo_sync_jobs SET status = 'queued', attempts = 0, run_after = now(), "
+                "finished_at = NULL, updated_at = now() WHERE id = :id AND status = 'dead' RETURNING id"
+            ),
+            {"id": job_id},
+        )
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="another job for this record is already queued")
+    if row is None:
+        raise HTTPException(status_code=404, detail="no dead job with this id")
+    await _execute(text("DELETE FROM odoo_sync_dead_jobs WHERE job_id = :id"), {"id": job_id})
+    job_workers.wake()
+    return JobAccepted(job_id=job_id, status="queued", deduplicated=False)
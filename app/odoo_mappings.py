@@ -0,0 +1,185 @@
+# app/odoo_mappings.py
+"""
+Кеш мапінгу користувачів і стадій між Odoo 1 та Odoo 2.
+
+Усі res.users (login/email -> id) і project.task.type (name -> id) з обох баз
+читаються одним bulk-запитом на модель, далі мапінг іде з пам'яті. Кеш
+перечитується, коли мине ODOO_MAPPING_TTL_SECONDS, або через
+POST /api/v1/odoo/projects/mappings/invalidate.
+
+Кеш живе в кожному воркері окремо: invalidate перечитує його у воркері, який
+прийняв запит, інші підхоплять зміни не пізніше ніж через TTL.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter
+
+from app.core.config import settings
+
+from .odoo_async_client import AsyncOdooClient, odoo1, odoo2
+
+
+@dataclass
+class InstanceMappings:
+    """Користувачі й стадії однієї бази Odoo."""
+
+    # id -> (login, email)
+    users: Dict[int, tuple] = field(default_factory=dict)
+    user_by_login: Dict[str, int] = field(default_factory=dict)
+    user_by_email: Dict[str, int] = field(default_factory=dict)
+    stage_by_name: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    async def load(cls, client: AsyncOdooClient) -> "InstanceMappings":
+        users, stages = await asyncio.gather(
+            client.search_read("res.users", [], ["login", "email"], order="id"),
+            client.search_read("project.task.type", [], ["name"], order="id"),
+        )
+        m = cls()
+        for u in users:
+            login, email = u.get("login") or None, u.get("email") or None
+            m.users[u["id"]] = (login, email)
+            # як search(..., limit=1): перший за id
+            if login:
+                m.user_by_login.setdefault(login, u["id"])
+            if email:
+                m.user_by_email.setdefault(email, u["id"])
+        for s in stages:
+            if s.get("name"):
+                m.stage_by_name.setdefault(s["name"], s["id"])
+        return m
+
+    def find_user(self, login: Optional[str], email: Optional[str]) -> Optional[int]:
+        """Спершу по login, потім по email."""
+        if login and login in self.user_by_login:
+            return self.user_by_login[login]
+        if email and email in self.user_by_email:
+            return self.user_by_email[email]
+        return None
+
+
+class OdooMappings:
+    def __init__(self) -> None:
+        self._odoo1: Optional[InstanceMappings] = None
+        self._odoo2: Optional[InstanceMappings] = None
+        self._loaded_at: Optional[float] = None
+        self._loaded_at_wall: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self.loads = 0
+
+    def _expired(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= settings.ODOO_MAPPING_TTL_SECONDS
+
+    async def _load(self) -> None:
+        self._odoo1, self._odoo2 = await asyncio.gather(InstanceMappings.load(odoo1), InstanceMappings.load(odoo2))
+        self._loaded_at = time.monotonic()
+        self._loaded_at_wall = datetime.now(timezone.utc)
+        self.loads += 1
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            await self._load()
+
+    async def _ensure(self) -> None:
+        if not self._expired():
+            return
+        async with self._lock:
+            # поки чекали lock, інший запит уже перечитав
+            if not self._expired():
+                return
+            try:
+                await self._load()
+            except Exception as e:
+                if self._odoo1 is None or self._odoo2 is None:
+                    raise
+                # краще старий мапінг, ніж жодного; спробуємо ще раз на наступному виклику
+                print(f"[odoo-mappings] refresh failed, keeping the old tables: {e}")
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    async def map_user_1_to_2(self, user_id_in_1: Any) -> bool | int:
+        """
+        user_id_in_1 - id res.users в Odoo1 (або False)
+        Повертає int (user_id в Odoo2) або False (нічого не ставимо).
+        """
+        return await self._map_user(
+            user_id_in_1, "1", settings.ODOO_USER_MAP_1_TO_2, settings.ODOO_USER_FALLBACK_1_TO_2
+        )
+
+    async def map_user_2_to_1(self, user_id_in_2: Any) -> bool | int:
+        return await self._map_user(
+            user_id_in_2, "2", settings.ODOO_USER_MAP_2_TO_1, settings.ODOO_USER_FALLBACK_2_TO_1
+        )
+
+    async def _map_user(
+        self, user_id: Any, source: str, explicit: Dict[int, int], fallback: Optional[int]
+    ) -> bool | int:
+        if not user_id:
+            return False
+
+        # 1) явний mapping по ID
+        if user_id in explicit:
+            return explicit[user_id]
+
+        # 2-3) по login, потім по email
+        await self._ensure()
+        src, dst = (self._odoo1, self._odoo2) if source == "1" else (self._odoo2, self._odoo1)
+        login, email = src.users.get(user_id, (None, None))
+        found = dst.find_user(login, email)
+        if found:
+            return found
+
+        # 4) fallback
+        if fallback is not None:
+            return fallback
+
+        # 5) взагалі нікого не ставимо
+        return False
+
+    async def map_stage(self, stage_name: Optional[str], target: str) -> Optional[int]:
+        """id стадії з такою назвою в target ("1" або "2")."""
+        if not stage_name:
+            return None
+        await self._ensure()
+        mappings = self._odoo1 if target == "1" else self._odoo2
+        return mappings.stage_by_name.get(stage_name)
+
+    def stats(self) -> Dict[str, Any]:
+        loaded = self._odoo1 is not None and self._odoo2 is not None
+        return {
+            "loaded": loaded,
+            "loaded_at": self._loaded_at_wall.isoformat() if self._loaded_at_wall else None,
+            "expired": self._expired(),
+            "ttl_seconds": settings.ODOO_MAPPING_TTL_SECONDS,
+            "loads": self.loads,
+            "odoo1": {"users": len(self._odoo1.users), "stages": len(self._odoo1.stage_by_name)} if loaded else None,
+            "odoo2": {"users": len(self._odoo2.users), "stages": len(self._odoo2.stage_by_name)} if loaded else None,
+        }
+
+
+odoo_mappings = OdooMappings()
+
+router = APIRouter(
+    prefix="/api/v1/odoo/projects/mappings",
+    tags=["odoo-projects"],
+)
+
+
+@router.get("")
+async def api_mappings_status():
+    return odoo_mappings.stats()
+
+
+@router.post("/invalidate")
+async def api_mappings_invalidate():
+    """Перечитати користувачів і стадії з обох Odoo зараз."""
+    odoo_mappings.invalidate()
+    await odoo_mappings.refresh()
+    return odoo_mappings.stats()
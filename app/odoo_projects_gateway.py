@@ -1,12 +1,19 @@
 # app/odoo_projects_gateway.py
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from .odoo_client import odoo1_client, odoo2_client
+from . import odoo_changes as changes
+from . import odoo_id_map as id_map
+from . import odoo_jobs as jobs
+from .odoo_async_client import OdooRPCError, m2o_id, m2o_name, odoo1, odoo2
+from .odoo_changes import change_stats
+from .odoo_jobs import JobAccepted
+from .odoo_mappings import odoo_mappings
 
 router = APIRouter(
     prefix="/api/v1/odoo/projects",
@@ -43,104 +50,109 @@ class TaskChangedIn2Response(BaseModel):
 
 
 # ==========
-# НАЛАШТУВАННЯ МАПІНГУ КОРИСТУВАЧІВ
+# Допоміжні функції
 # ==========
 
-# ЯВНИЙ mapping ID -> ID (підставиш свої)
-USER_MAP_1_TO_2: dict[int, int] = {
-    # приклад:
-    # 2: 5,   # користувач з id=2 в Odoo1 відповідає id=5 в Odoo2
-}
+# мапінг користувачів і стадій — з кешу, див. app/odoo_mappings.py;
+# явні мапи й fallback-користувачі — ODOO_USER_MAP_* / ODOO_USER_FALLBACK_* в конфігу
 
-USER_MAP_2_TO_1: dict[int, int] = {
-    # приклад:
-    # 5: 2,
-}
 
-# Fallback-користувачі (якщо ні в мапі, ні по email/login не знайшли)
-# Якщо не хочеш fallback'а — лиши None
-USER_FALLBACK_1_TO_2: Optional[int] = None  # id користувача в Odoo2
-USER_FALLBACK_2_TO_1: Optional[int] = None  # id користувача в Odoo1
+async def _noop(value: Any = None) -> Any:
+    return value
 
 
-def _map_user_1_to_2(user_1, env2) -> bool | int:
+async def _upsert_in_2(
+    model: str, id_in_1: int, vals: Dict[str, Any], entry: Optional[id_map.IdMapEntry]
+) -> Tuple[int, bool]:
     """
-    user_1 - browse record res.users з Odoo1
-    Повертає:
-      - int (user_id в Odoo2),
-      - або False (нічого не ставимо).
+    Пише у відповідник запису в Odoo 2 лише змінені поля або створює його.
+    Повертає (id в Odoo 2, чи це новий зв'язок — тоді треба записати зворотній ID).
     """
-    if not user_1:
-        return False
-
-    # 1) явний mapping по ID
-    if user_1.id in USER_MAP_1_TO_2:
-        return USER_MAP_1_TO_2[user_1.id]
-
-    Users2 = env2["res.users"]
-
-    # 2) пробуємо знайти по login
-    if getattr(user_1, "login", None):
-        ids = Users2.search([("login", "=", user_1.login)], limit=1)
-        if ids:
-            return ids[0]
-
-    # 3) пробуємо знайти по email
-    if getattr(user_1, "email", None):
-        ids = Users2.search([("email", "=", user_1.email)], limit=1)
-        if ids:
-            return ids[0]
-
-    # 4) fallback
-    if USER_FALLBACK_1_TO_2 is not None:
-        return USER_FALLBACK_1_TO_2
-
-    # 5) взагалі нікого не ставимо
-    return False
-
-
-def _map_user_2_to_1(user_2, env1) -> bool | int:
-    """
-    user_2 - browse record res.users з Odoo2.
-    Аналогічно _map_user_1_to_2, але в зворотній бік.
-    """
-    if not user_2:
-        return False
-
-    if user_2.id in USER_MAP_2_TO_1:
-        return USER_MAP_2_TO_1[user_2.id]
-
-    Users1 = env1["res.users"]
-
-    if getattr(user_2, "login", None):
-        ids = Users1.search([("login", "=", user_2.login)], limit=1)
-        if ids:
-            return ids[0]
-
-    if getattr(user_2, "email", None):
-        ids = Users1.search([("email", "=", user_2.email)], limit=1)
-        if ids:
-            return ids[0]
-
-    if USER_FALLBACK_2_TO_1 is not None:
-        return USER_FALLBACK_2_TO_1
+    if entry is not None:
+        known = entry.odoo2_vals
+        if known is None:
+            # знімка ще немає (напр. після rebuild) — порівнюємо з тим, що зараз в Odoo 2
+            current = await odoo2.search_read(model, [["id", "=", entry.odoo2_id]], list(vals))
+            known = changes.snapshot(current[0], vals) if current else None
+        if known is not None:
+            changed = changes.diff(vals, known)
+            change_stats.wrote(vals, changed)
+            if not changed:
+                return entry.odoo2_id, False
+            try:
+                await odoo2.write(model, [entry.odoo2_id], changed)
+                return entry.odoo2_id, False
+            except OdooRPCError:
+                pass
+        # запис в Odoo 2 могли видалити — забуваємо пару і шукаємо як раніше
+        await id_map.forget(model, [id_in_1])
+
+    existing = await odoo2.search_read(model, [[id_map.LINK_FIELDS[model], "=", id_in_1]], list(vals), limit=1)
+    if existing:
+        changed = changes.diff(vals, changes.snapshot(existing[0], vals))
+        change_stats.wrote(vals, changed)
+        if changed:
+            await odoo2.write(model, [existing[0]["id"]], changed)
+        return existing[0]["id"], True
+    return await odoo2.create(model, vals), True
+
+
+PROJECT_SYNC_FIELDS = ["name", "partner_id", "user_id", "company_id"]
+PROJECT_FIELDS = PROJECT_SYNC_FIELDS + ["write_date"]
+TASK_SYNC_FIELDS_1 = [
+    "name",
+    "user_id",
+    "date_deadline",
+    "kanban_state",
+    "company_id",
+    "project_id",
+    "stage_id",
+]
+TASK_FIELDS_1 = TASK_SYNC_FIELDS_1 + ["write_date"]
+TASK_SYNC_FIELDS_2 = ["name", "user_id", "date_deadline", "kanban_state", "stage_id"]
+TASK_FIELDS_2 = TASK_SYNC_FIELDS_2 + ["write_date"]
+
+
+def project_vals_in_2(proj1: Dict[str, Any], user_id_in_2: Any) -> Dict[str, Any]:
+    """vals для project.project в Odoo 2 із запису Odoo 1 (користувач уже замаплений)."""
+    return {
+        "name": proj1["name"],
+        "partner_id": m2o_id(proj1["partner_id"]),
+        "user_id": user_id_in_2 or False,
+        "company_id": m2o_id(proj1["company_id"]),
+        "x_odoo1_project_id": proj1["id"],
+    }
 
-    return False
 
+def task_vals_in_2(
+    task1: Dict[str, Any], user_id_in_2: Any, project_id_in_2: Any, stage_id_in_2: Any
+) -> Dict[str, Any]:
+    """vals для project.task в Odoo 2; стадію без відповідника не чіпаємо."""
+    vals_2 = {
+        "name": task1["name"],
+        "user_id": user_id_in_2 or False,
+        "date_deadline": task1["date_deadline"] or False,
+        "kanban_state": task1["kanban_state"] or "normal",
+        "company_id": m2o_id(task1["company_id"]),
+        "project_id": project_id_in_2 or False,
+        "x_odoo1_task_id": task1["id"],
+    }
+    if stage_id_in_2:
+        vals_2["stage_id"] = stage_id_in_2
+    return vals_2
 
-# ==========
-# Інші допоміжні функції
-# ==========
 
+async def _source_fields(model: str, fields: List[str]) -> List[str]:
+    """Поля для читання з Odoo 1 + зворотній x_odoo2_*_id, якщо він є."""
+    backlink = id_map.BACKLINK_FIELDS[model]
+    return fields + [backlink] if await odoo1.has_field(model, backlink) else fields
 
-def _map_task_stage_by_name(source_stage, target_env) -> Optional[int]:
-    """Мапає stage_id (project.task.type) за ім’ям між базами."""
-    if not source_stage:
-        return None
 
-    TaskStage = target_env["project.task.type"]
-    ids = TaskStage.search([("name", "=", source_stage.name)], limit=1)
-    return ids[0] if ids else None
+async def _write_backlink(model: str, record: Dict[str, Any], id_in_2: int) -> None:
+    """Зворотній ID в Odoo 1, якщо поле існує і ще не має цього значення."""
+    backlink = id_map.BACKLINK_FIELDS[model]
+    if backlink in record and changes.normalize(record[backlink]) != id_in_2:
+        await odoo1.write(model, [record["id"]], {backlink: id_in_2})
 
 
 # ==========
@@ -148,50 +160,53 @@ def _map_task_stage_by_name(source_stage, target_env) -> Optional[int]:
 # ==========
 
 
-def sync_project_from_1_to_2(project_id_in_1: int) -> int:
+async def sync_project_from_1_to_2(project_id_in_1: int) -> int:
     """
     Читаємо project.project з Odoo 1 і створюємо/оновлюємо відповідний
-    project.project в Odoo 2.
+    project.project в Odoo 2 (лише змінені поля).
 
     Зв’язки:
+      - odoo_id_map (читаємо першим)
       - в Odoo 2: project.project.x_odoo1_project_id
-      - в Odoo 1: project.project.x_odoo2_project_id (опційно оновлюємо)
+      - в Odoo 1: project.project.x_odoo2_project_id (опційно, пишемо для нових пар)
     """
-    env1 = odoo1_client.env
-    env2 = odoo2_client.env
-
-    Project1 = env1["project.project"]
-    Project2 = env2["project.project"]
-
-    proj1 = Project1.browse(project_id_in_1)
-    if not proj1.exists():
+    fields = await _source_fields("project.project", PROJECT_FIELDS)
+    projects, mapped = await asyncio.gather(
+        odoo1.search_read("project.project", [["id", "=", project_id_in_1]], fields),
+        id_map.get_by_odoo1("project.project", [project_id_in_1]),
+    )
+    if not projects:
         raise HTTPException(status_code=404, detail="project not found in Odoo 1")
+    proj1 = projects[0]
+    entry = mapped.get(project_id_in_1)
 
-    # шукаємо чи вже є цей проєкт в Odoo 2
-    existing_ids = Project2.search([("x_odoo1_project_id", "=", project_id_in_1)], limit=1)
+    snapshot_1 = changes.snapshot(proj1, PROJECT_SYNC_FIELDS)
+    if entry is not None and entry.odoo2_vals is not None and changes.unchanged(snapshot_1, entry.odoo1_vals):
+        # з останнього синку в Odoo 1 нічого не змінилось
+        change_stats.records_unchanged += 1
+        return entry.odoo2_id
 
-    # мапимо user_id
-    user_id_in_2 = _map_user_1_to_2(proj1.user_id, env2)
+    vals_2 = project_vals_in_2(proj1, await odoo_mappings.map_user_1_to_2(m2o_id(proj1["user_id"])))
 
-    vals_2 = {
-        "name": proj1.name,
-        "partner_id": proj1.partner_id.id or False,
-        "user_id": user_id_in_2,
-        "company_id": proj1.company_id.id or False,
-        "x_odoo1_project_id": project_id_in_1,
-    }
-
-    if existing_ids:
-        project_id_in_2 = existing_ids[0]
-        proj2 = Project2.browse(project_id_in_2)
-        proj2.write(vals_2)
-    else:
-        project_id_in_2 = Project2.create(vals_2)
+    project_id_in_2, new_link = await _upsert_in_2("project.project", project_id_in_1, vals_2, entry)
 
     # зворотній ID в Odoo1, якщо поле існує
-    if hasattr(proj1, "x_odoo2_project_id"):
-        proj1.write({"x_odoo2_project_id": project_id_in_2})
-
+    if new_link:
+        await _write_backlink("project.project", proj1, project_id_in_2)
+
+    await id_map.save(
+        "project.project",
+        [
+            {
+                "odoo1_id": project_id_in_1,
+                "odoo2_id": project_id_in_2,
+                "synced_hash": id_map.vals_hash(vals_2),
+                "odoo1_write_date": id_map.parse_write_date(proj1["write_date"]),
+                "odoo1_vals": snapshot_1,
+                "odoo2_vals": vals_2,
+            }
+        ],
+    )
     return project_id_in_2
 
 
@@ -200,57 +215,55 @@ def sync_project_from_1_to_2(project_id_in_1: int) -> int:
 # ==========
 
 
-def sync_task_from_1_to_2(task_id_in_1: int) -> int:
+async def sync_task_from_1_to_2(task_id_in_1: int) -> int:
     """
     Читаємо project.task з Odoo 1 і створюємо/оновлюємо відповідний
-    project.task в Odoo 2.
+    project.task в Odoo 2 (лише змінені поля).
     """
-    env1 = odoo1_client.env
-    env2 = odoo2_client.env
-
-    Task1 = env1["project.task"]
-    Task2 = env2["project.task"]
-
-    task1 = Task1.browse(task_id_in_1)
-    if not task1.exists():
+    fields = await _source_fields("project.task", TASK_FIELDS_1)
+    tasks, mapped = await asyncio.gather(
+        odoo1.search_read("project.task", [["id", "=", task_id_in_1]], fields),
+        id_map.get_by_odoo1("project.task", [task_id_in_1]),
+    )
+    if not tasks:
         raise HTTPException(status_code=404, detail="task not found in Odoo 1")
-
-    # проєкт теж синкаємо
-    project_id_in_2 = None
-    if task1.project_id:
-        project_id_in_2 = sync_project_from_1_to_2(task1.project_id.id)
-
-    existing_ids = Task2.search([("x_odoo1_task_id", "=", task_id_in_1)], limit=1)
-
-    stage_id_in_2 = None
-    if task1.stage_id:
-        stage_id_in_2 = _map_task_stage_by_name(task1.stage_id, env2)
-
-    # мап юзера
-    user_id_in_2 = _map_user_1_to_2(task1.user_id, env2)
-
-    vals_2 = {
-        "name": task1.name,
-        "user_id": user_id_in_2,
-        "date_deadline": task1.date_deadline or False,
-        "kanban_state": task1.kanban_state or "normal",
-        "company_id": task1.company_id.id or False,
-        "project_id": project_id_in_2 or False,
-        "x_odoo1_task_id": task_id_in_1,
-    }
-    if stage_id_in_2:
-        vals_2["stage_id"] = stage_id_in_2
-
-    if existing_ids:
-        task_id_in_2 = existing_ids[0]
-        task2 = Task2.browse(task_id_in_2)
-        task2.write(vals_2)
-    else:
-        task_id_in_2 = Task2.create(vals_2)
-
-    if hasattr(task1, "x_odoo2_task_id"):
-        task1.write({"x_odoo2_task_id": task_id_in_2})
-
+    task1 = tasks[0]
+    entry = mapped.get(task_id_in_1)
+
+    snapshot_1 = changes.snapshot(task1, TASK_SYNC_FIELDS_1)
+    if entry is not None and entry.odoo2_vals is not None and changes.unchanged(snapshot_1, entry.odoo1_vals):
+        # з останнього синку в Odoo 1 нічого не змінилось (або це ехо нашого ж запису 2 → 1)
+        change_stats.records_unchanged += 1
+        return entry.odoo2_id
+
+    # проєкт теж синкаємо; мапінги — з кешу
+    project_id_in_1 = m2o_id(task1["project_id"])
+    project_id_in_2, stage_id_in_2, user_id_in_2 = await asyncio.gather(
+        sync_project_from_1_to_2(project_id_in_1) if project_id_in_1 else _noop(None),
+        odoo_mappings.map_stage(m2o_name(task1["stage_id"]), "2"),
+        odoo_mappings.map_user_1_to_2(m2o_id(task1["user_id"])),
+    )
+
+    vals_2 = task_vals_in_2(task1, user_id_in_2, project_id_in_2, stage_id_in_2)
+
+    task_id_in_2, new_link = await _upsert_in_2("project.task", task_id_in_1, vals_2, entry)
+
+    if new_link:
+        await _write_backlink("project.task", task1, task_id_in_2)
+
+    await id_map.save(
+        "project.task",
+        [
+            {
+                "odoo1_id": task_id_in_1,
+                "odoo2_id": task_id_in_2,
+                "synced_hash": id_map.vals_hash(vals_2),
+                "odoo1_write_date": id_map.parse_write_date(task1["write_date"]),
+                "odoo1_vals": snapshot_1,
+                "odoo2_vals": {**((entry.odoo2_vals if entry else None) or {}), **vals_2},
+            }
+        ],
+    )
     return task_id_in_2
 
 
@@ -259,51 +272,72 @@ def sync_task_from_1_to_2(task_id_in_1: int) -> int:
 # ==========
 
 
-def sync_task_from_2_to_1(task_id_in_2: int) -> int:
+async def sync_task_from_2_to_1(task_id_in_2: int) -> int:
     """
-    Коли таск змінюється в Odoo 2 — оновлюємо відповідний таск у Odoo 1.
+    Коли таск змінюється в Odoo 2 — оновлюємо відповідний таск у Odoo 1
+    (лише змінені поля). Вебхук на наш власний запис 1 → 2 (ехо) нічого не робить.
     """
-    env1 = odoo1_client.env
-    env2 = odoo2_client.env
-
-    Task1 = env1["project.task"]
-    Task2 = env2["project.task"]
-
-    task2 = Task2.browse(task_id_in_2)
-    if not task2.exists():
+    mapped = await id_map.get_by_odoo2("project.task", [task_id_in_2])
+    entry = mapped.get(task_id_in_2)
+    has_origin = entry is None and await odoo2.has_field("project.task", "x_odoo1_task_id")
+    fields = TASK_FIELDS_2 + (["x_odoo1_task_id"] if has_origin else [])
+    tasks = await odoo2.search_read("project.task", [["id", "=", task_id_in_2]], fields)
+    if not tasks:
         raise HTTPException(status_code=404, detail="task not found in Odoo 2")
+    task2 = tasks[0]
+
+    snapshot_2 = changes.snapshot(task2, TASK_SYNC_FIELDS_2)
+    if entry is not None and changes.unchanged(snapshot_2, entry.odoo2_vals):
+        # синкнуті поля такі, як ми їх записали чи бачили востаннє — ехо, далі не йдемо
+        change_stats.echoes_suppressed += 1
+        return entry.odoo1_id
 
-    origin_id = getattr(task2, "x_odoo1_task_id", False)
+    origin_id = entry.odoo1_id if entry is not None else task2.get("x_odoo1_task_id") or False
     if not origin_id:
         raise HTTPException(
             status_code=400,
             detail="task in Odoo 2 has no x_odoo1_task_id, cannot sync back",
         )
 
-    task1 = Task1.browse(origin_id)
-    if not task1.exists():
+    origins, stage_id_in_1, user_id_in_1 = await asyncio.gather(
+        odoo1.search_read("project.task", [["id", "=", origin_id]], TASK_SYNC_FIELDS_2),
+        odoo_mappings.map_stage(m2o_name(task2["stage_id"]), "1"),
+        # мап юзера назад
+        odoo_mappings.map_user_2_to_1(m2o_id(task2["user_id"])),
+    )
+    if not origins:
         raise HTTPException(
             status_code=404,
             detail="original task not found in Odoo 1",
         )
 
-    stage_id_in_1 = None
-    if task2.stage_id:
-        stage_id_in_1 = _map_task_stage_by_name(task2.stage_id, env1)
-
-    # мап юзера назад
-    user_id_in_1 = _map_user_2_to_1(task2.user_id, env1)
-
     vals_1 = {
-        "name": task2.name,
+        "name": task2["name"],
         "user_id": user_id_in_1,
-        "date_deadline": task2.date_deadline or False,
-        "kanban_state": task2.kanban_state or "normal",
+        "date_deadline": task2["date_deadline"] or False,
+        "kanban_state": task2["kanban_state"] or "normal",
     }
     if stage_id_in_1:
         vals_1["stage_id"] = stage_id_in_1
 
-    task1.write(vals_1)
+    changed = changes.diff(vals_1, changes.snapshot(origins[0], vals_1))
+    change_stats.wrote(vals_1, changed)
+    if changed:
+        await odoo1.write("project.task", [origin_id], changed)
+
+    current_1 = {**changes.snapshot(origins[0], TASK_SYNC_FIELDS_2), **vals_1}
+    await id_map.save(
+        "project.task",
+        [
+            {
+                "odoo1_id": origin_id,
+                "odoo2_id": task_id_in_2,
+                "odoo2_write_date": id_map.parse_write_date(task2["write_date"]),
+                "odoo1_vals": {**((entry.odoo1_vals if entry else None) or {}), **current_1},
+                "odoo2_vals": {**((entry.odoo2_vals if entry else None) or {}), **snapshot_2},
+            }
+        ],
+    )
     return origin_id
 
 
@@ -312,28 +346,52 @@ def sync_task_from_2_to_1(task_id_in_2: int) -> int:
 # ==========
 
 
+async def _job_sync_project(project_id_in_1: Optional[int], payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    project_id_in_2 = await sync_project_from_1_to_2(project_id_in_1)
+    return SyncProjectFrom1To2Response(project_id_in_2=project_id_in_2).model_dump()
+
+
+async def _job_sync_task(task_id_in_1: Optional[int], payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    task_id_in_2 = await sync_task_from_1_to_2(task_id_in_1)
+    return SyncTaskFrom1To2Response(task_id_in_2=task_id_in_2).model_dump()
+
+
+async def _job_task_changed_in_2(task_id_in_2: Optional[int], payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    task_id_in_1 = await sync_task_from_2_to_1(task_id_in_2)
+    return TaskChangedIn2Response(task_id_in_1=task_id_in_1).model_dump()
+
+
+jobs.register("project_1_to_2", _job_sync_project)
+jobs.register("task_1_to_2", _job_sync_task)
+jobs.register("task_2_to_1", _job_task_changed_in_2)
+
+
+# Ендпоінти лише ставлять синк у чергу (app/odoo_jobs.py) і одразу віддають 202;
+# результат — GET /api/v1/odoo/projects/jobs/{job_id}
+
+
 @router.post(
     "/sync-project-from-1-to-2",
-    response_model=SyncProjectFrom1To2Response,
+    response_model=JobAccepted,
+    status_code=202,
 )
-def api_sync_project_from_1_to_2(payload: SyncProjectFrom1To2Request):
-    project_id_in_2 = sync_project_from_1_to_2(payload.project_id_in_1)
-    return SyncProjectFrom1To2Response(project_id_in_2=project_id_in_2)
+async def api_sync_project_from_1_to_2(payload: SyncProjectFrom1To2Request):
+    return await jobs.enqueue("project_1_to_2", payload.project_id_in_1)
 
 
 @router.post(
     "/sync-task-from-1-to-2",
-    response_model=SyncTaskFrom1To2Response,
+    response_model=JobAccepted,
+    status_code=202,
 )
-def api_sync_task_from_1_to_2(payload: SyncTaskFrom1To2Request):
-    task_id_in_2 = sync_task_from_1_to_2(payload.task_id_in_1)
-    return SyncTaskFrom1To2Response(task_id_in_2=task_id_in_2)
+async def api_sync_task_from_1_to_2(payload: SyncTaskFrom1To2Request):
+    return await jobs.enqueue("task_1_to_2", payload.task_id_in_1)
 
 
 @router.post(
     "/task-changed-in-2",
-    response_model=TaskChangedIn2Response,
+    response_model=JobAccepted,
+    status_code=202,
 )
-def api_task_changed_in_2(payload: TaskChangedIn2Request):
-    task_id_in_1 = sync_task_from_2_to_1(payload.task_id_in_2)
-    return TaskChangedIn2Response(task_id_in_1=task_id_in_1)
+async def api_task_changed_in_2(payload: TaskChangedIn2Request):
+    return await jobs.enqueue("task_2_to_1", payload.task_id_in_2)
@@ -0,0 +1,397 @@
+# app/odoo_reconcile.py
+"""
+Звірка Odoo 1 з дзеркалом в Odoo 2 (project.project, project.task).
+
+Обидві сторони читаються сторінками по ODOO_RECONCILE_PAGE_SIZE через search_read
+лише з полями, які мапить гейтвей: Odoo 1 — по id, Odoo 2 — по x_odoo1_*_id.
+Обидва потоки відсортовані за id в Odoo 1, тож порівнюємо їх злиттям (як
+merge join), тримаючи в пам'яті лише по сторінці з кожного боку. Для запису
+Odoo 1 будуються vals, які записав би синк (ті ж мапінги користувачів, стадій,
+проєктів), і їхній хеш порівнюється з хешем тих самих полів запису в Odoo 2.
+
+Звіт (лічильники + до ODOO_RECONCILE_REPORT_LIMIT прикладів на категорію):
+  - missing   — є в Odoo 1, немає в Odoo 2;
+  - orphaned  — в Odoo 2 є x_odoo1_*_id, але запису в Odoo 1 немає;
+  - duplicate — кілька записів Odoo 2 з одним x_odoo1_*_id;
+  - divergent — пара є, але значення полів різняться.
+Режим repair пакетами по ODOO_BATCH_CHUNK_SIZE проганяє missing і divergent
+через пакетний синк 1 → 2 (Odoo 1 — джерело правди); orphaned і duplicate
+лише звітуються, нічого не видаляємо.
+
+Хід і звіт пишуться в odoo_reconcile_runs після кожної сторінки. Одночасно
+працює лише одна звірка (advisory lock). Запуск:
+    POST /api/v1/odoo/projects/reconcile?repair=true
+    python -m app.odoo_reconcile [--repair] [project.project project.task]
+"""
+from __future__ import annotations
+
+import asyncio
+import sys
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Set, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import text, update
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, engine
+from app.models.odoo_reconcile_run import OdooReconcileRun
+
+from . import odoo_changes as changes
+from . import odoo_id_map as id_map
+from .odoo_async_client import AsyncOdooClient, m2o_id, m2o_name, odoo1, odoo2
+from .odoo_batch_sync import BatchItemResult, sync_projects_from_1_to_2, sync_tasks_from_1_to_2
+from .odoo_mappings import odoo_mappings
+from .odoo_projects_gateway import PROJECT_SYNC_FIELDS, TASK_SYNC_FIELDS_1, project_vals_in_2, task_vals_in_2
+
+RECONCILE_LOCK_KEY = 7_210_004
+MODELS = ["project.project", "project.task"]
+
+
+# ==========
+# Очікувані значення в Odoo 2
+# ==========
+
+
+async def _map_users(records: List[Dict[str, Any]]) -> Dict[Any, Any]:
+    user_ids = list(dict.fromkeys(m2o_id(r["user_id"]) for r in records))
+    mapped = await asyncio.gather(*(odoo_mappings.map_user_1_to_2(uid) for uid in user_ids))
+    return dict(zip(user_ids, mapped))
+
+
+async def _expected_projects(records: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    users = await _map_users(records)
+    return {r["id"]: project_vals_in_2(r, users[m2o_id(r["user_id"])]) for r in records}
+
+
+async def _expected_tasks(records: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    project_ids = list(dict.fromkeys(m2o_id(r["project_id"]) for r in records if r["project_id"]))
+    link = id_map.LINK_FIELDS["project.project"]
+    users, projects = await asyncio.gather(
+        _map_users(records),
+        odoo2.search_read("project.project", [[link, "in", project_ids]], [link], order="id") if project_ids else [],
+    )
+    project_in_2: Dict[int, int] = {}
+    for p in projects:
+        project_in_2.setdefault(p[link], p["id"])
+    expected = {}
+    for r in records:
+        stage_id_in_2 = await odoo_mappings.map_stage(m2o_name(r["stage_id"]), "2")
+        project_id_in_2 = project_in_2.get(m2o_id(r["project_id"]), False)
+        expected[r["id"]] = task_vals_in_2(r, users[m2o_id(r["user_id"])], project_id_in_2, stage_id_in_2)
+    return expected
+
+
+@dataclass
+class ModelSpec:
+    model: str
+    source_fields: List[str]
+    expected: Callable[[List[Dict[str, Any]]], Awaitable[Dict[int, Dict[str, Any]]]]
+    repair: Callable[[Sequence[int]], Awaitable[Dict[int, BatchItemResult]]]
+
+    @property
+    def link(self) -> str:
+        return id_map.LINK_FIELDS[self.model]
+
+    @property
+    def target_fields(self) -> List[str]:
+        # ті самі назви полів в Odoo 2 + посилання на Odoo 1
+        return self.source_fields + [self.link]
+
+
+SPECS = {
+    "project.project": ModelSpec("project.project", PROJECT_SYNC_FIELDS, _expected_projects, sync_projects_from_1_to_2),
+    "project.task": ModelSpec("project.task", TASK_SYNC_FIELDS_1, _expected_tasks, sync_tasks_from_1_to_2),
+}
+
+
+# ==========
+# Потоки сторінок
+# ==========
+
+
+async def _pages(client: AsyncOdooClient, model: str, fields: List[str], key: str) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Сторінки записів з key > 0, keyset по (key, id)."""
+    page_size = settings.ODOO_RECONCILE_PAGE_SIZE
+    domain: List[Any] = [[key, ">", 0]]
+    order = "id" if key == "id" else f"{key}, id"
+    while True:
+        page = await client.search_read(model, domain, fields, limit=page_size, order=order)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_key, last_id = page[-1][key], page[-1]["id"]
+        if key == "id":
+            domain = [["id", ">", last_id]]
+        else:
+            domain = ["|", [key, ">", last_key], "&", [key, "=", last_key], ["id", ">", last_id]]
+
+
+@dataclass
+class Progress:
+    model: str
+    source_seen: int = 0
+    target_seen: int = 0
+    matched: int = 0
+    missing: int = 0
+    orphaned: int = 0
+    duplicate: int = 0
+    divergent: int = 0
+    repaired: int = 0
+    repair_failed: int = 0
+    samples: Dict[str, List[Any]] = field(
+        default_factory=lambda: {"missing": [], "orphaned": [], "duplicate": [], "divergent": []}
+    )
+
+    def found(self, category: str, sample: Any) -> None:
+        setattr(self, category, getattr(self, category) + 1)
+        if len(self.samples[category]) < settings.ODOO_RECONCILE_REPORT_LIMIT:
+            self.samples[category].append(sample)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+# ==========
+# Звірка моделі
+# ==========
+
+
+class _Repairer:
+    """Буфер id в Odoo 1 для ремонту пакетами."""
+
+    def __init__(self, spec: ModelSpec, progress: Progress, enabled: bool) -> None:
+        self.spec = spec
+        self.progress = progress
+        self.enabled = enabled
+        self.missing: List[int] = []
+        self.divergent: List[int] = []
+
+    async def add(self, id_in_1: int, divergent: bool) -> None:
+        if not self.enabled:
+            return
+        (self.divergent if divergent else self.missing).append(id_in_1)
+        if len(self.missing) + len(self.divergent) >= settings.ODOO_BATCH_CHUNK_SIZE:
+            await self.flush()
+
+    async def flush(self) -> None:
+        ids = self.missing + self.divergent
+        if not ids:
+            return
+        try:
+            # знімки в odoo_id_map кажуть "все синкнуто" — скидаємо, щоб синк порівняв з Odoo 2
+            await id_map.reset_snapshots(self.spec.model, self.divergent)
+            results = await self.spec.repair(ids)
+            for r in results.values():
+                if r.status == "failed":
+                    self.progress.repair_failed += 1
+                else:
+                    self.progress.repaired += 1
+        except Exception as e:
+            print(f"[odoo-reconcile] {self.spec.model}: repair of {len(ids)} records failed: {e}")
+            self.progress.repair_failed += len(ids)
+        self.missing, self.divergent = [], []
+
+
+async def _source(spec: ModelSpec, progress: Progress) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    async for page in _pages(odoo1, spec.model, spec.source_fields, "id"):
+        expected = await spec.expected(page)
+        progress.source_seen += len(page)
+        for rec in page:
+            yield rec["id"], expected[rec["id"]]
+
+
+async def _target(spec: ModelSpec, progress: Progress) -> AsyncIterator[Dict[str, Any]]:
+    async for page in _pages(odoo2, spec.model, spec.target_fields, spec.link):
+        progress.target_seen += len(page)
+        for rec in page:
+            yield rec
+
+
+async def _next(it: AsyncIterator[Any]) -> Any:
+    try:
+        return await it.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def reconcile_model(
+    spec: ModelSpec, repair: bool, on_progress: Callable[[Progress], Awaitable[None]]
+) -> Progress:
+    progress = Progress(spec.model)
+    repairer = _Repairer(spec, progress, repair)
+    source, target = _source(spec, progress), _target(spec, progress)
+    src, tgt = await _next(source), await _next(target)
+    last_reported = 0
+
+    while src is not None or tgt is not None:
+        if tgt is None or (src is not None and src[0] < tgt[spec.link]):
+            progress.found("missing", src[0])
+            await repairer.add(src[0], divergent=False)
+            src = await _next(source)
+        elif src is None or tgt[spec.link] < src[0]:
+            progress.found("orphaned", {"id_in_2": tgt["id"], "id_in_1": tgt[spec.link]})
+            tgt = await _next(target)
+        else:
+            id_in_1, expected = src
+            values = {f: v for f, v in expected.items() if f != spec.link}
+            actual = changes.snapshot(tgt, values)
+            if id_map.vals_hash(values) == id_map.vals_hash(actual):
+                progress.matched += 1
+            else:
+                diverged = sorted(f for f in values if values[f] != actual[f])
+                progress.found("divergent", {"id_in_1": id_in_1, "id_in_2": tgt["id"], "fields": diverged})
+                await repairer.add(id_in_1, divergent=True)
+            src, tgt = await _next(source), await _next(target)
+            while tgt is not None and tgt[spec.link] == id_in_1:
+                progress.found("duplicate", {"id_in_2": tgt["id"], "id_in_1": id_in_1})
+                tgt = await _next(target)
+
+        # хід — раз на сторінку джерела
+        if progress.source_seen - last_reported >= settings.ODOO_RECONCILE_PAGE_SIZE:
+            last_reported = progress.source_seen
+            await on_progress(progress)
+
+    await repairer.flush()
+    await on_progress(progress)
+    return progress
+
+
+# ==========
+# Запуски
+# ==========
+
+
+async def _save(run_id: int, **values: Any) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(OdooReconcileRun).where(OdooReconcileRun.id == run_id).values(updated_at=func.now(), **values)
+        )
+        await db.commit()
+
+
+async def _create_run(models: List[str], repair: bool) -> int:
+    async with AsyncSessionLocal() as db:
+        run = OdooReconcileRun(models=models, repair=repair, status="running", report={})
+        db.add(run)
+        await db.commit()
+        return run.id
+
+
+async def execute_run(run_id: int, models: List[str], repair: bool) -> Dict[str, Any]:
+    report: Dict[str, Any] = {}
+
+    async def on_progress(progress: Progress) -> None:
+        report[progress.model] = progress.as_dict()
+        print(
+            f"[odoo-reconcile] {progress.model}: source {progress.source_seen} target {progress.target_seen} "
+            f"missing {progress.missing} orphaned {progress.orphaned} duplicate {progress.duplicate} "
+            f"divergent {progress.divergent} repaired {progress.repaired}"
+        )
+        await _save(run_id, report=report)
+
+    async with engine.connect() as conn:
+        locked = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": RECONCILE_LOCK_KEY})
+        await conn.commit()
+        if not locked:
+            await _save(run_id, status="skipped", error="another reconciliation is running", finished_at=func.now())
+            return report
+        try:
+            for model in models:
+                await reconcile_model(SPECS[model], repair, on_progress)
+            await _save(run_id, status="done", report=report, finished_at=func.now())
+        except asyncio.CancelledError:
+            await asyncio.shield(_save(run_id, status="cancelled", report=report, finished_at=func.now()))
+            raise
+        except Exception as e:
+            print(f"[odoo-reconcile] run {run_id} failed: {e}")
+            await _save(run_id, status="failed", error=f"{type(e).__name__}: {e}", report=report, finished_at=func.now())
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RECONCILE_LOCK_KEY})
+            await conn.commit()
+    return report
+
+
+_runs: Set[asyncio.Task] = set()
+
+
+async def start_run(models: List[str], repair: bool) -> int:
+    """Запускає звірку фоном у цьому процесі, повертає id запуску."""
+    run_id = await _create_run(models, repair)
+    task = asyncio.create_task(execute_run(run_id, models, repair), name=f"odoo-reconcile-{run_id}")
+    _runs.add(task)
+    task.add_done_callback(_runs.discard)
+    return run_id
+
+
+async def stop_runs() -> None:
+    for task in list(_runs):
+        task.cancel()
+    await asyncio.gather(*_runs, return_exceptions=True)
+
+
+# ==========
+# FastAPI endpoints
+# ==========
+
+router = APIRouter(
+    prefix="/api/v1/odoo/projects/reconcile",
+    tags=["odoo-projects"],
+)
+
+
+def _run_dict(run: OdooReconcileRun) -> Dict[str, Any]:
+    return {
+        "id": run.id,
+        "models": run.models,
+        "repair": run.repair,
+        "status": run.status,
+        "report": run.report,
+        "error": run.error,
+        "started_at": run.started_at,
+        "updated_at": run.updated_at,
+        "finished_at": run.finished_at,
+    }
+
+
+@router.post("", status_code=202)
+async def api_reconcile_start(
+    repair: bool = False,
+    models: List[str] = Query(default=MODELS),
+):
+    unknown = [m for m in models if m not in SPECS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown models: {unknown}")
+    run_id = await start_run(models, repair)
+    return {"run_id": run_id, "status": "running"}
+
+
+@router.get("/{run_id}")
+async def api_reconcile_status(run_id: int):
+    """Хід (оновлюється щосторінки) і звіт запуску."""
+    async with AsyncSessionLocal() as db:
+        run = await db.get(OdooReconcileRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="reconcile run not found")
+    return _run_dict(run)
+
+
+async def _main(argv: List[str]) -> None:
+    repair = "--repair" in argv
+    models = [a for a in argv if not a.startswith("--")] or MODELS
+    try:
+        run_id = await _create_run(models, repair)
+        await execute_run(run_id, models, repair)
+        async with AsyncSessionLocal() as db:
+            run = await db.get(OdooReconcileRun, run_id)
+        print(f"[odoo-reconcile] run {run_id}: {run.status}")
+    finally:
+        await odoo1.close()
+        await odoo2.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,226 @@
+"""
+Cap on in-flight upstream requests of the proxy.
+
+Every request that goes upstream holds a slot from before the first attempt
+until its response body is relayed (or it failed). With PROXY_MAX_IN_FLIGHT
+slots taken, requests wait in a per-worker queue of at most
+PROXY_ADMISSION_QUEUE_SIZE for up to PROXY_ADMISSION_QUEUE_TIMEOUT_SECONDS;
+a full queue or a timeout raises Overloaded (503 + Retry-After). Cache hits and
+coalesced followers never take a slot.
+
+Backends: in-process ("memory", the cap is per worker) or Redis ("redis", one
+cap for all workers: slots are members of a sorted set scored by the time they
+were taken, so slots of a worker that died expire after
+PROXY_ADMISSION_SLOT_LEASE_SECONDS). Waiters are woken by releases in their
+own worker and otherwise poll Redis. If Redis is unreachable requests are
+let through.
+"""
+import asyncio
+import itertools
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+# KEYS[1]: slot set; ARGV: cap, lease seconds, slot id. Returns 1 if the slot was taken.
+_ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])))
+return 1
+"""
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionBackend:
+    # how often waiters re-check without being woken (a slot freed by another
+    # worker, or a wake-up that came while they were not waiting yet)
+    poll_interval = 0.05
+
+    async def try_acquire(self) -> Optional[str]:
+        """A slot id, or None if all slots are taken."""
+        raise NotImplementedError
+
+    async def release(self, slot_id: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(AdmissionBackend):
+    def __init__(self, cap: int) -> None:
+        self.cap = cap
+        self.in_flight = 0
+        self._ids = itertools.count(1)
+
+    async def try_acquire(self) -> Optional[str]:
+        if self.in_flight >= self.cap:
+            return None
+        self.in_flight += 1
+        return str(next(self._ids))
+
+    async def release(self, slot_id: str) -> None:
+        self.in_flight -= 1
+
+
+class RedisBackend(AdmissionBackend):
+    poll_interval = 0.02
+
+    def __init__(self, url: str, cap: int, key: str = "proxy-admission:slots") -> None:
+        import redis.asyncio as redis  # only needed when this backend is configured
+
+        self.cap = cap
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_ACQUIRE_SCRIPT)
+        self._key = key
+
+    async def try_acquire(self) -> Optional[str]:
+        slot_id = uuid.uuid4().hex
+        taken = await self._script(
+            keys=[self._key], args=[self.cap, settings.PROXY_ADMISSION_SLOT_LEASE_SECONDS, slot_id]
+        )
+        return slot_id if taken else None
+
+    async def release(self, slot_id: str) -> None:
+        await self._redis.zrem(self._key, slot_id)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+@dataclass
+class Slot:
+    controller: "AdmissionController"
+    slot_id: Optional[str] = None
+    released: bool = False
+
+    async def release(self) -> None:
+        """Safe to call more than once."""
+        if self.released:
+            return
+        self.released = True
+        await self.controller._release(self.slot_id)
+
+
+class AdmissionController:
+    def __init__(self) -> None:
+        self.backend: Optional[AdmissionBackend] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+        self.backend_errors = 0
+        self._freed: Optional[asyncio.Condition] = None
+
+    async def start(self) -> None:
+        if settings.PROXY_MAX_IN_FLIGHT <= 0 or self.backend is not None:
+            return
+        if settings.PROXY_ADMISSION_BACKEND == "redis":
+            self.backend = RedisBackend(settings.PROXY_ADMISSION_REDIS_URL, settings.PROXY_MAX_IN_FLIGHT)
+        else:
+            self.backend = MemoryBackend(settings.PROXY_MAX_IN_FLIGHT)
+        self._freed = asyncio.Condition()
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+            self.backend = None
+
+    async def _try_acquire(self) -> Optional[Slot]:
+        try:
+            slot_id = await self.backend.try_acquire()
+        except Exception as e:
+            self.backend_errors += 1
+            print(f"[admission] backend failed, letting the request through: {e}")
+            return Slot(self, slot_id=None)
+        if slot_id is None:
+            return None
+        self.in_flight += 1
+        metrics.ADMISSION_IN_FLIGHT.inc()
+        return Slot(self, slot_id=slot_id)
+
+    async def acquire(self) -> Slot:
+        """A slot to hold while the request is upstream; raises Overloaded."""
+        if self.backend is None:
+            return Slot(self, released=True)
+        # nobody queued in this worker: try right away, else line up behind them
+        if not self.waiting:
+            slot = await self._try_acquire()
+            if slot is not None:
+                self.admitted += 1
+                return slot
+        if self.waiting >= settings.PROXY_ADMISSION_QUEUE_SIZE:
+            self._reject("queue_full")
+
+        self.waiting += 1
+        self.queued += 1
+        started = time.monotonic()
+        deadline = started + settings.PROXY_ADMISSION_QUEUE_TIMEOUT_SECONDS
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject("queue_timeout")
+                timeout = min(remaining, self.backend.poll_interval)
+                async with self._freed:
+                    try:
+                        await asyncio.wait_for(self._freed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                slot = await self._try_acquire()
+                if slot is not None:
+                    self.admitted += 1
+                    metrics.ADMISSION_WAIT.observe(time.monotonic() - started)
+                    return slot
+        finally:
+            self.waiting -= 1
+
+    def _reject(self, reason: str) -> None:
+        self.rejected[reason] += 1
+        metrics.ADMISSION_REJECTED.labels(reason).inc()
+        raise Overloaded(reason)
+
+    async def _release(self, slot_id: Optional[str]) -> None:
+        if slot_id is None or self.backend is None:
+            return
+        self.in_flight -= 1
+        metrics.ADMISSION_IN_FLIGHT.dec()
+        try:
+            await self.backend.release(slot_id)
+        except Exception as e:
+            # the lease frees it eventually
+            self.backend_errors += 1
+            print(f"[admission] release failed: {e}")
+        async with self._freed:
+            self._freed.notify(1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.backend is not None,
+            "backend": settings.PROXY_ADMISSION_BACKEND if self.backend is not None else None,
+            "max_in_flight": settings.PROXY_MAX_IN_FLIGHT,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "backend_errors": self.backend_errors,
+        }
+
+
+admission = AdmissionController()
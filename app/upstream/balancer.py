@@ -0,0 +1,242 @@
+"""
+Upstream pools and load balancing.
+
+Every proxied request is routed to the first pool in UPSTREAM_POOLS whose
+``path_prefix`` matches its upstream path, otherwise to UPSTREAM_BASE_URL.
+Each attempt (a retry, a hedge) picks an instance of that pool, preferring
+ones the request has not tried yet:
+
+- round_robin:       in turn;
+- least_outstanding: fewest calls in flight (until their body is relayed);
+- ewma:              lowest latency EWMA (time to headers, decaying over
+                     UPSTREAM_EWMA_DECAY_SECONDS) times (calls in flight + 1);
+                     a failed connection counts as a call that took the whole
+                     attempt timeout, instances without samples yet as the
+                     pool's mean.
+
+Instances leave the rotation
+- passively (pools of more than one instance), after
+  UPSTREAM_EJECT_CONSECUTIVE_FAILURES failed calls in a row (connection
+  errors, UPSTREAM_EJECT_ON_STATUSES), for UPSTREAM_EJECT_SECONDS;
+- actively, if UPSTREAM_HEALTH_CHECK_PATH is set, after
+  UPSTREAM_UNHEALTHY_THRESHOLD failed checks in a row, until
+  UPSTREAM_HEALTHY_THRESHOLD checks pass again.
+If no instance of a pool is left, all of them are used (better than failing
+every request when the checks are wrong).
+
+Every pool has its own circuit breaker (app/upstream/breaker.py), so a dead
+pool fails fast without taking the routes of the other pools with it.
+
+State is per worker process.
+"""
+import asyncio
+import itertools
+import math
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core import metrics
+from app.core.config import UpstreamPool, settings
+from app.upstream.breaker import CircuitBreaker
+from app.upstream.client import upstream_client
+
+
+class Instance:
+    def __init__(self, url: str, ejectable: bool = True) -> None:
+        self.url = url.rstrip("/")
+        # the only instance of its pool gets the traffic anyway
+        self.ejectable = ejectable
+        self.outstanding = 0
+        self.ewma_seconds: Optional[float] = None
+        self._ewma_at = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.healthy = True  # by the active checks
+        self._check_streak = 0  # > 0 passed in a row, < 0 failed in a row
+        self.requests_total = 0
+        self.failures_total = 0
+        self.ejections_total = 0
+
+    def url_for(self, path: str) -> str:
+        path = path.lstrip("/")
+        return f"{self.url}/{path}" if path else self.url
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def score(self, default_ewma: float) -> float:
+        ewma = self.ewma_seconds if self.ewma_seconds is not None else default_ewma
+        return ewma * (self.outstanding + 1)
+
+    def begin(self) -> None:
+        self.outstanding += 1
+        self.requests_total += 1
+
+    def end(self) -> None:
+        self.outstanding -= 1
+
+    def record(self, status: Optional[int], seconds: float) -> None:
+        """Outcome of one call: the response status, None for a connection error.
+
+        For a connection error ``seconds`` should be the penalty to score it with
+        (the attempt timeout), not how fast it failed.
+        """
+        metrics.UPSTREAM_INSTANCE_REQUESTS.labels(self.url, metrics.status_outcome(status)).inc()
+        now = time.monotonic()
+        if self.ewma_seconds is None:
+            self.ewma_seconds = seconds
+        else:
+            weight = math.exp(-(now - self._ewma_at) / max(settings.UPSTREAM_EWMA_DECAY_SECONDS, 0.001))
+            self.ewma_seconds = self.ewma_seconds * weight + seconds * (1.0 - weight)
+        self._ewma_at = now
+        if status is not None and status not in settings.UPSTREAM_EJECT_ON_STATUSES:
+            self.consecutive_failures = 0
+            return
+        self.failures_total += 1
+        self.consecutive_failures += 1
+        limit = settings.UPSTREAM_EJECT_CONSECUTIVE_FAILURES
+        if self.ejectable and limit > 0 and self.consecutive_failures >= limit:
+            self.consecutive_failures = 0
+            self.ejected_until = time.monotonic() + settings.UPSTREAM_EJECT_SECONDS
+            self.ejections_total += 1
+            metrics.UPSTREAM_EJECTIONS.labels(self.url, "passive").inc()
+            print(f"[balancer] {self.url} ejected for {settings.UPSTREAM_EJECT_SECONDS}s after {limit} failed calls")
+
+    def record_check(self, ok: bool) -> None:
+        if ok:
+            self._check_streak = max(self._check_streak, 0) + 1
+            if not self.healthy and self._check_streak >= settings.UPSTREAM_HEALTHY_THRESHOLD:
+                self.healthy = True
+                print(f"[balancer] {self.url} is healthy again")
+        else:
+            self._check_streak = min(self._check_streak, 0) - 1
+            if self.healthy and -self._check_streak >= settings.UPSTREAM_UNHEALTHY_THRESHOLD:
+                self.healthy = False
+                self.ejections_total += 1
+                metrics.UPSTREAM_EJECTIONS.labels(self.url, "active").inc()
+                print(f"[balancer] {self.url} failed {-self._check_streak} health checks, taken out")
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "available": self.available(now),
+            "healthy": self.healthy,
+            "ejected_for_seconds": round(max(0.0, self.ejected_until - now), 1),
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma_seconds * 1000.0, 2) if self.ewma_seconds is not None else None,
+            "requests_total": self.requests_total,
+            "failures_total": self.failures_total,
+            "ejections_total": self.ejections_total,
+        }
+
+
+class Pool:
+    def __init__(self, config: UpstreamPool) -> None:
+        self.path_prefix = config.path_prefix
+        self.strategy = config.strategy
+        self.instances = [Instance(url, ejectable=len(config.urls) > 1) for url in config.urls]
+        self.breaker = CircuitBreaker(config.path_prefix or "default")
+        self._turn = itertools.count()
+        self.panic_total = 0
+
+    def pick(self, exclude: Iterable[Instance] = ()) -> Instance:
+        now = time.monotonic()
+        candidates = [i for i in self.instances if i.available(now)]
+        if not candidates:
+            self.panic_total += 1
+            candidates = self.instances
+        untried = [i for i in candidates if i not in exclude]
+        candidates = untried or candidates
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == "round_robin":
+            return candidates[next(self._turn) % len(candidates)]
+        if self.strategy == "least_outstanding":
+            fewest = min(i.outstanding for i in candidates)
+            return random.choice([i for i in candidates if i.outstanding == fewest])
+        samples = [i.ewma_seconds for i in candidates if i.ewma_seconds is not None]
+        default_ewma = sum(samples) / len(samples) if samples else 0.0
+        best = min(i.score(default_ewma) for i in candidates)
+        return random.choice([i for i in candidates if i.score(default_ewma) == best])
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "path_prefix": self.path_prefix,
+            "strategy": self.strategy,
+            "panic_total": self.panic_total,
+            "breaker": self.breaker.state,
+            "instances": [i.stats(now) for i in self.instances],
+        }
+
+
+class UpstreamBalancer:
+    def __init__(self) -> None:
+        self.pools: List[Pool] = []
+        self._default: Optional[Pool] = None
+        self._checks: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._default is not None:
+            return
+        self.pools = [Pool(config) for config in settings.UPSTREAM_POOLS if config.urls]
+        self._default = Pool(UpstreamPool(urls=[settings.UPSTREAM_BASE_URL]))
+        if settings.UPSTREAM_HEALTH_CHECK_PATH:
+            self._checks = asyncio.create_task(self._check_loop())
+
+    async def close(self) -> None:
+        if self._checks is not None:
+            self._checks.cancel()
+            try:
+                await self._checks
+            except asyncio.CancelledError:
+                pass
+            self._checks = None
+        self.pools = []
+        self._default = None
+
+    def pool_for(self, path: str) -> Pool:
+        if self._default is None:
+            raise RuntimeError("upstream balancer is not started")
+        for pool in self.pools:
+            if path.startswith(pool.path_prefix):
+                return pool
+        return self._default
+
+    def _instances(self) -> List[Instance]:
+        pools = [*self.pools, self._default] if self._default is not None else self.pools
+        return [i for pool in pools for i in pool.instances]
+
+    async def _check(self, instance: Instance) -> None:
+        try:
+            response = await upstream_client.client.get(
+                instance.url_for(settings.UPSTREAM_HEALTH_CHECK_PATH),
+                timeout=settings.UPSTREAM_HEALTH_CHECK_TIMEOUT_SECONDS,
+            )
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        instance.record_check(ok)
+
+    async def _check_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._check(i) for i in self._instances()))
+            await asyncio.sleep(settings.UPSTREAM_HEALTH_CHECK_INTERVAL_SECONDS)
+
+    def breaker_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.PROXY_BREAKER_ENABLED,
+            "pools": [{"path_prefix": pool.path_prefix, **pool.breaker.stats()} for pool in self.pools],
+            "default": self._default.breaker.stats() if self._default is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_checks": self._checks is not None,
+            "pools": [pool.stats() for pool in self.pools],
+            "default": self._default.stats() if self._default is not None else None,
+        }
+
+
+balancer = UpstreamBalancer()
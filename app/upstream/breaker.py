@@ -0,0 +1,145 @@
+"""
+Circuit breaker for an upstream pool (one per pool, see app/upstream/balancer.py).
+
+closed    -> calls go through; outcomes land in a sliding time window. When the
+             window holds PROXY_BREAKER_MIN_CALLS calls and the error rate or the
+             slow-call rate reaches its threshold, the breaker opens.
+open      -> calls are rejected right away until PROXY_BREAKER_COOLDOWN_SECONDS pass.
+half_open -> up to PROXY_BREAKER_HALF_OPEN_CALLS probe calls at a time; once that
+             many succeed the breaker closes, any failure opens it again.
+
+State is per worker process: every worker trips on its own, which is fine since
+they all see the same upstream. A pool that fails only fails its own routes.
+"""
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str = "upstream") -> None:
+        self.name = name
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        # (monotonic ts, failed, slow)
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self.rejected_total = 0
+        self.opened_total = 0
+
+    def _transition(self, state: str, reason: str) -> None:
+        if state == self.state:
+            return
+        self.transitions.append(
+            {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "from": self.state,
+                "to": state,
+                "reason": reason,
+            }
+        )
+        print(f"[breaker] {self.name}: {self.state} -> {state}: {reason}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.opened_total += 1
+        self._window.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets probes through again."""
+        if self.state != OPEN or self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + settings.PROXY_BREAKER_COOLDOWN_SECONDS - time.monotonic())
+
+    def allow(self) -> bool:
+        """Ask before every upstream attempt; an allowed call must be followed by
+        record() or release()."""
+        if not settings.PROXY_BREAKER_ENABLED:
+            return True
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                self.rejected_total += 1
+                return False
+            self._transition(HALF_OPEN, "cooldown elapsed")
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= settings.PROXY_BREAKER_HALF_OPEN_CALLS:
+                self.rejected_total += 1
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def release(self) -> None:
+        """An allowed call ended without an outcome (e.g. the client went away)."""
+        if self.state == HALF_OPEN and self._probes_in_flight:
+            self._probes_in_flight -= 1
+
+    def is_failure(self, status: Optional[int]) -> bool:
+        return status is None or status in settings.PROXY_BREAKER_FAILURE_STATUSES
+
+    def record(self, status: Optional[int], duration: float) -> None:
+        """Outcome of an allowed call; ``status`` is None for connection errors."""
+        if not settings.PROXY_BREAKER_ENABLED:
+            return
+        failed = self.is_failure(status)
+        slow = duration >= settings.PROXY_BREAKER_SLOW_CALL_SECONDS
+
+        if self.state == HALF_OPEN:
+            self.release()
+            if failed or slow:
+                self._transition(OPEN, "probe failed" if failed else "probe too slow")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= settings.PROXY_BREAKER_HALF_OPEN_CALLS:
+                self._transition(CLOSED, f"{self._probe_successes} probes succeeded")
+            return
+        if self.state == OPEN:
+            # a call that was allowed before the breaker opened
+            return
+
+        now = time.monotonic()
+        self._window.append((now, failed, slow))
+        self._trim(now)
+        calls = len(self._window)
+        if calls < settings.PROXY_BREAKER_MIN_CALLS:
+            return
+        error_rate = sum(1 for _, f, _ in self._window if f) / calls
+        slow_rate = sum(1 for _, _, s in self._window if s) / calls
+        if error_rate >= settings.PROXY_BREAKER_ERROR_RATE:
+            self._transition(OPEN, f"error rate {error_rate:.0%} over {calls} calls")
+        elif slow_rate >= settings.PROXY_BREAKER_SLOW_RATE:
+            self._transition(OPEN, f"slow-call rate {slow_rate:.0%} over {calls} calls")
+
+    def _trim(self, now: float) -> None:
+        horizon = now - settings.PROXY_BREAKER_WINDOW_SECONDS
+        while self._window and self._window[0][0] < horizon:
+            self._window.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        calls = len(self._window)
+        failures = sum(1 for _, f, _ in self._window if f)
+        slow = sum(1 for _, _, s in self._window if s)
+        transitions: List[Dict[str, Any]] = list(self.transitions)
+        return {
+            "state": self.state,
+            "retry_after_seconds": round(self.retry_after(), 2),
+            "window_calls": calls,
+            "window_error_rate": round(failures / calls, 4) if calls else 0.0,
+            "window_slow_rate": round(slow / calls, 4) if calls else 0.0,
+            "probes_in_flight": self._probes_in_flight,
+            "rejected_total": self.rejected_total,
+            "opened_total": self.opened_total,
+            "transitions": transitions,
+        }
+
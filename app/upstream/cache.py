@@ -0,0 +1,371 @@
+"""
+HTTP response cache for proxied GETs.
+
+Freshness follows upstream ``Cache-Control`` / ``Expires`` (or the route's
+``default_ttl_seconds``). Entries are kept PROXY_CACHE_STALE_TTL_SECONDS past
+expiry, so a stale entry with an ``ETag`` / ``Last-Modified`` can be
+revalidated with a conditional request; a 304 from upstream refreshes it.
+Responses with ``Set-Cookie`` are never stored, nor are answers to requests
+with ``Authorization`` / ``Cookie`` unless marked ``public`` or ``s-maxage``.
+
+Backends: an in-process LRU bounded by bytes ("memory") or Redis ("redis",
+shared by all workers). Anything implementing CacheBackend can be plugged in.
+"""
+import base64
+import json
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import CacheRoute, settings
+
+CACHEABLE_STATUSES = {200, 203, 301, 404, 410}
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    stored_at: float
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+
+class CacheBackend:
+    """Storage interface; ``keep_seconds`` is how long the entry may live (fresh + stale)."""
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: CachedResponse, keep_seconds: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryLRUBackend(CacheBackend):
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[CachedResponse, float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        entry, keep_until = item
+        if time.time() >= keep_until:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse, keep_seconds: float) -> None:
+        if entry.size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (entry, time.time() + keep_seconds)
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.bytes -= item[0].size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class RedisBackend(CacheBackend):
+    def __init__(self, url: str, prefix: str = "proxy-cache:") -> None:
+        import redis.asyncio as redis  # only needed when this backend is configured
+
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self._redis.get(self._prefix + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        data["body"] = base64.b64decode(data["body"])
+        return CachedResponse(**data)
+
+    async def set(self, key: str, entry: CachedResponse, keep_seconds: float) -> None:
+        data = asdict(entry)
+        data["body"] = base64.b64encode(entry.body).decode("ascii")
+        await self._redis.set(self._prefix + key, json.dumps(data), ex=max(1, int(keep_seconds)))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._prefix + key)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def _parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale_hits: int = 0
+    revalidations: int = 0
+    revalidated: int = 0
+    stores: int = 0
+    bytes_served: int = 0
+    bytes_stored: int = 0
+    not_cacheable: int = 0
+
+
+@dataclass
+class ResponseCache:
+    backend: Optional[CacheBackend] = None
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    async def start(self) -> None:
+        if not settings.PROXY_CACHE_ENABLED or self.backend is not None:
+            return
+        if settings.PROXY_CACHE_BACKEND == "redis":
+            self.backend = RedisBackend(settings.PROXY_CACHE_REDIS_URL)
+        else:
+            self.backend = MemoryLRUBackend(settings.PROXY_CACHE_MAX_BYTES)
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+            self.backend = None
+
+    def route_for(self, method: str, path: str) -> Optional[CacheRoute]:
+        """Cache settings for this request, or None if it is not cacheable at all."""
+        if self.backend is None or method != "GET":
+            return None
+        for route in settings.PROXY_CACHE_ROUTES:
+            if path.startswith(route.path_prefix):
+                return route if route.enabled else None
+        return None
+
+    @staticmethod
+    def key(
+        method: str,
+        path: str,
+        query_items: Iterable[Tuple[str, str]],
+        headers: Dict[str, str],
+        route: CacheRoute,
+    ) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(query_items))
+        vary = "|".join(f"{h.lower()}={headers.get(h.lower(), '')}" for h in sorted(route.vary_headers))
+        return f"{method} {path}?{query} {vary}"
+
+    @staticmethod
+    def request_allows_cache(headers: Dict[str, str]) -> bool:
+        directives = _parse_cache_control(headers.get("cache-control"))
+        return "no-store" not in directives and "no-cache" not in directives
+
+    @staticmethod
+    def freshness_seconds(headers: Dict[str, str], route: CacheRoute) -> Optional[float]:
+        """How long a response may be served without revalidation; None = do not store."""
+        directives = _parse_cache_control(headers.get("cache-control"))
+        if "no-store" in directives or "private" in directives:
+            return None
+
+        ttl: Optional[float] = None
+        if "no-cache" in directives:
+            ttl = 0.0
+        else:
+            for name in ("s-maxage", "max-age"):
+                if directives.get(name) is not None:
+                    try:
+                        ttl = float(directives[name])
+                    except ValueError:
+                        ttl = 0.0
+                    break
+        if ttl is None:
+            expires = _http_date(headers.get("expires"))
+            if expires is not None:
+                date = _http_date(headers.get("date")) or time.time()
+                ttl = max(0.0, expires - date)
+        if ttl is None:
+            ttl = route.default_ttl_seconds
+        if route.max_ttl_seconds is not None:
+            ttl = min(ttl, route.max_ttl_seconds)
+        return ttl
+
+    @staticmethod
+    def vary_allows(headers: Dict[str, str], route: CacheRoute) -> bool:
+        """Only cache if every header upstream varies on is part of our key."""
+        vary = headers.get("vary")
+        if not vary:
+            return True
+        selected = {h.lower() for h in route.vary_headers}
+        names = {v.strip().lower() for v in vary.split(",") if v.strip()}
+        return "*" not in names and names <= selected
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            print(f"[cache] get failed: {e}")
+            return None
+
+    @staticmethod
+    def shareable(request_headers: Dict[str, str], headers: Dict[str, str]) -> bool:
+        """Whether a response may go into the shared cache at all.
+
+        Never with ``Set-Cookie``; answers to requests with ``Authorization`` or
+        ``Cookie`` only if upstream marks them ``public`` or ``s-maxage``.
+        """
+        if "set-cookie" in headers:
+            return False
+        if "authorization" in request_headers or "cookie" in request_headers:
+            directives = _parse_cache_control(headers.get("cache-control"))
+            return "public" in directives or "s-maxage" in directives
+        return True
+
+    def build_entry(
+        self,
+        status_code: int,
+        request_headers: Dict[str, str],
+        headers: Dict[str, str],
+        body: bytes,
+        route: CacheRoute,
+    ) -> Optional[CachedResponse]:
+        if status_code not in CACHEABLE_STATUSES or not self.vary_allows(headers, route):
+            return None
+        if not self.shareable(request_headers, headers):
+            return None
+        ttl = self.freshness_seconds(headers, route)
+        if ttl is None:
+            return None
+        now = time.time()
+        entry = CachedResponse(
+            status_code=status_code,
+            headers={k: v for k, v in headers.items() if k.lower() != "content-length"},
+            body=body,
+            stored_at=now,
+            expires_at=now + ttl,
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+        )
+        # nothing to revalidate with and already expired -> useless
+        if ttl <= 0 and not entry.has_validators():
+            return None
+        return entry
+
+    async def store(self, key: str, entry: CachedResponse) -> None:
+        keep = max(0.0, entry.expires_at - time.time()) + settings.PROXY_CACHE_STALE_TTL_SECONDS
+        try:
+            await self.backend.set(key, entry, keep)
+        except Exception as e:
+            print(f"[cache] store failed: {e}")
+            return
+        self.stats.stores += 1
+        self.stats.bytes_stored += len(entry.body)
+
+    async def refresh(
+        self,
+        key: str,
+        entry: CachedResponse,
+        not_modified_headers: Dict[str, str],
+        route: CacheRoute,
+    ) -> CachedResponse:
+        """Upstream answered 304 to our revalidation: update headers and expiry, keep the body.
+
+        If the new headers forbid storing (no-store, private) the entry is dropped;
+        the refreshed copy is still returned for this one request.
+        """
+        headers = dict(entry.headers)
+        for name in ("cache-control", "expires", "date", "etag", "last-modified", "vary"):
+            if name in not_modified_headers:
+                headers[name] = not_modified_headers[name]
+        ttl = self.freshness_seconds(headers, route)
+        now = time.time()
+        refreshed = CachedResponse(
+            status_code=entry.status_code,
+            headers=headers,
+            body=entry.body,
+            stored_at=now,
+            expires_at=now + (ttl or 0.0),
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+        )
+        if ttl is None:
+            try:
+                await self.backend.delete(key)
+            except Exception as e:
+                print(f"[cache] delete failed: {e}")
+            return refreshed
+        await self.store(key, refreshed)
+        return refreshed
+
+    def stats_dict(self) -> Dict[str, Any]:
+        lookups = self.stats.hits + self.stats.misses
+        return {
+            "enabled": self.backend is not None,
+            "backend": settings.PROXY_CACHE_BACKEND if self.backend is not None else None,
+            **asdict(self.stats),
+            "hit_ratio": self.stats.hits / lookups if lookups else None,
+            **(self.backend.stats() if self.backend is not None else {}),
+        }
+
+
+def conditional_headers(entry: CachedResponse) -> List[Tuple[str, str]]:
+    headers = []
+    if entry.etag:
+        headers.append(("if-none-match", entry.etag))
+    if entry.last_modified:
+        headers.append(("if-modified-since", entry.last_modified))
+    return headers
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,89 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+
+class UpstreamClient:
+    """
+    One pooled httpx.AsyncClient per worker, opened and closed by the app lifespan.
+
+    Besides holding the client it counts in-flight requests, so we can see how
+    often the connection pool is saturated and size the limits accordingly.
+    """
+
+    def __init__(self) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests_total = 0
+        self.saturated_total = 0
+        self.pool_timeouts_total = 0
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            follow_redirects=True,
+            http2=settings.UPSTREAM_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.UPSTREAM_CONNECT_TIMEOUT_SECONDS,
+                read=settings.UPSTREAM_READ_TIMEOUT_SECONDS,
+                write=settings.UPSTREAM_WRITE_TIMEOUT_SECONDS,
+                pool=settings.UPSTREAM_POOL_TIMEOUT_SECONDS,
+            ),
+        )
+
+    async def close(self) -> None:
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        await client.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("upstream client is not started")
+        return self._client
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[httpx.AsyncClient]:
+        """Yield the shared client and count the request as in flight until exit."""
+        self.requests_total += 1
+        if self.in_flight >= settings.UPSTREAM_MAX_CONNECTIONS:
+            # every connection is busy -> this request waits for the pool
+            self.saturated_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield self.client
+        except httpx.PoolTimeout:
+            self.pool_timeouts_total += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        max_connections = settings.UPSTREAM_MAX_CONNECTIONS
+        return {
+            "started": self._client is not None,
+            "http2": settings.UPSTREAM_HTTP2,
+            "max_connections": max_connections,
+            "max_keepalive_connections": settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilization": self.in_flight / max_connections if max_connections else None,
+            "requests_total": self.requests_total,
+            "saturated_total": self.saturated_total,
+            "pool_timeouts_total": self.pool_timeouts_total,
+        }
+
+
+upstream_client = UpstreamClient()
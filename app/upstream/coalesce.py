@@ -0,0 +1,107 @@
+"""
+Single-flight for identical idempotent upstream requests.
+
+The first request for a key (the leader) goes upstream; requests with the
+same key arriving while it is in flight (followers) wait for its response
+instead of sending their own. The leader publishes a buffered copy of the
+response once its body is complete. If the body is bigger than
+PROXY_COALESCE_MAX_BODY_BYTES (or the leader could not buffer it) followers
+get None and go upstream themselves.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+COALESCE_METHODS = {"GET", "HEAD"}
+# change which response upstream sends (304, 206), so always part of the key
+CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since", "if-match", "if-unmodified-since", "range", "if-range"}
+
+
+@dataclass
+class SharedResponse:
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+@dataclass
+class _Call:
+    future: asyncio.Future
+    waiters: int = 0
+
+
+@dataclass
+class SingleFlight:
+    leaders: int = 0
+    followers: int = 0
+    fallbacks: int = 0
+    _calls: Dict[str, _Call] = field(default_factory=dict)
+
+    @staticmethod
+    def key(method: str, url: str, query_items: Iterable[Tuple[str, str]], headers: Dict[str, str]) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(query_items))
+        names = sorted({h.lower() for h in settings.PROXY_COALESCE_HEADERS} | CONDITIONAL_HEADERS)
+        selected = "|".join(f"{h}={headers.get(h, '')}" for h in names)
+        return f"{method} {url}?{query} {selected}"
+
+    def applies(self, method: str, has_body: bool) -> bool:
+        return settings.PROXY_COALESCE_ENABLED and method in COALESCE_METHODS and not has_body
+
+    def join(self, key: str) -> Tuple[bool, _Call]:
+        """Returns (is_leader, call)."""
+        call = self._calls.get(key)
+        if call is not None:
+            self.followers += 1
+            call.waiters += 1
+            return False, call
+        call = _Call(future=asyncio.get_running_loop().create_future())
+        self._calls[key] = call
+        self.leaders += 1
+        return True, call
+
+    async def wait(self, call: _Call) -> Optional[SharedResponse]:
+        """Follower side: the leader's response, or None if it cannot be shared."""
+        try:
+            result = await asyncio.wait_for(
+                asyncio.shield(call.future), timeout=settings.PROXY_COALESCE_WAIT_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            result = None
+        if result is None:
+            self.fallbacks += 1
+        return result
+
+    def publish(self, key: str, call: _Call, result: Any) -> None:
+        """Leader side: hand out a SharedResponse, an exception to re-raise, or None.
+
+        Safe to call more than once; only the first call counts.
+        """
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if call.future.done():
+            return
+        if isinstance(result, BaseException):
+            if call.waiters:
+                call.future.set_exception(result)
+            else:
+                call.future.set_result(None)
+        else:
+            call.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        deduplicated = self.followers - self.fallbacks
+        return {
+            "enabled": settings.PROXY_COALESCE_ENABLED,
+            "in_flight_keys": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "fallbacks": self.fallbacks,
+            "deduplicated": deduplicated,
+            "dedup_ratio": deduplicated / total if total else None,
+        }
+
+
+single_flight = SingleFlight()
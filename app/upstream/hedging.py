@@ -0,0 +1,150 @@
+"""
+Hedged requests: if an idempotent upstream call has not answered within the
+hedge delay, a second identical call is sent; the first response wins and the
+other one is cancelled (its pool slot and connection are released).
+
+The delay is PROXY_HEDGE_DELAY_SECONDS, or a live percentile of recent upstream
+latencies (PROXY_HEDGE_DELAY_PERCENTILE) once enough samples are collected.
+Extra load is capped by a token bucket: every request adds
+PROXY_HEDGE_MAX_EXTRA_RATIO tokens, every hedge takes one.
+"""
+import asyncio
+from collections import deque
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+SendOnce = Callable[[], Awaitable[Tuple[httpx.Response, AsyncExitStack]]]
+
+
+class LatencyTracker:
+    """Recent upstream response times (time to headers), in seconds."""
+
+    def __init__(self, size: int = 1000) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+
+upstream_latency = LatencyTracker()
+
+
+class Hedger:
+    def __init__(self) -> None:
+        self.tokens = float(settings.PROXY_HEDGE_BUDGET_MAX_TOKENS)
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.budget_denied = 0
+
+    def applies(self, retryable: bool, body_replayable: bool) -> bool:
+        return settings.PROXY_HEDGE_ENABLED and retryable and body_replayable
+
+    def deposit(self) -> None:
+        self.tokens = min(
+            float(settings.PROXY_HEDGE_BUDGET_MAX_TOKENS), self.tokens + settings.PROXY_HEDGE_MAX_EXTRA_RATIO
+        )
+
+    def _withdraw(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.budget_denied += 1
+        return False
+
+    def delay(self) -> float:
+        p = settings.PROXY_HEDGE_DELAY_PERCENTILE
+        if p is not None and len(upstream_latency) >= settings.PROXY_HEDGE_MIN_SAMPLES:
+            observed = upstream_latency.percentile(p)
+            if observed is not None:
+                return max(observed, settings.PROXY_HEDGE_MIN_DELAY_SECONDS)
+        return settings.PROXY_HEDGE_DELAY_SECONDS
+
+    async def send(self, send_once: SendOnce) -> Tuple[httpx.Response, AsyncExitStack, Optional[bool]]:
+        """Returns (response, its exit stack, hedge_won); hedge_won is None if no hedge was sent."""
+        primary = asyncio.create_task(send_once())
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.delay())
+        except BaseException:
+            await _discard(primary)
+            raise
+        if done or not self._withdraw():
+            response, stack = await primary
+            return response, stack, None
+
+        self.hedges_sent += 1
+        hedge = asyncio.create_task(send_once())
+        pending = {primary, hedge}
+        winner: Optional[asyncio.Task] = None
+        last_exc: Optional[BaseException] = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if winner is None:
+                            winner = task
+                        else:
+                            # both finished together, keep the first one
+                            await _discard(task)
+                    else:
+                        last_exc = task.exception()
+        finally:
+            # the loser, or both sends if we were cancelled from outside
+            for task in pending:
+                await _discard(task)
+
+        if winner is None:
+            assert last_exc is not None
+            raise last_exc
+        hedge_won = winner is hedge
+        if hedge_won:
+            self.hedge_wins += 1
+        else:
+            self.primary_wins += 1
+        response, stack = winner.result()
+        return response, stack, hedge_won
+
+    def stats(self) -> Dict[str, Any]:
+        percentiles = {
+            f"p{p}_ms": round(v * 1000.0, 2) if (v := upstream_latency.percentile(p)) is not None else None
+            for p in (50, 95, 99)
+        }
+        return {
+            "enabled": settings.PROXY_HEDGE_ENABLED,
+            "delay_ms": round(self.delay() * 1000.0, 2),
+            "latency_samples": len(upstream_latency),
+            **percentiles,
+            "tokens": round(self.tokens, 2),
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "budget_denied": self.budget_denied,
+        }
+
+
+async def _discard(task: asyncio.Task) -> None:
+    """Cancel a send and release its response/pool slot if it got that far."""
+    task.cancel()
+    try:
+        _, stack = await task
+    except BaseException:
+        return
+    await stack.aclose()
+
+
+hedger = Hedger()
@@ -0,0 +1,196 @@
+"""
+Token-bucket rate limits for proxied requests.
+
+Rules (PROXY_RATE_LIMIT_RULES) match by upstream path prefix, and every
+matching rule applies: ``per="client"`` keeps one bucket per client IP,
+``per="route"`` one bucket for everybody on that prefix. A request takes a
+token from each of its buckets, or from none of them if any is empty; it is
+then rejected with 429 and a Retry-After of when that bucket has a token again.
+
+Backends: in-process ("memory", every worker limits on its own, so N workers
+let through up to N times the rate) or Redis ("redis", one set of buckets for
+all workers, updated atomically by a Lua script on Redis time). If Redis is
+unreachable requests are let through.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import RateLimitRule, settings
+
+# (key, rate per second, burst)
+Bucket = Tuple[str, float, int]
+
+# KEYS: bucket keys; ARGV: rate_1, burst_1, rate_2, burst_2, ...
+# returns {allowed, retry_after (string, Lua numbers are truncated), index of the limiting bucket}
+_TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+local wait, limiting = 0, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < 1 and (1 - tokens) / rate > wait then
+        wait, limiting = (1 - tokens) / rate, i
+    end
+end
+if limiting > 0 then
+    return {0, tostring(wait), limiting - 1}
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', levels[i] - 1, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+return {1, '0', -1}
+"""
+
+
+class RateLimitBackend:
+    """Takes one token from every bucket or from none.
+
+    Returns (allowed, retry_after seconds, index of the limiting bucket or -1).
+    """
+
+    async def take(self, buckets: List[Bucket]) -> Tuple[bool, float, int]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryBackend(RateLimitBackend):
+    def __init__(self, max_buckets: int) -> None:
+        self.max_buckets = max_buckets
+        self.evictions = 0
+        # key -> (tokens, monotonic ts of the last update)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, buckets: List[Bucket]) -> Tuple[bool, float, int]:
+        now = time.monotonic()
+        levels = []
+        wait, limiting = 0.0, -1
+        for i, (key, rate, burst) in enumerate(buckets):
+            tokens, ts = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - ts) * rate)
+            levels.append(tokens)
+            if tokens < 1 and (1 - tokens) / rate > wait:
+                wait, limiting = (1 - tokens) / rate, i
+        if limiting >= 0:
+            return False, wait, limiting
+        for (key, _, _), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+        # a dropped bucket starts full again, so this only ever errs on the lenient side
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return True, 0.0, -1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"buckets": len(self._buckets), "max_buckets": self.max_buckets, "evictions": self.evictions}
+
+
+class RedisBackend(RateLimitBackend):
+    def __init__(self, url: str, prefix: str = "proxy-ratelimit:") -> None:
+        import redis.asyncio as redis  # only needed when this backend is configured
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_TAKE_SCRIPT)
+        self._prefix = prefix
+
+    async def take(self, buckets: List[Bucket]) -> Tuple[bool, float, int]:
+        keys = [self._prefix + key for key, _, _ in buckets]
+        args = [value for _, rate, burst in buckets for value in (rate, burst)]
+        allowed, retry_after, limiting = await self._script(keys=keys, args=args)
+        return bool(allowed), float(retry_after), int(limiting)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0
+    # the rule whose bucket was empty
+    rule: Optional[RateLimitRule] = None
+
+
+class RateLimiter:
+    def __init__(self) -> None:
+        self.backend: Optional[RateLimitBackend] = None
+        self.allowed = 0
+        self.limited: Dict[str, int] = {"client": 0, "route": 0}
+        self.backend_errors = 0
+
+    async def start(self) -> None:
+        if not settings.PROXY_RATE_LIMIT_ENABLED or self.backend is not None:
+            return
+        if settings.PROXY_RATE_LIMIT_BACKEND == "redis":
+            self.backend = RedisBackend(settings.PROXY_RATE_LIMIT_REDIS_URL)
+        else:
+            self.backend = MemoryBackend(settings.PROXY_RATE_LIMIT_MAX_BUCKETS)
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await self.backend.close()
+            self.backend = None
+
+    @staticmethod
+    def rules_for(path: str) -> List[RateLimitRule]:
+        return [
+            rule
+            for rule in settings.PROXY_RATE_LIMIT_RULES
+            if path.startswith(rule.path_prefix) and rule.rate_per_second > 0
+        ]
+
+    @staticmethod
+    def _key(rule: RateLimitRule, client_ip: Optional[str]) -> str:
+        if rule.per == "route":
+            return f"route:{rule.path_prefix}"
+        return f"client:{rule.path_prefix}:{client_ip or 'unknown'}"
+
+    async def check(self, path: str, client_ip: Optional[str]) -> Decision:
+        """Takes the tokens for one request to ``path`` (upstream path) from ``client_ip``."""
+        if self.backend is None:
+            return Decision(allowed=True)
+        rules = self.rules_for(path)
+        if not rules:
+            return Decision(allowed=True)
+        buckets = [(self._key(rule, client_ip), rule.rate_per_second, max(1, rule.burst)) for rule in rules]
+        try:
+            allowed, retry_after, limiting = await self.backend.take(buckets)
+        except Exception as e:
+            self.backend_errors += 1
+            print(f"[ratelimit] backend failed, letting the request through: {e}")
+            return Decision(allowed=True)
+        if allowed:
+            self.allowed += 1
+            return Decision(allowed=True)
+        rule = rules[limiting]
+        self.limited[rule.per] += 1
+        return Decision(allowed=False, retry_after=retry_after, rule=rule)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.backend is not None,
+            "backend": settings.PROXY_RATE_LIMIT_BACKEND if self.backend is not None else None,
+            "rules": len(settings.PROXY_RATE_LIMIT_RULES),
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "backend_errors": self.backend_errors,
+            **(self.backend.stats() if self.backend is not None else {}),
+        }
+
+
+rate_limiter = RateLimiter()
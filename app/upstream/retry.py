@@ -0,0 +1,297 @@
+"""
+Retry policy for upstream calls.
+
+- exponential backoff with full jitter: sleep ~ U(0, min(max_delay, base * 2**n));
+- an overall deadline per request (PROXY_REQUEST_DEADLINE_SECONDS) that caps
+  both the attempts' timeouts and the sleeps between them;
+- a retry budget: a token bucket that every request fills by
+  PROXY_RETRY_BUDGET_RATIO and every retry drains by one, so during an
+  outage retries stay a bounded fraction of traffic instead of multiplying it;
+- only idempotent methods (or requests carrying an idempotency key) are
+  retried, optionally also on selected 5xx statuses;
+- every attempt asks the circuit breaker of the request's pool first and
+  reports its outcome to it;
+- an attempt may be hedged (app/upstream/hedging.py);
+- every call picks an instance of the request's upstream pool, one the
+  request has not tried yet if there is one (app/upstream/balancer.py).
+"""
+import asyncio
+import functools
+import random
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core import metrics
+from app.core.config import settings
+from app.upstream.balancer import Instance, Pool
+from app.upstream.breaker import OPEN
+from app.upstream.client import upstream_client
+from app.upstream.hedging import hedger, upstream_latency
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"}
+
+
+class RetryBudget:
+    def __init__(self) -> None:
+        self.tokens = float(settings.PROXY_RETRY_BUDGET_MAX_TOKENS)
+        self._refilled_at = time.monotonic()
+        self.retries_allowed = 0
+        self.retries_denied = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            float(settings.PROXY_RETRY_BUDGET_MAX_TOKENS),
+            self.tokens + (now - self._refilled_at) * settings.PROXY_RETRY_BUDGET_MIN_PER_SECOND,
+        )
+        self._refilled_at = now
+
+    def deposit(self) -> None:
+        """Called once per proxied request."""
+        self._refill()
+        self.tokens = min(float(settings.PROXY_RETRY_BUDGET_MAX_TOKENS), self.tokens + settings.PROXY_RETRY_BUDGET_RATIO)
+
+    def withdraw(self) -> bool:
+        """Called before every retry; False means the budget is spent."""
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            self.retries_allowed += 1
+            return True
+        self.retries_denied += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "tokens": round(self.tokens, 2),
+            "max_tokens": settings.PROXY_RETRY_BUDGET_MAX_TOKENS,
+            "ratio": settings.PROXY_RETRY_BUDGET_RATIO,
+            "retries_allowed": self.retries_allowed,
+            "retries_denied": self.retries_denied,
+        }
+
+
+retry_budget = RetryBudget()
+
+
+@dataclass
+class Attempt:
+    number: int
+    started_ms: float  # since the proxied request started
+    upstream_url: Optional[str] = None
+    duration_ms: Optional[float] = None
+    status: Optional[int] = None
+    error: Optional[str] = None
+    backoff_ms: Optional[float] = None  # sleep before the next attempt
+    hedge_won: Optional[bool] = None  # None: no hedge was sent
+
+
+@dataclass
+class UpstreamResult:
+    response: Optional[httpx.Response]
+    attempts: List[Attempt]
+    last_error: Optional[Exception] = None
+    # why we stopped without a response, e.g. "deadline exceeded"
+    gave_up: Optional[str] = None
+    # the breaker rejected the call before it reached upstream
+    circuit_open: bool = False
+    # of the attempt that produced the response, None if it was not hedged
+    hedge_won: Optional[bool] = None
+    # the instance that answered: its URL plus the path, without the query
+    upstream_url: Optional[str] = None
+    # holds the pool slot and the response until the body is relayed
+    exit_stack: AsyncExitStack = field(default_factory=AsyncExitStack)
+
+
+def is_retryable(method: str, headers: Dict[str, str]) -> bool:
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    return bool(settings.PROXY_IDEMPOTENCY_HEADER) and settings.PROXY_IDEMPOTENCY_HEADER.lower() in headers
+
+
+def backoff_delay(attempt_number: int) -> float:
+    """Full jitter: uniform between 0 and the exponential ceiling."""
+    ceiling = min(
+        settings.PROXY_RETRY_MAX_DELAY_SECONDS,
+        settings.PROXY_RETRY_DELAY_SECONDS * (2 ** (attempt_number - 1)),
+    )
+    return random.uniform(0, ceiling)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000.0, 2)
+
+
+def _attempt_timeout(remaining: float) -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=min(settings.UPSTREAM_CONNECT_TIMEOUT_SECONDS, remaining),
+        read=min(settings.UPSTREAM_READ_TIMEOUT_SECONDS, remaining),
+        write=min(settings.UPSTREAM_WRITE_TIMEOUT_SECONDS, remaining),
+        pool=min(settings.UPSTREAM_POOL_TIMEOUT_SECONDS, remaining),
+    )
+
+
+def _instance_url(response: httpx.Response) -> str:
+    # the first request of a redirect chain went to our instance
+    request = response.history[0].request if response.history else response.request
+    return str(request.url.copy_with(query=None))
+
+
+async def _send_once(
+    pool: Pool,
+    tried: List[Instance],
+    method: str,
+    path: str,
+    params: Dict[str, Any],
+    headers: Dict[str, str],
+    body: Any,
+    timeout: httpx.Timeout,
+) -> Tuple[httpx.Response, AsyncExitStack]:
+    """One upstream call; the returned stack holds the pool slot and the response."""
+    instance = pool.pick(exclude=tried)
+    tried.append(instance)
+    async with AsyncExitStack() as stack:
+        client = await stack.enter_async_context(upstream_client.acquire())
+        instance.begin()
+        stack.callback(instance.end)
+        request = client.build_request(
+            method=method,
+            url=instance.url_for(path),
+            params=params,
+            content=body,
+            headers=headers,
+            timeout=timeout,
+        )
+        sent_ts = time.monotonic()
+        try:
+            response = await client.send(request, stream=True)
+        except httpx.PoolTimeout:
+            # our connection pool is full, says nothing about the instance
+            raise
+        except httpx.RequestError:
+            # scored as if it had taken the whole attempt, however fast it failed
+            penalty = timeout.read if timeout.read is not None else settings.UPSTREAM_READ_TIMEOUT_SECONDS
+            instance.record(None, max(time.monotonic() - sent_ts, penalty))
+            raise
+        stack.push_async_callback(response.aclose)
+        elapsed = time.monotonic() - sent_ts
+        upstream_latency.observe(elapsed)
+        instance.record(response.status_code, elapsed)
+        return response, stack.pop_all()
+
+
+async def send_with_retries(
+    *,
+    method: str,
+    pool: Pool,
+    path: str,
+    params: Dict[str, Any],
+    headers: Dict[str, str],
+    body: Any,
+    body_replayable: bool,
+    body_started: Callable[[], bool],
+    start_ts: float,
+) -> UpstreamResult:
+    """Send the request upstream (streamed response) under the retry policy."""
+    deadline = start_ts + settings.PROXY_REQUEST_DEADLINE_SECONDS
+    retryable = is_retryable(method, headers)
+    max_attempts = max(1, settings.PROXY_MAX_RETRIES)
+    result = UpstreamResult(response=None, attempts=[])
+    # instances this request went to, retries and hedges prefer others
+    tried: List[Instance] = []
+    retry_budget.deposit()
+    hedge = hedger.applies(retryable, body_replayable)
+    if hedge:
+        hedger.deposit()
+
+    def may_retry(number: int) -> Optional[str]:
+        """None if another attempt is allowed, otherwise the reason why not."""
+        if number >= max_attempts:
+            return "max attempts reached"
+        if not retryable:
+            return "method is not idempotent"
+        if not body_replayable and body_started():
+            # part of the body is already gone upstream, cannot replay it
+            return "request body cannot be replayed"
+        if time.monotonic() >= deadline:
+            return "deadline exceeded"
+        if pool.breaker.state == OPEN:
+            return "circuit open"
+        if not retry_budget.withdraw():
+            return "retry budget exhausted"
+        return None
+
+    for number in range(1, max_attempts + 1):
+        attempt_ts = time.monotonic()
+        remaining = deadline - attempt_ts
+        if remaining <= 0:
+            result.gave_up = "deadline exceeded"
+            break
+        if not pool.breaker.allow():
+            result.gave_up = "circuit open"
+            result.circuit_open = True
+            break
+        attempt = Attempt(number=number, started_ms=_ms(attempt_ts - start_ts))
+        result.attempts.append(attempt)
+
+        recorded = False
+        try:
+            async with AsyncExitStack() as attempt_stack:
+                send = functools.partial(
+                    _send_once, pool, tried, method, path, params, headers, body, _attempt_timeout(remaining)
+                )
+                if hedge:
+                    response, response_stack, attempt.hedge_won = await hedger.send(send)
+                    result.hedge_won = attempt.hedge_won
+                else:
+                    response, response_stack = await send()
+                attempt_stack.push_async_exit(response_stack)
+                elapsed = time.monotonic() - attempt_ts
+                attempt.status = response.status_code
+                attempt.duration_ms = _ms(elapsed)
+                attempt.upstream_url = _instance_url(response)
+                metrics.UPSTREAM_ATTEMPT_DURATION.labels(metrics.status_outcome(response.status_code)).observe(elapsed)
+                pool.breaker.record(response.status_code, elapsed)
+                recorded = True
+
+                reason = None
+                if response.status_code in settings.PROXY_RETRY_ON_STATUSES:
+                    reason = may_retry(number)
+                if response.status_code not in settings.PROXY_RETRY_ON_STATUSES or reason is not None:
+                    result.response = response
+                    result.upstream_url = attempt.upstream_url
+                    result.exit_stack.push_async_exit(attempt_stack.pop_all())
+                    return result
+                # retrying on this status: leaving the block closes the response
+        except httpx.RequestError as exc:
+            elapsed = time.monotonic() - attempt_ts
+            attempt.duration_ms = _ms(elapsed)
+            attempt.error = f"{type(exc).__name__}: {exc}"
+            attempt.upstream_url = tried[-1].url_for(path) if tried else None
+            result.last_error = exc
+            if isinstance(exc, httpx.PoolTimeout):
+                # our own connection pool is saturated (counted by upstream_client),
+                # not an upstream failure: the breaker only gets its slot back
+                metrics.UPSTREAM_ATTEMPT_DURATION.labels("pool_timeout").observe(elapsed)
+            else:
+                metrics.UPSTREAM_ATTEMPT_DURATION.labels("error").observe(elapsed)
+                pool.breaker.record(None, elapsed)
+                recorded = True
+            reason = may_retry(number)
+            if reason is not None:
+                result.gave_up = reason
+                break
+        finally:
+            if not recorded:
+                pool.breaker.release()
+
+        delay = min(backoff_delay(number), max(0.0, deadline - time.monotonic()))
+        attempt.backoff_ms = _ms(delay)
+        await asyncio.sleep(delay)
+
+    return result
@@ -0,0 +1,98 @@
+"""
+Benchmarks: python -m bench [scenario ...] [--workers N] [--duration S]
+                            [--save-baseline] [--tolerance 0.2] [--out FILE]
+
+Without scenario names all of them run. Results are compared with
+bench/baselines/<scenario>.json (if present); exit code 1 means a metric got
+worse than the tolerance allows. --save-baseline stores the current results
+instead. Baselines only compare runs on the same machine and settings.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .runner import run_scenario
+from .scenarios import BY_NAME, SCENARIOS
+
+BASELINES = Path(__file__).resolve().parent / "baselines"
+
+HIGHER_IS_BETTER = {"rps", "first_pass_records_per_second"}
+LOWER_IS_BETTER = {
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "rss_mb_total",
+    "rss_mb_max_worker",
+    "first_pass_seconds",
+    "resync_seconds",
+}
+# deterministic counts: any increase is a regression
+NO_INCREASE = {"rpc_calls_first_total", "rpc_calls_resync_total", "failed"}
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for key, old in baseline.items():
+        new = result.get(key)
+        if not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+            continue
+        if key in HIGHER_IS_BETTER and new < old * (1 - tolerance):
+            regressions.append(f"{key}: {new} < {old}")
+        elif key in LOWER_IS_BETTER and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {new} > {old}")
+        elif key in NO_INCREASE and new > old:
+            regressions.append(f"{key}: {new} > {old}")
+    return regressions
+
+
+def _summary(result: Dict[str, Any]) -> str:
+    keys = [k for k, v in result.items() if not isinstance(v, dict)]
+    return ", ".join(f"{k}={result[k]}" for k in keys)
+
+
+async def main(args: argparse.Namespace) -> int:
+    unknown = [n for n in args.scenarios if n not in BY_NAME]
+    if unknown:
+        print(f"[bench] unknown scenarios: {', '.join(unknown)}; known: {', '.join(BY_NAME)}")
+        return 2
+    scenarios = [BY_NAME[n] for n in args.scenarios] if args.scenarios else SCENARIOS
+
+    results: Dict[str, Any] = {}
+    failed = False
+    for scenario in scenarios:
+        print(f"[bench] {scenario.name}: {scenario.description}")
+        result = await run_scenario(scenario, workers=args.workers, duration=args.duration)
+        results[scenario.name] = result
+        print(f"[bench] {scenario.name}: {_summary(result)}")
+
+        path = BASELINES / f"{scenario.name}.json"
+        if args.save_baseline:
+            BASELINES.mkdir(exist_ok=True)
+            path.write_text(json.dumps(result, indent=2, sort_keys=True) + "\n")
+            print(f"[bench] {scenario.name}: baseline saved to {path}")
+        elif path.exists():
+            baseline = json.loads(path.read_text())
+            if baseline.get("workers") != result["workers"]:
+                print(f"[bench] {scenario.name}: baseline was taken with {baseline.get('workers')} workers, not compared")
+                continue
+            for line in compare(result, baseline, args.tolerance):
+                print(f"[bench] {scenario.name}: REGRESSION {line}")
+                failed = True
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Proxy and Odoo sync benchmarks")
+    parser.add_argument("scenarios", nargs="*", help=f"any of: {', '.join(BY_NAME)}")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the app under test")
+    parser.add_argument("--duration", type=float, default=None, help="seconds per http scenario")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before a regression")
+    parser.add_argument("--out", help="write all results as JSON to this file")
+    sys.exit(asyncio.run(main(parser.parse_args())))
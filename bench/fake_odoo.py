@@ -0,0 +1,280 @@
+"""
+In-memory Odoo stand-in for the benchmarks: /web/session/authenticate,
+/web/session/get_session_info and /web/dataset/call_kw for project.project,
+project.task, res.users and project.task.type (search, search_count, read,
+search_read, create, write, fields_get).
+
+Configured by environment:
+  - BENCH_ODOO_ROLE:       "source" (Odoo 1, seeded with projects and tasks)
+                           or "target" (Odoo 2, only users and stages);
+  - BENCH_ODOO_LATENCY_MS: delay added to every call_kw;
+  - BENCH_USERS / BENCH_PROJECTS / BENCH_TASKS: seed sizes.
+
+GET /__bench/stats returns call counts per model.method, POST /__bench/reset
+clears them, GET /__bench/ids/<model> lists record ids. Data lives as long as the process.
+
+Run: BENCH_ODOO_ROLE=source uvicorn bench.fake_odoo:app --port 18101
+"""
+import asyncio
+import itertools
+import os
+import secrets
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+SESSION_EXPIRED = {"code": 100, "message": "Odoo Session Expired", "data": {"message": "Session Expired"}}
+
+RELATIONS = {
+    "project.project": {"partner_id": "res.partner", "user_id": "res.users", "company_id": "res.company"},
+    "project.task": {
+        "user_id": "res.users",
+        "company_id": "res.company",
+        "project_id": "project.project",
+        "stage_id": "project.task.type",
+    },
+}
+STAGES = ["New", "In Progress", "Review", "Done", "Cancelled"]
+KANBAN_STATES = ["normal", "blocked", "done"]
+
+ROLE = os.getenv("BENCH_ODOO_ROLE", "source")
+LATENCY = float(os.getenv("BENCH_ODOO_LATENCY_MS", "0")) / 1000.0
+LINK_FIELDS = {
+    # Odoo 1 has the back links to Odoo 2 and vice versa
+    "project.project": ["x_odoo2_project_id" if ROLE == "source" else "x_odoo1_project_id"],
+    "project.task": ["x_odoo2_task_id" if ROLE == "source" else "x_odoo1_task_id"],
+}
+BASE_FIELDS = {
+    "res.users": ["name", "login", "email"],
+    "project.task.type": ["name"],
+    "res.partner": ["name"],
+    "res.company": ["name"],
+    "project.project": ["name", "partner_id", "user_id", "company_id"],
+    "project.task": ["name", "user_id", "date_deadline", "kanban_state", "company_id", "project_id", "stage_id"],
+}
+
+db: Dict[str, Dict[int, Dict[str, Any]]] = {}
+ids = itertools.count(1)
+sessions: set = set()
+calls: Counter = Counter()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def table(model: str) -> Dict[int, Dict[str, Any]]:
+    return db.setdefault(model, {})
+
+
+def insert(model: str, vals: Dict[str, Any]) -> int:
+    record_id = next(ids)
+    table(model)[record_id] = {"id": record_id, "write_date": _now(), **vals}
+    return record_id
+
+
+def _leaf(record: Dict[str, Any], op: str, field: str, value: Any) -> bool:
+    current = record.get(field, False)
+    if op == "=":
+        return current == value
+    if op == "!=":
+        return current != value
+    if op == "in":
+        return current in value
+    if op == "not in":
+        return current not in value
+    if current is False or current is None:
+        return False
+    if op == ">":
+        return current > value
+    if op == ">=":
+        return current >= value
+    if op == "<":
+        return current < value
+    if op == "<=":
+        return current <= value
+    raise ValueError(f"unsupported operator {op}")
+
+
+def _match(record: Dict[str, Any], domain: List[Any]) -> bool:
+    # prefix notation, leaves are implicitly and-ed
+    stack: List[bool] = []
+    for item in reversed(domain):
+        if item == "|":
+            stack.append(stack.pop() | stack.pop())
+        elif item == "&":
+            stack.append(stack.pop() & stack.pop())
+        elif item == "!":
+            stack.append(not stack.pop())
+        else:
+            field, op, value = item
+            stack.append(_leaf(record, op, field, value))
+    return all(stack)
+
+
+def _search(model: str, domain: List[Any], offset: int = 0, limit: Any = None, order: Any = None) -> List[Dict]:
+    records = [r for r in table(model).values() if _match(r, domain)]
+    for part in reversed((order or "id").split(",")):
+        field, *direction = part.split()
+        records.sort(
+            key=lambda r: (r.get(field) in (False, None), r.get(field) or 0),
+            reverse=bool(direction and direction[0].lower() == "desc"),
+        )
+    records = records[offset or 0 :]
+    return records[:limit] if limit else records
+
+
+def _render(model: str, record: Dict[str, Any], fields: Any) -> Dict[str, Any]:
+    out = {"id": record["id"]}
+    for field in fields or [f for f in record if f != "id"]:
+        value = record.get(field, False)
+        relation = RELATIONS.get(model, {}).get(field)
+        if relation and value:
+            value = [value, table(relation).get(value, {}).get("name", "?")]
+        out[field] = value
+    return out
+
+
+def _fields(model: str) -> Dict[str, Any]:
+    names = ["id", "write_date", *BASE_FIELDS.get(model, []), *LINK_FIELDS.get(model, [])]
+    return {name: {"type": "many2one" if name in RELATIONS.get(model, {}) else "char"} for name in names}
+
+
+def _call(model: str, method: str, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+    if method == "search":
+        return [r["id"] for r in _search(model, args[0], kwargs.get("offset"), kwargs.get("limit"), kwargs.get("order"))]
+    if method == "search_count":
+        return len(_search(model, args[0]))
+    if method == "read":
+        return [_render(model, table(model)[i], kwargs.get("fields")) for i in args[0] if i in table(model)]
+    if method == "search_read":
+        found = _search(model, kwargs.get("domain", []), kwargs.get("offset"), kwargs.get("limit"), kwargs.get("order"))
+        return [_render(model, r, kwargs.get("fields")) for r in found]
+    if method == "create":
+        vals = args[0]
+        return [insert(model, v) for v in vals] if isinstance(vals, list) else insert(model, vals)
+    if method == "write":
+        for i in args[0]:
+            table(model)[i].update(args[1], write_date=_now())
+        return True
+    if method == "fields_get":
+        return _fields(model)
+    raise ValueError(f"unsupported method {method}")
+
+
+def _rpc_result(request_id: Any, result: Any) -> JSONResponse:
+    return JSONResponse({"jsonrpc": "2.0", "id": request_id, "result": result})
+
+
+def _rpc_error(request_id: Any, error: Dict[str, Any]) -> JSONResponse:
+    return JSONResponse({"jsonrpc": "2.0", "id": request_id, "error": error})
+
+
+async def authenticate(request: Request) -> JSONResponse:
+    body = await request.json()
+    calls["session.authenticate"] += 1
+    sid = secrets.token_hex(16)
+    sessions.add(sid)
+    response = _rpc_result(body.get("id"), {"uid": 2, "db": body["params"].get("db")})
+    response.set_cookie("session_id", sid)
+    return response
+
+
+async def session_info(request: Request) -> JSONResponse:
+    body = await request.json()
+    calls["session.get_session_info"] += 1
+    if request.cookies.get("session_id") not in sessions:
+        return _rpc_error(body.get("id"), SESSION_EXPIRED)
+    return _rpc_result(body.get("id"), {"uid": 2})
+
+
+async def call_kw(request: Request) -> JSONResponse:
+    body = await request.json()
+    request_id = body.get("id")
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    if request.cookies.get("session_id") not in sessions:
+        return _rpc_error(request_id, SESSION_EXPIRED)
+    params = body["params"]
+    model, method = params["model"], params["method"]
+    calls[f"{model}.{method}"] += 1
+    try:
+        return _rpc_result(request_id, _call(model, method, params.get("args") or [], params.get("kwargs") or {}))
+    except Exception as e:
+        return _rpc_error(request_id, {"code": 200, "message": "Odoo Server Error", "data": {"message": repr(e)}})
+
+
+async def stats(request: Request) -> JSONResponse:
+    return JSONResponse({"calls": dict(calls), "records": {model: len(rows) for model, rows in db.items()}})
+
+
+async def record_ids(request: Request) -> JSONResponse:
+    return JSONResponse(sorted(table(request.path_params["model"])))
+
+
+async def reset(request: Request) -> JSONResponse:
+    calls.clear()
+    return JSONResponse({"ok": True})
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse({"role": ROLE})
+
+
+def seed() -> None:
+    users = int(os.getenv("BENCH_USERS", "50"))
+    if ROLE == "target":
+        # different ids than in the source, mapping goes by login / stage name
+        for _ in range(7):
+            next(ids)
+    company = insert("res.company", {"name": "Bench Co"})
+    partner = insert("res.partner", {"name": "Bench Partner"})
+    user_ids = [
+        insert("res.users", {"name": f"User {i}", "login": f"user{i}", "email": f"user{i}@bench.local"})
+        for i in range(users)
+    ]
+    stage_ids = [insert("project.task.type", {"name": name}) for name in STAGES]
+    if ROLE != "source":
+        return
+    projects = [
+        insert(
+            "project.project",
+            {"name": f"Project {i}", "partner_id": partner, "user_id": user_ids[i % users], "company_id": company},
+        )
+        for i in range(int(os.getenv("BENCH_PROJECTS", "20")))
+    ]
+    deadline = date.today()
+    for i in range(int(os.getenv("BENCH_TASKS", "1000"))):
+        insert(
+            "project.task",
+            {
+                "name": f"Task {i}",
+                "user_id": user_ids[i % users],
+                "date_deadline": (deadline + timedelta(days=i % 30)).isoformat(),
+                "kanban_state": KANBAN_STATES[i % len(KANBAN_STATES)],
+                "company_id": company,
+                "project_id": projects[i % len(projects)],
+                "stage_id": stage_ids[i % len(stage_ids)],
+            },
+        )
+
+
+seed()
+
+app = Starlette(
+    routes=[
+        Route("/web/session/authenticate", authenticate, methods=["POST"]),
+        Route("/web/session/get_session_info", session_info, methods=["POST"]),
+        Route("/web/dataset/call_kw", call_kw, methods=["POST"]),
+        Route("/web/dataset/call_kw/{model}/{method}", call_kw, methods=["POST"]),
+        Route("/__bench/stats", stats),
+        Route("/__bench/reset", reset, methods=["POST"]),
+        Route("/__bench/ids/{model}", record_ids),
+        Route("/__bench/health", health),
+    ]
+)
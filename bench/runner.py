@@ -0,0 +1,300 @@
+"""
+Runs benchmark scenarios against a real app process.
+
+For every scenario the runner
+  - recreates the benchmark database (BENCH_DB_NAME, default "proxy_bench",
+    on the DB_HOST/DB_USER from the app settings) so each run starts clean;
+  - starts the stub upstream, two fake Odoo and `uvicorn app.main:app`
+    with `workers` processes, all on localhost, each in its own process;
+  - drives the load from this process and samples the RSS of the app
+    workers from /proc right after it;
+  - stops everything.
+
+Only the benchmark database is ever dropped.
+"""
+import asyncio
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+import httpx
+
+from app.core.config import settings
+
+from .scenarios import Scenario
+
+ROOT = Path(__file__).resolve().parent.parent
+HOST = "127.0.0.1"
+UPSTREAM_PORT = 18001
+ODOO_1_PORT = 18101
+ODOO_2_PORT = 18102
+APP_PORT = 18200
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "proxy_bench")
+START_TIMEOUT_SECONDS = 60.0
+
+
+class Server:
+    """One uvicorn process; output goes to a log file shown if it fails to start."""
+
+    def __init__(self, name: str, target: str, port: int, health_path: str, env: Dict[str, str], workers: int = 1):
+        self.name = name
+        self.port = port
+        self.health_url = f"http://{HOST}:{port}{health_path}"
+        self.args = [sys.executable, "-m", "uvicorn", target, "--host", HOST, "--port", str(port)]
+        self.args += ["--log-level", "warning"]
+        if workers > 1:
+            self.args += ["--workers", str(workers)]
+        self.env = {**os.environ, **env}
+        self.log = tempfile.NamedTemporaryFile(prefix=f"bench-{name}-", suffix=".log", delete=False)
+        self.process: Optional[subprocess.Popen] = None
+
+    async def start(self) -> None:
+        self.process = subprocess.Popen(self.args, cwd=ROOT, env=self.env, stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + START_TIMEOUT_SECONDS
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    break
+                try:
+                    if (await client.get(self.health_url)).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.name} did not start, see {self.log.name}")
+
+    def stop(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def rss_mb(self) -> Dict[str, Optional[float]]:
+        """RSS of the master and its worker processes (Linux /proc only)."""
+        if self.process is None or not Path("/proc").exists():
+            return {"rss_mb_total": None, "rss_mb_max_worker": None}
+        pids = [self.process.pid, *_children(self.process.pid)]
+        sizes = [s for s in (_rss_kb(pid) for pid in pids) if s is not None]
+        workers = [s for s in (_rss_kb(pid) for pid in pids[1:]) if s is not None] or sizes
+        return {
+            "rss_mb_total": round(sum(sizes) / 1024.0, 1),
+            "rss_mb_max_worker": round(max(workers) / 1024.0, 1) if workers else None,
+        }
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # "pid (comm) state ppid ..."; comm may contain spaces
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return children
+
+
+def _rss_kb(pid: int) -> Optional[int]:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _percentile(ordered: List[float], p: float) -> Optional[float]:
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000.0, 2) if seconds is not None else None
+
+
+async def _reset_database() -> None:
+    conn = await asyncpg.connect(
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+        database="postgres",
+    )
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{BENCH_DB_NAME}" WITH (FORCE)')
+        await conn.execute(f'CREATE DATABASE "{BENCH_DB_NAME}"')
+    finally:
+        await conn.close()
+
+
+def _app_env(scenario: Scenario, workers: int, metrics_dir: str) -> Dict[str, str]:
+    env = {
+        "DB_NAME": BENCH_DB_NAME,
+        "UPSTREAM_BASE_URL": f"http://{HOST}:{UPSTREAM_PORT}",
+        "ODOO_1_HOST": HOST,
+        "ODOO_1_PORT": str(ODOO_1_PORT),
+        "ODOO_2_HOST": HOST,
+        "ODOO_2_PORT": str(ODOO_2_PORT),
+        # only what the scenario asks for runs in the background
+        "ODOO_DELTA_SYNC_INTERVAL_SECONDS": "0",
+    }
+    if workers > 1:
+        env["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    env.update(scenario.app_env)
+    return env
+
+
+async def _drive_http(base_url: str, scenario: Scenario, duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors = 0
+    counter = itertools.count()
+    body = b"x" * scenario.body_bytes if scenario.body_bytes else None
+    limits = httpx.Limits(max_connections=scenario.concurrency, max_keepalive_connections=scenario.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        deadline = time.monotonic() + duration
+
+        async def client_loop() -> None:
+            nonlocal errors
+            while time.monotonic() < deadline:
+                path = scenario.path.replace("{n}", str(next(counter)))
+                started = time.monotonic()
+                try:
+                    async with client.stream(scenario.method, path, content=body) as response:
+                        async for _ in response.aiter_raw():
+                            pass
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.monotonic() - started)
+                statuses[str(response.status_code)] += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(client_loop() for _ in range(scenario.concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p95_ms": ms(_percentile(latencies, 95)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+async def _odoo_calls(client: httpx.AsyncClient, port: int) -> Dict[str, int]:
+    return (await client.get(f"http://{HOST}:{port}/__bench/stats")).json()["calls"]
+
+
+async def _reset_odoo_calls(client: httpx.AsyncClient) -> None:
+    for port in (ODOO_1_PORT, ODOO_2_PORT):
+        await client.post(f"http://{HOST}:{port}/__bench/reset")
+
+
+async def _sync_pass(client: httpx.AsyncClient, base_url: str, task_ids: List[int]) -> Dict[str, Any]:
+    await _reset_odoo_calls(client)
+    started = time.monotonic()
+    accepted = await client.post(
+        f"{base_url}/api/v1/odoo/projects/sync-tasks-from-1-to-2", json={"task_ids_in_1": task_ids}
+    )
+    accepted.raise_for_status()
+    job_url = f"{base_url}/api/v1/odoo/projects/jobs/{accepted.json()['job_id']}"
+    while True:
+        job = (await client.get(job_url)).json()
+        if job["status"] in ("done", "dead"):
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - started
+    if job["status"] != "done":
+        raise RuntimeError(f"sync job failed: {job['last_error']}")
+    calls = {
+        "odoo1": await _odoo_calls(client, ODOO_1_PORT),
+        "odoo2": await _odoo_calls(client, ODOO_2_PORT),
+    }
+    result = job["result"]
+    return {
+        "seconds": round(elapsed, 3),
+        "created": result["created"],
+        "updated": result["updated"],
+        "unchanged": result["unchanged"],
+        "failed": result["failed"],
+        "rpc_calls": {name: sum(c.values()) for name, c in calls.items()},
+        "rpc_by_method": {name: dict(sorted(c.items())) for name, c in calls.items()},
+    }
+
+
+async def _drive_sync(base_url: str, scenario: Scenario) -> Dict[str, Any]:
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        task_ids = (await client.get(f"http://{HOST}:{ODOO_1_PORT}/__bench/ids/project.task")).json()
+        first = await _sync_pass(client, base_url, task_ids)
+        resync = await _sync_pass(client, base_url, task_ids)
+    tasks = len(task_ids)
+    first_calls = sum(first["rpc_calls"].values())
+    return {
+        "tasks": tasks,
+        "first_pass_seconds": first["seconds"],
+        "first_pass_records_per_second": round(tasks / first["seconds"], 1),
+        "resync_seconds": resync["seconds"],
+        "created": first["created"],
+        "failed": first["failed"] + resync["failed"],
+        "unchanged_on_resync": resync["unchanged"],
+        "rpc_calls_first_total": first_calls,
+        "rpc_calls_resync_total": sum(resync["rpc_calls"].values()),
+        "rpc_per_task_first": round(first_calls / tasks, 3) if tasks else None,
+        "rpc_first": first["rpc_by_method"],
+        "rpc_resync": resync["rpc_by_method"],
+    }
+
+
+async def run_scenario(scenario: Scenario, workers: int = 1, duration: Optional[float] = None) -> Dict[str, Any]:
+    await _reset_database()
+    metrics_dir = tempfile.mkdtemp(prefix="bench-metrics-")
+    odoo_env = {"BENCH_TASKS": str(scenario.tasks or 1)}
+    servers = [
+        Server("upstream", "bench.stub_upstream:app", UPSTREAM_PORT, "/__health", {}),
+        Server("odoo1", "bench.fake_odoo:app", ODOO_1_PORT, "/__bench/health", {**odoo_env, "BENCH_ODOO_ROLE": "source"}),
+        Server("odoo2", "bench.fake_odoo:app", ODOO_2_PORT, "/__bench/health", {**odoo_env, "BENCH_ODOO_ROLE": "target"}),
+    ]
+    app = Server("app", "app.main:app", APP_PORT, "/health", _app_env(scenario, workers, metrics_dir), workers)
+    base_url = f"http://{HOST}:{APP_PORT}"
+    try:
+        for server in servers:
+            await server.start()
+        await app.start()
+        if scenario.kind == "http":
+            run_for = duration if duration is not None else scenario.duration
+            # warm-up: fill connection pools before measuring
+            await _drive_http(base_url, scenario, min(2.0, run_for / 5))
+            result = await _drive_http(base_url, scenario, run_for)
+        else:
+            result = await _drive_sync(base_url, scenario)
+        result.update(app.rss_mb())
+    finally:
+        app.stop()
+        for server in reversed(servers):
+            server.stop()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    result["workers"] = workers
+    return result
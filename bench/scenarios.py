@@ -0,0 +1,65 @@
+"""
+Benchmark scenarios.
+
+"http" scenarios hammer the proxy for ``duration`` seconds with
+``concurrency`` parallel clients; the stub upstream is shaped by the query
+string of ``path`` (see bench/stub_upstream.py). "{n}" in the path is
+replaced by a request counter, so concurrent requests are distinct and are
+not merged by single-flight.
+
+"sync" scenarios push ``tasks`` Odoo 1 tasks through the batch sync endpoint
+twice: the first pass creates everything in Odoo 2, the second one should
+find nothing to write.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    kind: str  # "http" | "sync"
+    method: str = "GET"
+    path: str = ""
+    body_bytes: int = 0
+    concurrency: int = 20
+    duration: float = 10.0
+    tasks: int = 0
+    # extra settings for the app under test, e.g. {"PROXY_MAX_RETRIES": "1"}
+    app_env: Dict[str, str] = field(default_factory=dict)
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario(
+        name="small_get",
+        description="1 KiB GETs, 5 ms upstream latency",
+        kind="http",
+        path="/api/v1/proxy/bench/items/{n}?latency_ms=5&size=1024",
+        concurrency=50,
+    ),
+    Scenario(
+        name="large_bodies",
+        description="512 KiB uploads answered with 1 MiB bodies",
+        kind="http",
+        method="POST",
+        path="/api/v1/proxy/bench/upload/{n}?latency_ms=5&size=1048576",
+        body_bytes=512 * 1024,
+        concurrency=10,
+    ),
+    Scenario(
+        name="upstream_outage",
+        description="every upstream call fails with 503 (retries, breaker)",
+        kind="http",
+        path="/api/v1/proxy/bench/down/{n}?fail_rate=1",
+        concurrency=20,
+    ),
+    Scenario(
+        name="bulk_sync",
+        description="1000 Odoo 1 tasks through the batch sync, then a no-op resync",
+        kind="sync",
+        tasks=1000,
+    ),
+]
+
+BY_NAME = {s.name: s for s in SCENARIOS}
@@ -0,0 +1,61 @@
+"""
+Stub upstream for the benchmarks.
+
+Every response is shaped by query parameters, so one server covers all
+scenarios:
+  - latency_ms: delay before the response headers;
+  - size:       response body size in bytes (streamed in 64 KiB chunks);
+  - fail_rate:  share of requests answered with 503 (1.0 = full outage);
+  - status:     status of the non-failing responses (default 200).
+The request body, if any, is read and discarded.
+
+Run: uvicorn bench.stub_upstream:app --port 18001
+"""
+import asyncio
+import random
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+CHUNK = 65536
+
+
+async def handle(request: Request) -> Response:
+    params = request.query_params
+    async for _ in request.stream():
+        pass
+    latency_ms = float(params.get("latency_ms", "0"))
+    if latency_ms:
+        await asyncio.sleep(latency_ms / 1000.0)
+    if random.random() < float(params.get("fail_rate", "0")):
+        return Response(b"stub outage", status_code=503)
+
+    size = int(params.get("size", "0"))
+    status = int(params.get("status", "200"))
+    if size <= CHUNK:
+        return Response(b"x" * size, status_code=status, media_type="application/octet-stream")
+
+    async def body():
+        left = size
+        while left > 0:
+            n = min(CHUNK, left)
+            left -= n
+            yield b"x" * n
+
+    return StreamingResponse(
+        body(), status_code=status, media_type="application/octet-stream", headers={"content-length": str(size)}
+    )
+
+
+async def health(request: Request) -> Response:
+    return Response(b"ok")
+
+
+app = Starlette(
+    routes=[
+        Route("/__health", health),
+        Route("/{path:path}", handle, methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]),
+    ]
+)